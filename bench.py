@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for run.py:
+- Generates a seeded, realistically messy inventory (bad IPs, MACs, FQDNs, owners, sites)
+- Times each pipeline stage at several sizes (default 10k, 1M and 10M rows) and
+  records rows/sec and peak RSS; every size runs in a fresh process
+- Compares against a stored baseline and exits non-zero on a regression
+
+Inputs larger than --chunk rows are generated and processed chunk by chunk (as
+`run.py --chunksize` would), so memory stays bounded at 10M rows. The LLM is never called.
+
+  python3 bench.py --rows 10000,1000000 --save-baseline bench_baseline.json
+  python3 bench.py --rows 10000,1000000 --baseline bench_baseline.json
+  python3 bench.py --generate 50000 --seed 7 > inventory_raw.csv
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import run
+
+STAGES = ["ip", "hostname_fqdn", "mac", "owner", "site", "device", "write", "end_to_end"]
+
+# ------------------------------
+# Synthetic inventory
+# ------------------------------
+
+HOST_PREFIXES = ["sw", "core-sw", "rtr", "gw", "fw", "ap", "prn", "srv", "db", "web", "esx",
+                 "lt", "dt", "mbp", "cam", "phone", "nas", "badge", "host", "f5-ltm"]
+FIRST_NAMES = ["priya", "john", "alice", "bob", "wei", "fatima", "carlos", "olga", "kenji", "amara"]
+LAST_NAMES = ["raman", "doe", "smith", "chen", "khan", "garcia", "ivanova", "sato", "okafor", "nguyen"]
+TEAMS = ["netops", "secops", "devops", "it", "engineering", "sales", "hr", "finance", "marketing", "sre"]
+DEVICE_HINTS = ["server", "switch", "router", "printer", "firewall", "laptop", "camera", "iot", "unknown"]
+
+BAD_IPS = ["192.168.010.005", "10.0.1.300", "1.2.3", "n/a", "", "10.0.0.0001", "fe80::1%eth0", "2001:db8::g1"]
+BAD_MACS = ["zz:11", "", "00:11:22:33:44:55:66", "nan", "001122-3344"]
+BAD_FQDNS = ["", "bad..fqdn", "-edge.corp.example.com", "x_y.corp.example.com", "unrelated.corp.example.com"]
+BAD_OWNERS = ["", "Facilities", "tbd", "n/a"]
+BAD_SITES = ["xyz", "Lab-1", "", "DC-1", "HQ", "remote!"]
+
+
+@dataclass
+class Mix:
+    """Share of rows that get a deliberately broken value, per field."""
+    ip: float = 0.08
+    mac: float = 0.08
+    fqdn: float = 0.10
+    owner: float = 0.10
+    site: float = 0.10
+    duplicate: float = 0.01   # rows reusing another row's IP and MAC (conflicts)
+
+
+def _pick(rng: np.random.Generator, choices: List[str], n: int) -> np.ndarray:
+    return np.asarray(choices, dtype=object)[rng.integers(len(choices), size=n)]
+
+
+def _spoil(rng: np.random.Generator, values: np.ndarray, choices: List[str], share: float) -> None:
+    """Overwrite a random `share` of `values` with picks from `choices`."""
+    broken = rng.random(len(values)) < share
+    values[broken] = _pick(rng, choices, int(broken.sum()))
+
+
+def _hex(width: int) -> np.ndarray:
+    return np.array([f"{i:0{width}x}" for i in range(16 ** width)], dtype=object)
+
+
+def generate_inventory(rows: int, seed: int = 0, mix: Optional[Mix] = None, start: int = 0) -> pd.DataFrame:
+    """
+    A messy raw inventory of `rows` rows, reproducible from `seed`. `start` offsets the
+    source_row_id sequence so chunks of a larger inventory do not collide.
+    """
+    mix = mix or Mix()
+    rng = np.random.default_rng([seed, start])
+    n = rows
+
+    # source_row_id, ~3% missing (the pipeline falls back to the row index)
+    sid = (np.arange(start + 1, start + n + 1)).astype(str).astype(object)
+    sid[rng.random(n) < 0.03] = ""
+
+    # sites: canonical synonyms, sometimes with a building tag
+    synonyms = [s for keys in run.SITE_MAP.values() for s in keys] + list(run.SITE_MAP)
+    site = _pick(rng, synonyms, n)
+    site = np.where(rng.random(n) < 0.3, site.astype(str) + " Bldg " + rng.integers(1, 9, n).astype(str),
+                    site).astype(object)
+    site_code = np.asarray([s.split(" ")[0][:3].lower() for s in site], dtype=object)
+    _spoil(rng, site, BAD_SITES, mix.site)
+
+    # IPs: mostly private IPv4, some IPv6, some padded with whitespace
+    octet = np.arange(256).astype(str).astype(object)
+    v4 = ("10." + octet[rng.integers(256, size=n)] + "." + octet[rng.integers(256, size=n)]
+          + "." + octet[rng.integers(1, 255, size=n)])
+    hex4 = _hex(4)
+    v6 = "2001:db8:" + hex4[rng.integers(1 << 16, size=n)] + "::" + hex4[rng.integers(1, 1 << 16, size=n)]
+    ip = np.where(rng.random(n) < 0.1, v6, v4).astype(object)
+    pad = rng.random(n) < 0.02
+    ip[pad] = " " + ip[pad] + " "
+    _spoil(rng, ip, BAD_IPS, mix.ip)
+
+    # hostnames tied to device keywords and the site, some upper-cased or invalid
+    num = np.asarray([f"{i:03d}" for i in rng.integers(1, 1000, n)], dtype=object)
+    hostname = _pick(rng, HOST_PREFIXES, n) + "-" + site_code + "-" + num
+    upper = rng.random(n) < 0.05
+    hostname[upper] = [h.upper() for h in hostname[upper]]
+    invalid = rng.random(n) < 0.02
+    hostname[invalid] = [h.replace("-", "_") for h in hostname[invalid]]
+
+    fqdn = hostname + "." + site_code + ".corp.example.com"
+    _spoil(rng, fqdn, BAD_FQDNS, mix.fqdn)
+
+    # MACs in the usual notations
+    byte = _hex(2)
+    b = [byte[rng.integers(256, size=n)] for _ in range(6)]
+    style = rng.integers(4, size=n)
+    mac = np.select(
+        [style == 0, style == 1, style == 2],
+        [b[0] + ":" + b[1] + ":" + b[2] + ":" + b[3] + ":" + b[4] + ":" + b[5],
+         np.asarray([m.upper() for m in b[0] + "-" + b[1] + "-" + b[2] + "-" + b[3] + "-" + b[4] + "-" + b[5]],
+                    dtype=object),
+         b[0] + b[1] + "." + b[2] + b[3] + "." + b[4] + b[5]],
+        b[0] + b[1] + b[2] + b[3] + b[4] + b[5]).astype(object)
+    _spoil(rng, mac, BAD_MACS, mix.mac)
+
+    # owners: emails, "Last, First (team)", "[team] First Last", bare names
+    first, last, team = _pick(rng, FIRST_NAMES, n), _pick(rng, LAST_NAMES, n), _pick(rng, TEAMS, n)
+    style = rng.integers(4, size=n)
+    owner = np.select(
+        [style == 0, style == 1, style == 2],
+        [first + "." + last + "@corp.example.com",
+         last + ", " + first + " (" + team + ")",
+         "[" + team + "] " + first + " " + last],
+        first + " " + last).astype(object)
+    _spoil(rng, owner, BAD_OWNERS, mix.owner)
+
+    device = np.where(rng.random(n) < 0.4, _pick(rng, DEVICE_HINTS, n), "").astype(object)
+
+    # duplicates: copy IP and MAC from an earlier row
+    dup = np.flatnonzero(rng.random(n) < mix.duplicate)
+    if len(dup):
+        src = rng.integers(0, np.maximum(dup, 1))
+        ip[dup], mac[dup] = ip[src], mac[src]
+
+    return pd.DataFrame({
+        "source_row_id": sid, "ip": ip, "hostname": hostname, "fqdn": fqdn, "mac": mac,
+        "owner": owner, "device_type": device, "site": site,
+    })
+
+
+# ------------------------------
+# Stage timing
+# ------------------------------
+
+def _timed(times: Dict[str, float], stage: str, fn: Callable):
+    t0 = time.perf_counter()
+    out = fn()
+    times[stage] = times.get(stage, 0.0) + time.perf_counter() - t0
+    return out
+
+
+def time_chunk(df: pd.DataFrame, engine: str, workdir: str, times: Dict[str, float], digest) -> None:
+    """Time each stage of one frame the way `engine` runs it, then the whole pipeline and the writes."""
+    cols = run.pick_columns(df.columns)
+    raw, _ = run._raw_columns(df, cols)
+    stats: Optional[Dict[str, List[int]]] = {} if engine == "dedup" else None
+
+    if engine == "rows":
+        _timed(times, "ip", lambda: [run.normalize_ip(v) for v in raw["ip"]])
+        _timed(times, "hostname_fqdn", lambda: ([run.normalize_hostname(v) for v in raw["hostname"]],
+                                                [run.validate_fqdn(v) for v in raw["fqdn"]]))
+        _timed(times, "mac", lambda: [run.normalize_mac(v) for v in raw["mac"]])
+        _timed(times, "owner", lambda: [run.parse_owner(v) for v in raw["owner"]])
+        _timed(times, "site", lambda: [run.normalize_site(v) for v in raw["site"]])
+    else:
+        _timed(times, "ip", lambda: run._map_column(run.vector_ip, raw["ip"], "ip", stats))
+        _timed(times, "hostname_fqdn", lambda: (run._map_column(run.vector_hostname, raw["hostname"], "hostname", stats),
+                                                run._map_column(run.vector_fqdn, raw["fqdn"], "fqdn", stats)))
+        _timed(times, "mac", lambda: run._map_column(run.vector_mac, raw["mac"], "mac", stats))
+        _timed(times, "owner", lambda: run._map_values(run.parse_owner, raw["owner"], 4, "owner", stats))
+        _timed(times, "site", lambda: run._map_values(run.normalize_site, raw["site"], 3, "site", stats))
+
+    # device heuristics on the hint text, then classification (LLM off)
+    norm = run.NORMALIZERS[engine](df)
+    hints = norm.frame["hint_text"]
+    prompts = os.path.join(workdir, "prompts.md")
+    if engine == "rows":
+        _timed(times, "device", lambda: [run.deterministic_device_guess(v) for v in hints])
+    else:
+        _timed(times, "device", lambda: run._map_values(run.deterministic_device_guess, hints, 3, "hint_text", stats))
+    _timed(times, "device", lambda: run.classify_device_types(norm, prompts, False))
+
+    out_df, anomalies = _timed(times, "end_to_end", lambda: run.process_frame(df, prompts, False, engine=engine))
+    anomalies = anomalies + _timed(times, "end_to_end", lambda: run.detect_conflicts(out_df))
+
+    clean_p, anomalies_p = os.path.join(workdir, "clean.csv"), os.path.join(workdir, "anomalies.json")
+    _timed(times, "write", lambda: (run.write_clean(clean_p, out_df), run.write_anomalies(anomalies_p, anomalies)))
+    for path in (clean_p, anomalies_p):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+
+
+def bench_size(rows: int, engine: str, seed: int, chunk: int, mix: Dict[str, float]) -> Dict:
+    """One benchmark size; meant to run in its own process so peak RSS is per size."""
+    times: Dict[str, float] = {}
+    digest = hashlib.sha256()
+    with tempfile.TemporaryDirectory() as workdir:
+        for start in range(0, rows, chunk):
+            df = generate_inventory(min(chunk, rows - start), seed, Mix(**mix), start=start)
+            time_chunk(df, engine, workdir, times, digest)
+    return {
+        "rows": rows,
+        "seconds": {s: round(times[s], 4) for s in STAGES},
+        "rows_per_sec": {s: round(rows / max(times[s], 1e-9), 1) for s in STAGES},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "digest": digest.hexdigest(),
+    }
+
+
+# ------------------------------
+# Baseline comparison
+# ------------------------------
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions against `baseline`: changed output, rows/sec or peak RSS worse than `tolerance`."""
+    problems = []
+    if (baseline["engine"], baseline["seed"], baseline["chunk"], baseline["mix"]) != \
+            (results["engine"], results["seed"], results["chunk"], results["mix"]):
+        return ["baseline was recorded with a different engine/seed/chunk/mix; re-record it"]
+    base = {r["rows"]: r for r in baseline["results"]}
+    for r in results["results"]:
+        b = base.get(r["rows"])
+        if b is None:
+            continue
+        if r["digest"] != b["digest"]:
+            problems.append(f"{r['rows']} rows: output differs from baseline")
+        for stage in STAGES:
+            now, then = r["rows_per_sec"][stage], b["rows_per_sec"][stage]
+            if now < then * (1 - tolerance):
+                problems.append(f"{r['rows']} rows: {stage} {now:,.0f} rows/s vs baseline {then:,.0f}")
+        if r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + tolerance):
+            problems.append(f"{r['rows']} rows: peak RSS {r['peak_rss_mb']} MB vs baseline {b['peak_rss_mb']} MB")
+    return problems
+
+
+def print_report(results: Dict) -> None:
+    print(f"engine={results['engine']} seed={results['seed']} chunk={results['chunk']}")
+    print(f"{'rows':>10}  {'stage':<14} {'seconds':>10} {'rows/sec':>14}")
+    for r in results["results"]:
+        for stage in STAGES:
+            print(f"{r['rows']:>10}  {stage:<14} {r['seconds'][stage]:>10.3f} {r['rows_per_sec'][stage]:>14,.0f}")
+        print(f"{r['rows']:>10}  {'peak RSS':<14} {r['peak_rss_mb']:>9.0f}M")
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = asdict(Mix())
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        if key not in mix:
+            raise SystemExit(f"Unknown --mix field {key!r}; choose from {', '.join(mix)}")
+        mix[key] = float(value)
+    return mix
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark run.py on a synthetic messy inventory")
+    ap.add_argument("--rows", default="10000,1000000,10000000", help="Comma-separated sizes to benchmark")
+    ap.add_argument("--engine", choices=sorted(run.NORMALIZERS), default="dedup")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chunk", type=int, default=1_000_000, help="Rows generated and processed at a time")
+    ap.add_argument("--mix", default="", help="Broken-value shares, e.g. ip=0.2,mac=0.05,duplicate=0.02")
+    ap.add_argument("--out", default=None, help="Write results as JSON")
+    ap.add_argument("--baseline", default=None, help="Fail if results regress against this JSON")
+    ap.add_argument("--save-baseline", default=None, help="Record results as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="Allowed slowdown / RSS growth against the baseline (0.25 = 25%%)")
+    ap.add_argument("--generate", type=int, default=0, help="Only write N generated rows as CSV to stdout")
+    args = ap.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.generate:
+        generate_inventory(args.generate, args.seed, Mix(**mix)).to_csv(sys.stdout, index=False)
+        return
+
+    results = {"engine": args.engine, "seed": args.seed, "chunk": args.chunk, "mix": mix, "results": []}
+    for rows in (int(r) for r in args.rows.split(",")):
+        # a fresh interpreter per size, so ru_maxrss is that size's peak
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results["results"].append(pool.submit(bench_size, rows, args.engine, args.seed, args.chunk, mix).result())
+    print_report(results)
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Wrote: {path}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("REGRESSION against " + args.baseline + ":", file=sys.stderr)
+            for p in problems:
+                print("  - " + p, file=sys.stderr)
+            raise SystemExit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,17 +15,47 @@ the `--use-llm` flag is passed.
 from __future__ import annotations
 
 import argparse
+import bisect
+import contextlib
 import csv
 import datetime as dt
+import io
 import ipaddress
+import itertools
 import json
 import os
 import re
 import sys
+import threading
+import time
+from array import array
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache, reduce
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 
-import pandas as pd
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor  # imported in main() only when --workers > 1
+
+
+class _LazyModule:
+    """
+    Placeholder for a heavy import: the first attribute access imports the module and
+    rebinds the global to it, so small runs on the csv engine never load numpy/pandas.
+    """
+
+    def __init__(self, alias: str, name: str):
+        self._alias = alias
+        self._name = name
+
+    def __getattr__(self, attr):
+        import importlib
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+np = _LazyModule("np", "numpy")
+pd = _LazyModule("pd", "pandas")
 
 # ------------------------------
 # Helpers: validation and utils
@@ -78,12 +108,103 @@ TEAM_KEYWORDS = {
 }
 
 
+def _trie_pattern(words: List[str]) -> str:
+    """Regex alternation factored as a trie, so each position is tested in one walk."""
+    trie: Dict[str, Dict] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Dict]) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # greedy optional tail: the longest keyword starting here wins
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+# A letter or digit: what a whole-word keyword may not touch
+WORD_CHAR_RE = re.compile(r"[^\W_]")
+
+
+class KeywordMatcher:
+    """
+    Compiled form of a {class: [keywords]} table. counts(text) gives, per class,
+    `sum(k in text for k in keys)` from a single regex scan instead of one
+    substring search per keyword.
+
+    The scan reports the longest keyword starting at each position; every shorter
+    keyword starting there is one of its prefixes, so prefix lists recover the full
+    set of keywords present, overlaps included.
+
+    With whole_words=True a keyword only counts where it stands alone, bounded by
+    non-alphanumeric characters or the ends of the text ("it" in "it desk", not in "smith").
+    """
+
+    def __init__(self, table: Dict[str, List[str]], whole_words: bool = False):
+        self.classes = list(table)
+        self._always = [0] * len(self.classes)  # "" is in every string
+        self._owners: Dict[str, List[int]] = {}
+        for ci, keys in enumerate(table.values()):
+            for k in keys:
+                if k:
+                    self._owners.setdefault(k, []).append(ci)
+                else:
+                    self._always[ci] += 1
+        words = sorted(self._owners, key=len, reverse=True)
+        if whole_words:
+            # the longest standalone keyword at each position, plus those of its prefixes
+            # that end at a word boundary inside it ("avi" in "avi-lb")
+            self._prefixes = {w: [p for p in words if w.startswith(p) and not WORD_CHAR_RE.match(w, len(p))]
+                              for w in words}
+            pattern = r"(?=(?<![^\W_])(" + "|".join(map(re.escape, words)) + r")(?![^\W_]))"
+        else:
+            self._prefixes = {w: [p for p in words if w.startswith(p)] for w in words}
+            pattern = "(?=(" + _trie_pattern(words) + "))"
+        self._re = re.compile(pattern) if words else None
+
+    def counts(self, text: str) -> List[int]:
+        counts = list(self._always)
+        if self._re is not None:
+            found = set()
+            for m in self._re.finditer(text):
+                found.update(self._prefixes[m.group(1)])
+            for w in found:
+                for ci in self._owners[w]:
+                    counts[ci] += 1
+        return counts
+
+    def first(self, text: str) -> str:
+        """First class in table order with any keyword in `text`, or ""."""
+        for cls, n in zip(self.classes, self.counts(text)):
+            if n:
+                return cls
+        return ""
+
+
+# Compiled once at startup; rebuild if the keyword tables are changed at runtime
+DEVICE_MATCHER = KeywordMatcher(DEVICE_KEYWORDS)
+TEAM_MATCHER = KeywordMatcher(TEAM_KEYWORDS, whole_words=True)
+
+
 def now_utc_iso() -> str:
     return dt.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
 def safe_str(x) -> str:
-    return "" if pd.isna(x) else str(x).strip()
+    if isinstance(x, str):
+        return x.strip()
+    if x is None or (isinstance(x, float) and x != x):
+        return ""
+    # pandas missing markers (NA, NaT, numpy NaN) only exist if something loaded pandas
+    if "pandas" in sys.modules and pd.isna(x):
+        return ""
+    return str(x).strip()
 
 
 def normalize_hostname(raw: str) -> Tuple[str, bool, List[str]]:
@@ -137,21 +258,131 @@ def normalize_mac(mac_raw: str) -> Tuple[str, bool, List[str]]:
         return s.upper(), False, steps
 
 
+class SubnetIndex:
+    """
+    Longest-prefix match over a fixed CIDR table. Nested prefixes are flattened once into
+    disjoint, sorted integer ranges per IP version, each labelled with its most specific
+    subnet, so a lookup is a single bisect.
+    """
+
+    def __init__(self, networks: List[ipaddress._BaseNetwork]):
+        import hashlib
+        self.size = len(networks)
+        self.fingerprint = hashlib.sha256("\n".join(sorted(map(str, networks))).encode("ascii")).hexdigest()
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        self._labels: Dict[int, List[str]] = {}
+        for version in (4, 6):
+            nets = sorted((n for n in networks if n.version == version),
+                          key=lambda n: (int(n.network_address), n.prefixlen))
+            segments: List[Tuple[int, int, str]] = []
+            stack: List[Tuple[int, str]] = []  # enclosing (end, label), innermost last
+            cursor = 0                          # first address not yet assigned
+
+            def close(until: int) -> None:
+                nonlocal cursor
+                while stack and stack[-1][0] < until:
+                    end, label = stack.pop()
+                    if cursor <= end:
+                        segments.append((cursor, end, label))
+                        cursor = end + 1
+
+            for net in nets:
+                start = int(net.network_address)
+                close(start)
+                if stack and cursor < start:
+                    segments.append((cursor, start - 1, stack[-1][1]))
+                cursor = start
+                stack.append((int(net.broadcast_address), str(net)))
+            close(1 << 128)
+            self._starts[version] = [a for a, _, _ in segments]
+            self._ends[version] = [b for _, b, _ in segments]
+            self._labels[version] = [label for _, _, label in segments]
+
+    def lookup_v4(self, values: np.ndarray) -> np.ndarray:
+        """lookup() over an array of IPv4 addresses as integers."""
+        starts = np.asarray(self._starts[4], dtype=np.int64)
+        ends = np.asarray(self._ends[4], dtype=np.int64)
+        labels = np.asarray(self._labels[4] + [""], dtype=object)
+        i = np.searchsorted(starts, values.astype(np.int64), side="right") - 1
+        hit = (i >= 0) & (values <= ends[i]) if len(starts) else np.zeros(len(values), dtype=bool)
+        return labels[np.where(hit, i, -1)]
+
+    def lookup_v6(self, packed: np.ndarray) -> np.ndarray:
+        """
+        lookup() over an (n, 16) array of big-endian IPv6 address bytes. The bounds become
+        16-byte strings, whose bytewise order is numeric order, so one searchsorted covers
+        all 128 bits without building an address object per row.
+        """
+        def as_keys(values: List[int]) -> np.ndarray:
+            return np.frombuffer(b"".join(v.to_bytes(16, "big") for v in values), dtype="S16")
+
+        starts, ends = as_keys(self._starts[6]), as_keys(self._ends[6])
+        labels = np.asarray(self._labels[6] + [""], dtype=object)
+        values = np.ascontiguousarray(packed, dtype=np.uint8).view("S16").ravel()
+        i = np.searchsorted(starts, values, side="right") - 1
+        hit = (i >= 0) & (values <= ends[i]) if len(starts) else np.zeros(len(values), dtype=bool)
+        return labels[np.where(hit, i, -1)]
+
+    def lookup(self, ip_obj: ipaddress._BaseAddress) -> str:
+        """Most specific subnet containing the address, or "" if none does."""
+        x = int(ip_obj)
+        i = bisect.bisect_right(self._starts[ip_obj.version], x) - 1
+        if i >= 0 and x <= self._ends[ip_obj.version][i]:
+            return self._labels[ip_obj.version][i]
+        return ""
+
+
+def load_subnets(path: str) -> SubnetIndex:
+    """
+    Read a CIDR table (e.g. an IPAM export): the `cidr`/`subnet`/`network` column of a CSV
+    with a header, else the first column. Blank lines and lines starting with # are skipped.
+    """
+    networks = []
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [r for r in csv.reader(f) if r and r[0].strip() and not r[0].lstrip().startswith("#")]
+    col = 0
+    if rows:
+        header = [c.strip().lower() for c in rows[0]]
+        named = [i for i, c in enumerate(header) if c in ("cidr", "subnet", "network")]
+        if named:
+            col = named[0]
+            rows = rows[1:]
+    for line, row in enumerate(rows, 1):
+        try:
+            networks.append(ipaddress.ip_network(row[col].strip(), strict=False))
+        except (ValueError, IndexError):
+            raise SystemExit(f"{path}: not a CIDR in data row {line}: {row!r}")
+    return SubnetIndex(networks)
+
+
+# Known subnets from --subnets; None keeps the fixed /24 and /64 guess
+SUBNET_INDEX: Optional[SubnetIndex] = None
+
+
+def set_subnet_index(index: Optional[SubnetIndex]) -> None:
+    """Install the subnet table (also the process-pool initializer, so workers see it)."""
+    global SUBNET_INDEX
+    SUBNET_INDEX = index
+
+
 def reverse_ptr_for_ip(ip_obj: ipaddress._BaseAddress) -> str:
     # ipaddress has reverse_pointer
     return ip_obj.reverse_pointer
 
 
 def derive_subnet_for_ip(ip_obj: ipaddress._BaseAddress) -> str:
+    # With a subnet table, the longest matching prefix ("" when no subnet contains it).
+    if SUBNET_INDEX is not None:
+        return SUBNET_INDEX.lookup(ip_obj)
     # Without a provided mask, pick pragmatic defaults common in ops:
     # - IPv4: /24  (management/office networks)
     # - IPv6: /64  (typical LAN)
+    # Masking the integer gives the same text as str(ip_network(..., strict=False)).
     if isinstance(ip_obj, ipaddress.IPv4Address):
-        net = ipaddress.ip_network(f"{ip_obj}/24", strict=False)
-        return str(net)
+        return f"{ipaddress.IPv4Address(int(ip_obj) >> 8 << 8)}/24"
     else:
-        net = ipaddress.ip_network(f"{ip_obj}/64", strict=False)
-        return str(net)
+        return f"{ipaddress.IPv6Address(int(ip_obj) >> 64 << 64)}/64"
 
 
 def normalize_ip(ip_raw: str) -> Tuple[str, bool, int, str, str, List[str]]:
@@ -183,8 +414,16 @@ def parse_owner(owner_raw: str) -> Tuple[str, str, str, List[str]]:
     if not s:
         return "", "", "", steps
 
+    # A directory (--owners) hit is authoritative, team included (blank when the directory
+    # has none); the keyword heuristics below only run on a miss
+    person = OWNER_INDEX.resolve(s) if OWNER_INDEX is not None else None
+    if person is not None:
+        owner, email, team = person
+        steps.append("owner:directory_match")
+        return owner, email, team, steps
+
     # Try email first
-    email_match = re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", s)
+    email_match = EMAIL_RE.search(s)
     if email_match:
         email = email_match.group(0).lower()
         owner = email.split("@")[0].replace(".", " ").replace("_", " ").title()
@@ -194,32 +433,131 @@ def parse_owner(owner_raw: str) -> Tuple[str, str, str, List[str]]:
         cleaned = re.sub(r"[\(\)\[\]]", " ", s).strip()
         cleaned = re.sub(r"\s+", " ", cleaned)
         # team hint
-        for tcanon, keys in TEAM_KEYWORDS.items():
-            if any(k in cleaned.lower() for k in keys):
-                team = tcanon
-                steps.append("owner:team_inferred")
-                break
+        team = TEAM_MATCHER.first(cleaned.lower())
+        if team:
+            steps.append("owner:team_inferred")
         owner = cleaned.title()
 
     # If team not known via above, guess from email domain or tokens
     if not team:
         text = (s + " " + email).lower()
-        for tcanon, keys in TEAM_KEYWORDS.items():
-            if any(k in text for k in keys):
-                team = tcanon
-                steps.append("owner:team_inferred")
-                break
+        team = TEAM_MATCHER.first(text)
+        if team:
+            steps.append("owner:team_inferred")
 
     return owner, email, team, steps
 
 
+def site_key(text: str) -> str:
+    """Site text as matched: lowercase, punctuation besides '-' as spaces, runs of spaces collapsed."""
+    return re.sub(r"\s+", " ", re.sub(r"[^a-zA-Z0-9\- ]", " ", text).strip().lower())
+
+
+class SiteDirectory:
+    """
+    Canonical site codes and their synonyms, compiled for lookups whose cost does not
+    grow with the directory. A site matches when the text equals its code or contains
+    one of its synonyms, and the earliest matching site wins (SITE_MAP or file order).
+    Codes sit in an exact-match hash; synonyms in a hash keyed by their n-grams, so only
+    the text's own n-grams of each indexed length are probed. SITE_MAP synonyms match
+    anywhere in the text (character n-grams). Loaded directories set `whole_words`, so a
+    synonym must match whole words (word n-grams) and "campus 4" stays out of "campus 41".
+    """
+
+    def __init__(self, sites: Dict[str, List[str]], whole_words: bool = False):
+        import hashlib
+        self.sites = sites
+        self.codes = list(sites)
+        self.whole_words = whole_words
+        self.fingerprint = hashlib.sha256(json.dumps([sites, whole_words]).encode("utf-8")).hexdigest()
+        self._exact: Dict[str, int] = {}
+        self._synonyms: Dict[str, int] = {}
+        for rank, (code, synonyms) in enumerate(sites.items()):
+            self._exact.setdefault(site_key(code), rank)
+            for synonym in synonyms:
+                if synonym:
+                    self._synonyms.setdefault(self._grams(synonym) if whole_words else synonym, rank)
+        self._lengths = sorted({len(k) for k in self._synonyms})
+
+    @staticmethod
+    def _grams(key: str) -> Tuple[str, ...]:
+        return tuple(t for t in re.split(r"[ -]+", key) if t)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def resolve(self, key: str) -> str:
+        """Canonical code for site_key() text, or "" if no site matches."""
+        best = self._exact.get(key, len(self.codes))
+        synonyms = self._synonyms
+        units = self._grams(key) if self.whole_words else key
+        for n in self._lengths:
+            if n > len(units) or best == 0:
+                break
+            for i in range(len(units) - n + 1):
+                rank = synonyms.get(units[i:i + n])
+                if rank is not None and rank < best:
+                    best = rank
+        return self.codes[best] if best < len(self.codes) else ""
+
+
+def load_sites(path: str) -> SiteDirectory:
+    """
+    Read a site directory: JSON {"CODE": ["synonym", ...]}, or a CSV whose first column
+    is the code and whose other cells are synonyms (';' or '|' separated lists allowed).
+    A header naming a `site`/`code` column is skipped. Rows repeating a code add synonyms.
+    Synonyms match whole words of the site_key() text.
+    """
+    sites: Dict[str, List[str]] = {}
+
+    def add(code: str, synonyms) -> None:
+        code = code.strip()
+        if not code:
+            return
+        keys = sites.setdefault(code, [])
+        for synonym in synonyms:
+            for part in re.split(r"[;|]", synonym):
+                key = site_key(part)
+                if key and key not in keys:
+                    keys.append(key)
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".json"):
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise SystemExit(f"{path}: not a JSON site directory: {e}")
+            if not isinstance(data, dict):
+                raise SystemExit(f"{path}: expected a JSON object of code -> synonyms")
+            for code, synonyms in data.items():
+                add(code, [synonyms] if isinstance(synonyms, str) else [str(x) for x in synonyms])
+        else:
+            rows = [r for r in csv.reader(f) if r and r[0].strip() and not r[0].lstrip().startswith("#")]
+            if rows and rows[0][0].strip().lower() in ("site", "code", "site_code"):
+                rows = rows[1:]
+            for row in rows:
+                add(row[0], row[1:])
+    if not sites:
+        raise SystemExit(f"{path}: no sites found")
+    return SiteDirectory(sites, whole_words=True)
+
+
+# Site directory used by normalize_site(): SITE_MAP, or the file given with --sites
+SITE_DIRECTORY = SiteDirectory(SITE_MAP)
+
+
+def set_site_directory(directory: SiteDirectory) -> None:
+    """Install the site directory (also run by the process-pool initializer)."""
+    global SITE_DIRECTORY
+    SITE_DIRECTORY = directory
+
+
 def normalize_site(site_raw: str) -> Tuple[str, str, List[str]]:
     steps = []
     s = safe_str(site_raw)
     if not s:
         return "", "", steps
-    s_norm = re.sub(r"[^a-zA-Z0-9\- ]", " ", s).strip().lower()
-    s_norm = re.sub(r"\s+", " ", s_norm)
+    s_norm = site_key(s)
     # split off potential building/room (keep after canonical code)
     building = ""
     m = re.search(r"(bldg|bld|b)\s*(\d+)", s_norm)
@@ -228,10 +566,10 @@ def normalize_site(site_raw: str) -> Tuple[str, str, List[str]]:
         steps.append("site:building_tagged")
 
     # map to canonical
-    for canon, keys in SITE_MAP.items():
-        if s_norm == canon.lower() or any(s_norm == k for k in keys) or any(k in s_norm for k in keys):
-            steps.append("site:normalized")
-            return s, canon + building, steps
+    canon = SITE_DIRECTORY.resolve(s_norm)
+    if canon:
+        steps.append("site:normalized")
+        return s, canon + building, steps
     # If three-letter code already
     if re.fullmatch(r"[A-Za-z]{3}", s.strip()):
         steps.append("site:assumed_three_letter_code")
@@ -241,48 +579,770 @@ def normalize_site(site_raw: str) -> Tuple[str, str, List[str]]:
     return s, "", steps
 
 
-def deterministic_device_guess(text: str) -> Tuple[str, float, List[str]]:
+# ------------------------------
+# MAC vendors (OUI)
+# ------------------------------
+
+OUI_MAGIC = b"OUI2"
+# IEEE oui.txt line: "00-00-0C   (hex)\t\tCisco Systems, Inc"
+OUI_TXT_RE = re.compile(r"^\s*([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})\s+\(hex\)\s+(.+?)\s*$")
+
+# Vendor-name fragment (lowercase) -> (device class, weight in keyword hits). Two hits alone
+# reach 0.6, the LLM threshold: single-purpose vendors get 2, mixed portfolios 1.
+VENDOR_DEVICE_HINTS = {
+    "axis communications": ("camera", 2),
+    "hikvision": ("camera", 2),
+    "dahua": ("camera", 2),
+    "hanwha": ("camera", 2),
+    "mobotix": ("camera", 2),
+    "palo alto networks": ("firewall", 2),
+    "fortinet": ("firewall", 2),
+    "sonicwall": ("firewall", 2),
+    "check point": ("firewall", 2),
+    "arista": ("switch", 2),
+    "cisco": ("switch", 1),
+    "juniper": ("router", 1),
+    "mikrotik": ("router", 1),
+    "ruckus": ("wireless_ap", 2),
+    "aruba": ("wireless_ap", 1),
+    "ubiquiti": ("wireless_ap", 1),
+    "meraki": ("wireless_ap", 1),
+    "lexmark": ("printer", 2),
+    "xerox": ("printer", 2),
+    "brother industries": ("printer", 2),
+    "kyocera": ("printer", 2),
+    "zebra technologies": ("printer", 1),
+    "canon": ("printer", 1),
+    "polycom": ("phone", 2),
+    "yealink": ("phone", 2),
+    "grandstream": ("phone", 2),
+    "mitel": ("phone", 2),
+    "avaya": ("phone", 1),
+    "synology": ("nas", 2),
+    "qnap": ("nas", 2),
+    "netapp": ("nas", 2),
+    "f5 networks": ("load_balancer", 2),
+    "supermicro": ("server", 1),
+    "super micro": ("server", 1),
+    "vmware": ("server", 1),
+    "espressif": ("iot", 2),
+    "raspberry pi": ("iot", 1),
+}
+
+
+def load_oui_registry(path: str) -> Dict[int, str]:
+    """
+    24-bit prefix -> organization from an IEEE MA-L export: oui.csv (Registry,
+    Assignment,Organization Name,...) or oui.txt ("00-00-0C   (hex)   Name" lines).
+    """
+    vendors: Dict[int, str] = {}
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        first = f.readline()
+        f.seek(0)
+        if first.lstrip("\ufeff").lower().startswith("registry"):
+            for row in csv.DictReader(f):
+                prefix = (row.get("Assignment") or "").strip()
+                if len(prefix) == 6 and MAC_HEX_RE.match(prefix + "000000"):
+                    vendors.setdefault(int(prefix, 16), (row.get("Organization Name") or "").strip())
+        else:
+            for line in f:
+                m = OUI_TXT_RE.match(line)
+                if m:
+                    vendors.setdefault(int(m.group(1) + m.group(2) + m.group(3), 16), m.group(4))
+    return vendors
+
+
+def source_identity(path: str) -> bytes:
+    """16-byte digest of a file's absolute path, size and mtime, stored in the indexes compiled from it."""
+    import hashlib
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def index_source(index_path: str, magic: bytes) -> Optional[bytes]:
+    """source_identity() recorded in a compiled index (after magic and two counts), None if unreadable."""
+    try:
+        with open(index_path, "rb") as f:
+            header = f.read(28)
+    except OSError:
+        return None
+    return header[12:28] if len(header) == 28 and header[:4] == magic else None
+
+
+def build_oui_index(registry_path: str, index_path: str) -> None:
+    """
+    Write the compact index: header (magic, prefix count, vendor count, source_identity
+    of the export), sorted uint32 prefixes, uint16 vendor ids (padded to 4 bytes), uint32
+    name offsets, UTF-8 names. All little-endian, so the arrays can be searched in place
+    once memory-mapped.
+    """
+    import array
+    import struct
+    registry = load_oui_registry(registry_path)
+    names = sorted(set(registry.values()))
+    if len(names) > 0xFFFF:
+        raise SystemExit(f"{registry_path}: too many distinct vendors for the index")
+    ids = {name: i for i, name in enumerate(names)}
+    prefixes = array.array("I", sorted(registry))
+    vendor_ids = array.array("H", (ids[registry[p]] for p in prefixes))
+    if len(vendor_ids) % 2:
+        vendor_ids.append(0)
+    blob = [name.encode("utf-8") for name in names]
+    offsets = array.array("I", [0])
+    for b in blob:
+        offsets.append(offsets[-1] + len(b))
+    if sys.byteorder != "little":
+        for arr in (prefixes, vendor_ids, offsets):
+            arr.byteswap()
+    tmp = index_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<4sII16s", OUI_MAGIC, len(registry), len(names), source_identity(registry_path)))
+        f.write(prefixes.tobytes() + vendor_ids.tobytes() + offsets.tobytes() + b"".join(blob))
+    os.replace(tmp, index_path)
+
+
+class OUIIndex:
+    """
+    Memory-mapped OUI index (see build_oui_index): a MAC's vendor is one binary search
+    over the sorted prefix array, read straight from the page cache, so opening it costs
+    nothing however large the registry. Pickles by path for the process pool.
+    """
+
+    def __init__(self, path: str):
+        import mmap
+        import struct
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, vendors, _ = struct.unpack_from("<4sII16s", self._mm, 0)
+        if magic != OUI_MAGIC:
+            raise SystemExit(f"{path}: not an OUI index")
+        view = memoryview(self._mm)
+        pos = 28
+        self._prefixes = view[pos:pos + 4 * self.size].cast("I")
+        pos += 4 * self.size
+        self._ids = view[pos:pos + 2 * self.size].cast("H")
+        pos += 2 * (self.size + self.size % 2)
+        self._offsets = view[pos:pos + 4 * (vendors + 1)].cast("I")
+        self._names = pos + 4 * (vendors + 1)
+        if sys.byteorder != "little":  # rare; trade the zero-copy view for correctness
+            import array
+            for attr, code in (("_prefixes", "I"), ("_ids", "H"), ("_offsets", "I")):
+                arr = array.array(code, getattr(self, attr).tobytes())
+                arr.byteswap()
+                setattr(self, attr, arr)
+
+    @property
+    def fingerprint(self) -> str:
+        import hashlib
+        return hashlib.sha256(self._mm).hexdigest()
+
+    def __reduce__(self):
+        return OUIIndex, (self.path,)
+
+    def _vendor_id(self, mac: str) -> int:
+        """Vendor id for a normalized "AA:BB:CC:..." MAC, -1 if unlisted or locally administered."""
+        prefix = int(mac[0:2] + mac[3:5] + mac[6:8], 16)
+        if prefix & 0x020000:  # locally administered (e.g. randomized) addresses have no vendor
+            return -1
+        i = bisect.bisect_left(self._prefixes, prefix)
+        return self._ids[i] if i < self.size and self._prefixes[i] == prefix else -1
+
+    def vendor(self, mac: str) -> str:
+        vid = self._vendor_id(mac)
+        if vid < 0:
+            return ""
+        start, end = self._offsets[vid], self._offsets[vid + 1]
+        return self._mm[self._names + start:self._names + end].decode("utf-8")
+
+
+def vendor_device_hint(vendor: str) -> Tuple[str, int]:
+    """(device class, weight) suggested by a vendor name, ("", 0) when it says nothing."""
+    v = vendor.lower()
+    for fragment, hint in VENDOR_DEVICE_HINTS.items():
+        if fragment in v:
+            return hint
+    return "", 0
+
+
+def open_oui_index(path: str, out_dir: str) -> OUIIndex:
+    """
+    --oui PATH: a prebuilt index is opened as is; an IEEE export is compiled once to
+    <out_dir>/oui.idx and rebuilt whenever the index was compiled from another file, or
+    from this one at a different size or mtime.
+    """
+    with open(path, "rb") as f:
+        if f.read(4) == OUI_MAGIC:
+            return OUIIndex(path)
+    index_path = os.path.join(out_dir, "oui.idx")
+    if index_source(index_path, OUI_MAGIC) != source_identity(path):
+        build_oui_index(path, index_path)
+    return OUIIndex(index_path)
+
+
+# MAC vendor index from --oui; None leaves device guesses to the text hints
+OUI_INDEX: Optional[OUIIndex] = None
+
+
+def set_oui_index(index: Optional[OUIIndex]) -> None:
+    global OUI_INDEX
+    OUI_INDEX = index
+
+
+def mac_vendor(mac: str, mac_valid: bool) -> str:
+    return OUI_INDEX.vendor(mac) if OUI_INDEX is not None and mac_valid else ""
+
+
+def deterministic_device_guess(text: str, vendor: str = "") -> Tuple[str, float, List[str]]:
     steps = []
     t = text.lower()
-    best = ("", 0.0)
-    for dev, keys in DEVICE_KEYWORDS.items():
-        score = 0.0
-        for k in keys:
-            if k in t:
-                score += 1.0
-        if score > best[1]:
-            best = (dev, score)
-    if best[1] > 0:
+    counts = DEVICE_MATCHER.counts(t)
+    top = max(counts, default=0)
+    tied = [dev for dev, hits in zip(DEVICE_MATCHER.classes, counts) if hits == top]
+    # the MAC vendor (--oui) only settles what the keywords leave open: no hit at all,
+    # or a tie between classes that includes the one it suggests; then it counts as extra hits
+    vendor_dev, vendor_hits = vendor_device_hint(vendor) if vendor else ("", 0)
+    if vendor_hits and len(tied) > 1 and vendor_dev in tied:
+        best, score = vendor_dev, top + vendor_hits
+    elif top:
+        best, score = tied[0], top
+    else:
+        return "", 0.0, steps
+    if top:
         steps.append("device:heuristic_match")
-        # normalize score to [0, 1] roughly
-        conf = min(1.0, 0.3 + best[1] * 0.15)
-        return best[0], conf, steps
-    return "", 0.0, steps
+    if score > top:
+        steps.append("device:oui_vendor")
+    # normalize score to [0, 1] roughly
+    conf = min(1.0, 0.3 + score * 0.15)
+    return best, conf, steps
+
+
+def _guess_with_vendor(hint_and_vendor: Tuple[str, str]) -> Tuple[str, float, List[str]]:
+    return deterministic_device_guess(*hint_and_vendor)
+
+
+# ------------------------------
+# Owner directory (--owners)
+# ------------------------------
+
+OWNERS_MAGIC = b"OWN2"
+# Export field -> accepted keys, compared lowercase without "_", "-" or spaces
+OWNER_FIELD_ALIASES = {
+    "name": ["name", "displayname", "fullname", "cn", "employeename"],
+    "first": ["firstname", "givenname", "first"],
+    "last": ["lastname", "surname", "sn", "familyname", "last"],
+    "email": ["email", "mail", "emailaddress", "workemail", "primaryemail"],
+    "username": ["username", "login", "uid", "userid", "samaccountname"],
+    "team": ["team", "department", "dept", "group", "org", "division"],
+}
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+NAME_JUNK_RE = re.compile(r"[^a-z0-9]+")
+# Slot id marking a key that two people share; such keys never resolve
+OWNER_AMBIGUOUS = 0xFFFFFFFF
+
+
+def name_key(last: str, first: str) -> str:
+    """"Last, First" key: accents dropped, lowercase, punctuation and runs of spaces as one space."""
+    def fold(part: str) -> str:
+        if not part.isascii():
+            import unicodedata
+            part = "".join(ch for ch in unicodedata.normalize("NFKD", part) if not unicodedata.combining(ch))
+        return NAME_JUNK_RE.sub(" ", part.lower()).strip()
+
+    last, first = fold(last), fold(first)
+    return f"{last}, {first}" if last and first else ""
+
+
+def _owner_hash(key: str) -> int:
+    import hashlib
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def load_owner_directory(path: str) -> List[Tuple[str, str, str, List[str]]]:
+    """
+    People from an HR/IdP export: CSV with a header, a JSON array of objects or JSON Lines
+    (an Okta-style nested `profile` object is read too). Returns (display name, email,
+    team, lookup keys) per person; keys are "e:<email>", "u:<username>" and "n:<last, first>".
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".json", ".jsonl")):
+            try:
+                if path.lower().endswith(".jsonl"):
+                    records = [json.loads(line) for line in f if line.strip()]
+                else:
+                    records = json.load(f)
+            except ValueError as e:
+                raise SystemExit(f"{path}: not a JSON owner directory: {e}")
+            if not isinstance(records, list):
+                raise SystemExit(f"{path}: expected a JSON array of people")
+            records = [dict(r, **r["profile"]) if isinstance(r.get("profile"), dict) else r
+                       for r in records if isinstance(r, dict)]
+        else:
+            records = list(csv.DictReader(f))
+    people = []
+    headers: Dict[Tuple, Dict[str, Optional[str]]] = {}
+    for record in records:
+        fields = headers.get(tuple(record))
+        if fields is None:
+            keys = {re.sub(r"[\s_-]+", "", str(k).lower()): k for k in record}
+            fields = headers[tuple(record)] = {name: next((keys[a] for a in aliases if a in keys), None)
+                                               for name, aliases in OWNER_FIELD_ALIASES.items()}
+        get = {name: safe_str(record[k]) if k is not None and not isinstance(record[k], (dict, list)) else ""
+               for name, k in fields.items()}
+        first, last = get["first"], get["last"]
+        if not (first and last) and get["name"]:
+            if "," in get["name"]:
+                last, first = (p.strip() for p in get["name"].split(",", 1))
+            elif " " in get["name"]:
+                first, last = get["name"].rsplit(" ", 1)
+        display = get["name"] if get["name"] and "," not in get["name"] else " ".join(p for p in (first, last) if p)
+        email = get["email"].lower()
+        lookup = []
+        if email:
+            lookup.append("e:" + email)
+        if get["username"]:
+            lookup.append("u:" + get["username"].lower())
+        key = name_key(last, first)
+        if key:
+            lookup.append("n:" + key)
+        if lookup:
+            people.append((display, email, get["team"], lookup))
+    if not people:
+        raise SystemExit(f"{path}: no people found")
+    return people
+
+
+def build_owner_index(directory_path: str, index_path: str) -> None:
+    """
+    Write the compact index: header (magic, people, slots, source_identity of the
+    export, padding), an open-addressing table
+    of uint64 key hashes and uint32 person ids (0 empty), uint32 record offsets, then
+    "name\\x1femail\\x1fteam" UTF-8 records. All little-endian, searched in place once
+    memory-mapped. The table is at most half full, so a probe ends within a few slots.
+    """
+    import array
+    import struct
+    people = load_owner_directory(directory_path)
+    n_keys = sum(len(p[3]) for p in people)
+    slots = 1 << max(4, (2 * n_keys - 1).bit_length())
+    mask = slots - 1
+    hashes = array.array("Q", bytes(8 * slots))
+    ids = array.array("I", bytes(4 * slots))
+    for pid, (_, _, _, keys) in enumerate(people, 1):
+        for key in keys:
+            h = _owner_hash(key)
+            i = h & mask
+            while ids[i] and hashes[i] != h:
+                i = (i + 1) & mask
+            if ids[i] and ids[i] != pid:
+                ids[i] = OWNER_AMBIGUOUS
+            else:
+                hashes[i], ids[i] = h, pid
+    blob = ["\x1f".join(p[:3]).encode("utf-8") for p in people]
+    offsets = array.array("I", [0])
+    for b in blob:
+        offsets.append(offsets[-1] + len(b))
+    if sys.byteorder != "little":
+        for arr in (hashes, ids, offsets):
+            arr.byteswap()
+    tmp = index_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<4sII16s4x", OWNERS_MAGIC, len(people), slots, source_identity(directory_path)))
+        f.write(hashes.tobytes() + ids.tobytes() + offsets.tobytes() + b"".join(blob))
+    os.replace(tmp, index_path)
+
+
+class OwnerIndex:
+    """
+    Memory-mapped owner directory (see build_owner_index): resolving an owner is a few
+    hash-table probes per key tried, read straight from the page cache, so opening it
+    costs nothing however many people it holds. Pickles by path for the process pool.
+    """
+
+    def __init__(self, path: str):
+        import mmap
+        import struct
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, slots, _ = struct.unpack_from("<4sII16s4x", self._mm, 0)
+        if magic != OWNERS_MAGIC:
+            raise SystemExit(f"{path}: not an owner index")
+        self._mask = slots - 1
+        view = memoryview(self._mm)
+        pos = 32
+        self._hashes = view[pos:pos + 8 * slots].cast("Q")
+        pos += 8 * slots
+        self._ids = view[pos:pos + 4 * slots].cast("I")
+        pos += 4 * slots
+        self._offsets = view[pos:pos + 4 * (self.size + 1)].cast("I")
+        self._records = pos + 4 * (self.size + 1)
+        if sys.byteorder != "little":  # rare; trade the zero-copy view for correctness
+            import array
+            for attr, code in (("_hashes", "Q"), ("_ids", "I"), ("_offsets", "I")):
+                arr = array.array(code, getattr(self, attr).tobytes())
+                arr.byteswap()
+                setattr(self, attr, arr)
+
+    @property
+    def fingerprint(self) -> str:
+        import hashlib
+        return hashlib.sha256(self._mm).hexdigest()
+
+    def __reduce__(self):
+        return OwnerIndex, (self.path,)
+
+    def person(self, key: str) -> Optional[Tuple[str, str, str]]:
+        """(name, email, team) of the one person with `key`, None if nobody or several."""
+        h = _owner_hash(key)
+        i = h & self._mask
+        while True:
+            pid = self._ids[i]
+            if not pid:
+                return None
+            if self._hashes[i] == h:
+                break
+            i = (i + 1) & self._mask
+        if pid == OWNER_AMBIGUOUS:
+            return None
+        start, end = self._offsets[pid - 1], self._offsets[pid]
+        name, email, team = self._mm[self._records + start:self._records + end].decode("utf-8").split("\x1f")
+        return name, email, team
+
+    def resolve(self, text: str) -> Optional[Tuple[str, str, str]]:
+        """
+        Person named by raw owner text: its email (or the email's local part as a
+        username), a bare username, or its name as "Last, First" or "First Last" with
+        bracketed team hints removed.
+        """
+        m = EMAIL_RE.search(text)
+        if m:
+            email = m.group(0).lower()
+            return self.person("e:" + email) or self.person("u:" + email.split("@")[0])
+        cleaned = re.sub(r"\([^)]*\)|\[[^\]]*\]", " ", text).strip()
+        if "," in cleaned:
+            last, first = cleaned.split(",", 1)
+        else:
+            words = cleaned.split()
+            if len(words) == 1:
+                return self.person("u:" + words[0].lower())
+            first, last = " ".join(words[:-1]), words[-1] if words else ""
+        key = name_key(last, first)
+        return self.person("n:" + key) if key else None
+
+
+def open_owner_index(path: str, out_dir: str) -> OwnerIndex:
+    """
+    --owners PATH: a prebuilt index is opened as is; an HR/IdP export is compiled once
+    to <out_dir>/owners.idx and rebuilt whenever the index was compiled from another
+    file, or from this one at a different size or mtime.
+    """
+    with open(path, "rb") as f:
+        if f.read(4) == OWNERS_MAGIC:
+            return OwnerIndex(path)
+    index_path = os.path.join(out_dir, "owners.idx")
+    if index_source(index_path, OWNERS_MAGIC) != source_identity(path):
+        build_owner_index(path, index_path)
+    return OwnerIndex(index_path)
+
+
+# Owner directory from --owners; None leaves owners to the parsing heuristics
+OWNER_INDEX: Optional[OwnerIndex] = None
+
+
+def set_owner_index(index: Optional[OwnerIndex]) -> None:
+    global OWNER_INDEX
+    OWNER_INDEX = index
 
 
 # ------------------------------
 # LLM (optional)
 # ------------------------------
 
+DEFAULT_LLM_BASE_URL = "https://api.openai.com/v1"
+
+# Closed label set offered to the LLM
+DEVICE_TYPE_LABELS = '["switch","router","firewall","wireless_ap","printer","server","desktop","laptop","load_balancer","nas","camera","phone","iot","unknown"]'
+
+
 def use_llm() -> bool:
     return bool(os.getenv("OPENAI_API_KEY"))
 
 
-def call_llm_device_type(prompt: str, temperature: float = 0.2, timeout: int = 8) -> Optional[Dict]:
+@dataclass
+class LLMSettings:
+    """How the classification stage talks to the LLM (see --llm-* flags)."""
+    base_url: str = field(default_factory=lambda: os.getenv("OPENAI_BASE_URL", DEFAULT_LLM_BASE_URL))
+    model: str = "gpt-4o-mini"
+    batch_size: int = 1       # weak rows packed into one prompt; 1 keeps the single-row prompt
+    concurrency: int = 1      # requests in flight at once
+    rate_limit: float = 0.0   # max requests per second across all threads; 0 = unlimited
+    timeout: float = 8
+    cache: Optional[LLMCache] = None  # persistent answers; None = always ask
+    client: LLMClient = field(default_factory=lambda: LLMClient())  # pooled connections, retries, breaker
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart, shared across threads (rate <= 0 disables)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LLMCache:
+    """
+    Persistent SQLite store of LLM answers, keyed by a hash of the normalized prompt,
+    model and temperature. Entries expire after `ttl_seconds`; past `max_entries` the
+    least recently used ones are evicted on prune(). Counts hits and misses per run.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 30 * 86400, max_entries: int = 1_000_000):
+        import sqlite3
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # --serve uses it from request threads, one at a time (RecordService holds a lock)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache ("
+                         "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+
+    @staticmethod
+    def key(prompt: str, model: str, temperature: float) -> str:
+        import hashlib
+        normalized = " ".join(prompt.split()).casefold()
+        return hashlib.sha256(json.dumps([model, temperature, normalized]).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self._db.execute("SELECT answer, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds):
+            self.misses += 1
+            return None
+        self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, answer: Dict) -> None:
+        now = time.time()
+        self._db.execute("INSERT OR REPLACE INTO llm_cache (key, answer, created, accessed) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(answer), now, now))
+
+    def flush(self) -> None:
+        self._db.commit()
+
+    def prune(self) -> None:
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        if self.ttl_seconds > 0:
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        if self.max_entries > 0:
+            self._db.execute("DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache "
+                             "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self._db.commit()
+
+    def close(self) -> None:
+        self.prune()
+        self._db.close()
+
+
+class LLMUnavailable(Exception):
+    """Raised by LLMClient without sending anything: circuit open or run budget spent."""
+
+
+class LLMClient:
     """
-    Very small direct HTTP call to OpenAI Chat Completions JSON API.
-    Not required for core functionality; guarded by env var and try/except.
-    Returns a dict with fields {"device_type": str, "confidence": float} if successful.
+    HTTP(S) client for the Chat Completions endpoint, shared by the request threads.
+    Idle keep-alive connections are pooled per host ($HTTPS_PROXY/$NO_PROXY apply).
+    429/5xx replies and dropped connections are retried `retries` times with jittered
+    exponential backoff, honouring Retry-After; timeouts are not retried. After
+    `breaker_threshold` failed calls in a row the circuit opens: calls fail at once for
+    `breaker_cooldown` seconds, then a single trial call decides whether it closes.
+    `budget` caps the seconds, from the first call on, that a run spends on the LLM.
     """
-    import json, os, time, urllib.request
 
+    RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+    MAX_RETRY_AFTER = 30.0
+
+    def __init__(self, retries: int = 2, backoff: float = 0.5, breaker_threshold: int = 5,
+                 breaker_cooldown: float = 30.0, budget: float = 0.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker_threshold = breaker_threshold  # 0 = never open
+        self.breaker_cooldown = breaker_cooldown
+        self.budget = budget                        # 0 = unlimited
+        self.requests = 0
+        self.retried = 0
+        self.short_circuited = 0
+        self.over_budget = 0
+        self.opened = 0
+        self._idle: Dict[Tuple[str, str, int], list] = {}
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._deadline: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _admit(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self.budget > 0:
+                if self._deadline is None:
+                    self._deadline = now + self.budget
+                elif now >= self._deadline:
+                    self.over_budget += 1
+                    raise LLMUnavailable("LLM time budget spent")
+            if self._open_until:
+                if now < self._open_until or self._probing:
+                    self.short_circuited += 1
+                    raise LLMUnavailable("LLM circuit open")
+                self._probing = True  # half-open: this call decides
+
+    def _settle(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._failures = 0
+                self._open_until = 0.0
+                return
+            self._failures += 1
+            if self.breaker_threshold > 0 and self._failures >= self.breaker_threshold:
+                self.opened += not self._open_until
+                self._open_until = time.monotonic() + self.breaker_cooldown
+
+    def _remaining(self) -> float:
+        return self._deadline - time.monotonic() if self._deadline is not None else float("inf")
+
+    def _connection(self, parts):
+        """An idle pooled connection to the URL's host, or a new one; and whether it was pooled."""
+        import http.client, urllib.parse, urllib.request
+        https = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return key, idle.pop(), True
+        factory = http.client.HTTPSConnection if https else http.client.HTTPConnection
+        proxy = urllib.request.getproxies().get(parts.scheme)
+        if proxy and not urllib.request.proxy_bypass(parts.hostname):
+            proxy_parts = urllib.parse.urlsplit(proxy if "://" in proxy else "http://" + proxy)
+            conn = factory(proxy_parts.hostname, proxy_parts.port or 80)
+            conn.set_tunnel(key[1], key[2])
+        else:
+            conn = factory(key[1], key[2])
+        return key, conn, False
+
+    def _send(self, url: str, data: bytes, headers: Dict[str, str], timeout: float):
+        import urllib.parse
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        while True:
+            key, conn, pooled = self._connection(parts)
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request("POST", path, body=data, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except Exception as e:
+                conn.close()
+                # the server closed a pooled connection while it sat idle: try the next one
+                if pooled and isinstance(e, ConnectionError):
+                    continue
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.setdefault(key, []).append(conn)
+            return resp.status, resp.headers, body
+
+    def post_json(self, url: str, payload: Dict, headers: Dict[str, str], timeout: float) -> Dict:
+        """POST `payload` and return the decoded JSON reply; raises once retries are exhausted."""
+        import random, urllib.error
+        self._admit()
+        data = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", **headers}
+        ok = False
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = self._remaining()
+                if remaining <= 0:
+                    raise LLMUnavailable("LLM time budget spent")
+                with self._lock:
+                    self.requests += 1
+                wait = None
+                try:
+                    status, reply_headers, body = self._send(url, data, headers, min(timeout, remaining))
+                except OSError as e:
+                    if isinstance(e, TimeoutError):
+                        raise
+                    error = e
+                else:
+                    if 200 <= status < 300:
+                        reply = json.loads(body)
+                        ok = True
+                        return reply
+                    error = urllib.error.HTTPError(url, status, f"HTTP {status}", reply_headers, None)
+                    if status not in self.RETRY_STATUS:
+                        raise error
+                    retry_after = (reply_headers.get("Retry-After") or "").strip()
+                    if retry_after.isdigit():
+                        wait = min(float(retry_after), self.MAX_RETRY_AFTER)
+                if attempt == self.retries:
+                    raise error
+                delay = wait if wait is not None else random.uniform(0, self.backoff * 2 ** attempt)
+                if delay >= self._remaining():
+                    raise error
+                with self._lock:
+                    self.retried += 1
+                time.sleep(delay)
+        finally:
+            self._settle(ok)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def call_llm_device_type(prompt: str, temperature: float = 0.2, timeout: float = 8,
+                         base_url: Optional[str] = None, model: str = "gpt-4o-mini",
+                         client: Optional[LLMClient] = None) -> Optional[Dict]:
+    """
+    Very small direct call to OpenAI Chat Completions JSON API through `client`
+    (a one-off LLMClient if None). Not required for core functionality; guarded by
+    env var and try/except: any failure, or an open circuit, returns None.
+    Returns the parsed JSON object from the reply, e.g. {"device_type": str, "confidence": float}.
+    `base_url` defaults to $OPENAI_BASE_URL or the public OpenAI endpoint.
+    """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return None
+    base_url = base_url or os.getenv("OPENAI_BASE_URL", DEFAULT_LLM_BASE_URL)
+    client = client or LLMClient()
 
+    start = time.perf_counter()
     try:
         body = {
-            "model": "gpt-4o-mini",
+            "model": model,
             "temperature": temperature,
             "response_format": {"type": "json_object"},
             "messages": [
@@ -290,22 +1350,21 @@ def call_llm_device_type(prompt: str, temperature: float = 0.2, timeout: int = 8
                 {"role": "user", "content": prompt},
             ],
         }
-        data = json.dumps(body).encode("utf-8")
-        req = urllib.request.Request(
-            "https://api.openai.com/v1/chat/completions",
-            data=data,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-            },
-        )
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            payload = json.loads(resp.read())
+        payload = client.post_json(base_url.rstrip("/") + "/chat/completions", body,
+                                   {"Authorization": f"Bearer {api_key}"}, timeout)
         # Extract assistant content text
         content = payload["choices"][0]["message"]["content"]
-        return json.loads(content)
+        answer = json.loads(content)
+    except LLMUnavailable:
+        return None  # nothing was sent
     except Exception as e:
+        if METRICS is not None:
+            timed_out = isinstance(e, TimeoutError) or isinstance(getattr(e, "reason", None), TimeoutError)
+            METRICS.llm_call(time.perf_counter() - start, ok=False, timed_out=timed_out)
         return None
+    if METRICS is not None:
+        METRICS.llm_call(time.perf_counter() - start, ok=True)
+    return answer
 
 
 def log_prompt(prompts_path: str, title: str, prompt: str, response: Optional[Dict], rationale: str):
@@ -328,106 +1387,8 @@ def log_prompt(prompts_path: str, title: str, prompt: str, response: Optional[Di
         f.write("```\n\n---\n\n")
 
 
-# ------------------------------
-# Core processing
-# ------------------------------
-
-@dataclass
-class Anomaly:
-    row_id: int
-    fields: List[str]
-    issue_type: str
-    recommended_action: str
-
-
-def process(df: pd.DataFrame, prompts_path: str, enable_llm: bool) -> Tuple[pd.DataFrame, List[Anomaly]]:
-    out_rows = []
-    anomalies: List[Anomaly] = []
-
-    # normalize column names for easier matching
-    df_cols = {c.lower(): c for c in df.columns}
-    def get(colname: str):
-        # flexible getter; return empty string if missing
-        return df[df_cols[colname]].astype(str) if colname in df_cols else pd.Series([""] * len(df))
-
-    # try to find expected columns with fuzzy matches
-    def pick(cols: List[str]) -> Optional[str]:
-        for c in df.columns:
-            if c.lower() in cols:
-                return c
-        return None
-
-    col_ip = pick(["ip", "ip_address", "address"])
-    col_host = pick(["hostname", "host", "shortname"])
-    col_fqdn = pick(["fqdn", "name", "dns_name", "full_name"])
-    col_mac = pick(["mac", "mac_address", "ether"])
-    col_owner = pick(["owner", "user", "assigned_to", "responsible"])
-    col_device = pick(["device_type", "type", "role"])
-    col_site = pick(["site", "location", "office", "po", "dc"])
-    col_src_id = pick(["source_row_id", "row_id", "id"])
-
-    for idx, row in df.iterrows():
-        steps_all: List[str] = []
-        source_id = int(row[col_src_id]) if col_src_id and str(row[col_src_id]).strip().isdigit() else int(idx) + 1
-        raw_ip = str(row[col_ip]) if col_ip else ""
-        raw_host = str(row[col_host]) if col_host else ""
-        raw_fqdn = str(row[col_fqdn]) if col_fqdn else ""
-        raw_mac = str(row[col_mac]) if col_mac else ""
-        raw_owner = str(row[col_owner]) if col_owner else ""
-        raw_device = str(row[col_device]) if col_device else ""
-        raw_site = str(row[col_site]) if col_site else ""
-
-        # IP
-        ip, ip_valid, ip_version, subnet_cidr, reverse_ptr, steps = normalize_ip(raw_ip)
-        steps_all.extend(steps)
-        if not ip_valid:
-            anomalies.append(Anomaly(source_id, ["ip"], "invalid_ip", "Fix or remove invalid IP address."))
-
-        # Hostname
-        hostname, hostname_valid, steps = normalize_hostname(raw_host)
-        steps_all.extend(steps)
-        if raw_host and not hostname_valid:
-            anomalies.append(Anomaly(source_id, ["hostname"], "invalid_hostname", "Use RFC‑952/1123 compliant hostname."))
-
-        # FQDN
-        fqdn, fqdn_valid, steps = validate_fqdn(raw_fqdn)
-        steps_all.extend(steps)
-        fqdn_consistent = hostname_valid and fqdn_valid and fqdn_consistent_with_hostname(hostname, fqdn)
-        if raw_fqdn and not fqdn_valid:
-            anomalies.append(Anomaly(source_id, ["fqdn"], "invalid_fqdn", "Ensure labels are 1–63 chars; only letters/digits/hyphens."))
-        if hostname_valid and fqdn_valid and not fqdn_consistent:
-            anomalies.append(Anomaly(source_id, ["hostname","fqdn"], "mismatch", "Make FQDN start with the hostname label."))
-
-        # MAC
-        mac, mac_valid, steps = normalize_mac(raw_mac)
-        steps_all.extend(steps)
-        if raw_mac and not mac_valid:
-            anomalies.append(Anomaly(source_id, ["mac"], "invalid_mac", "Provide 12 hex digits; use colon notation."))
-
-        # Owner
-        owner, owner_email, owner_team, steps = parse_owner(raw_owner)
-        steps_all.extend(steps)
-        if not (owner or owner_email):
-            anomalies.append(Anomaly(source_id, ["owner"], "missing_owner", "Add owner or owner_email for accountability."))
-
-        # Site
-        site, site_norm, steps = normalize_site(raw_site)
-        steps_all.extend(steps)
-        if site and not site_norm:
-            anomalies.append(Anomaly(source_id, ["site"], "unknown_site", "Map to a canonical site code (e.g., SJC, NYC)."))
-
-        # Device type
-        # Start with deterministic heuristics using the best combined hint text
-        hint_text = " ".join([raw_device, hostname, fqdn, owner_team, site]).strip()
-        dev_guess, dev_conf, dev_steps = deterministic_device_guess(hint_text)
-        steps_all.extend(dev_steps)
-
-        device_type = dev_guess if dev_guess else ""
-        device_conf = dev_conf if dev_guess else 0.0
-
-        # If weak or unknown and LLM is allowed, try the LLM
-        if (not device_type or device_conf < 0.6) and enable_llm and use_llm():
-            prompt = f"""
+def device_type_prompt(hint_text: str) -> str:
+    return f"""
 You are classifying a network asset into a broad device_type for DDI (DNS/DHCP/IPAM) workflows.
 Given the hints below, return a JSON object with keys "device_type" and "confidence" (0..1).
 
@@ -435,131 +1396,2879 @@ Hints (free-form text):
 {hint_text}
 
 Allowed device_type values (choose the best single label):
-["switch","router","firewall","wireless_ap","printer","server","desktop","laptop","load_balancer","nas","camera","phone","iot","unknown"]
+{DEVICE_TYPE_LABELS}
 
 Respond in strict JSON only.
 """.strip()
-            response = call_llm_device_type(prompt, temperature=0.2)
-            if response and isinstance(response, dict):
-                device_type = str(response.get("device_type", device_type or "unknown"))
-                device_conf = float(response.get("confidence", device_conf or 0.5))
-            log_prompt(prompts_path, title="device_type classification", prompt=prompt,
-                       response=response, rationale="LLM used only when heuristics were weak (<0.6).")
-        elif not device_type:
-            # LLM disabled or not requested: skip prompting; keep deterministic outcome only.
-            device_type = "unknown"
-            device_conf = max(device_conf, 0.3)
-
-        # If still unknown but we have strong hostname tokens
-        if not device_type and hostname:
-            device_type = "server"
-            device_conf = 0.4
-            steps_all.append("device:default_server_when_unknown")
-
-        # Assemble output row
-        out_rows.append({
-            "ip": ip,
-            "ip_valid": bool(ip_valid),
-            "ip_version": int(ip_version) if ip_version else "",
-            "subnet_cidr": subnet_cidr,
-            "hostname": hostname,
-            "hostname_valid": bool(hostname_valid),
-            "fqdn": fqdn,
-            "fqdn_consistent": bool(fqdn_consistent),
-            "reverse_ptr": reverse_ptr,
-            "mac": mac,
-            "mac_valid": bool(mac_valid),
-            "owner": owner,
-            "owner_email": owner_email,
-            "owner_team": owner_team,
-            "device_type": device_type,
-            "device_type_confidence": round(float(device_conf), 3) if device_conf else 0.0,
-            "site": site,
-            "site_normalized": site_norm,
-            "source_row_id": source_id,
-            "normalization_steps": ";".join(steps_all),
-        })
-
-        # Device anomaly if still too weak
-        if device_conf < 0.5:
-            anomalies.append(Anomaly(source_id, ["device_type"], "low_confidence_device_type",
-                                     "Review classification; add better hints (e.g., role, model)."))
-
-    out_df = pd.DataFrame(out_rows, columns=[
-        "ip", "ip_valid", "ip_version", "subnet_cidr",
-        "hostname", "hostname_valid", "fqdn", "fqdn_consistent", "reverse_ptr",
-        "mac", "mac_valid",
-        "owner", "owner_email", "owner_team",
-        "device_type", "device_type_confidence",
-        "site", "site_normalized",
-        "source_row_id", "normalization_steps"
-    ])
-    return out_df, anomalies
 
 
-def write_anomalies(anomalies_path: str, anomalies: List[Anomaly]) -> None:
-    payload = [{
-        "row_id": a.row_id,
-        "fields": a.fields,
-        "issue_type": a.issue_type,
-        "recommended_action": a.recommended_action,
-    } for a in anomalies]
-    with open(anomalies_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+def device_type_batch_prompt(hints: List[Tuple[str, str]]) -> str:
+    """One prompt for many assets; `hints` is a list of (row id, hint_text)."""
+    lines = "\n".join(f"{rid}: {text}" for rid, text in hints)
+    return f"""
+You are classifying network assets into broad device_type labels for DDI (DNS/DHCP/IPAM) workflows.
+Each line below is one asset as "<id>: <hints>". Return a JSON object with one entry per id,
+mapping the id (as a string) to an object with keys "device_type" and "confidence" (0..1).
 
+Assets (id: free-form hints):
+{lines}
 
-def ensure_docs(out_dir: str) -> Tuple[str, str, str, str]:
-    """
-    Create/overwrite short documentation files to satisfy deliverables.
-    Returns the paths to: approach.md, cons.md, prompts.md, ddi_ideas.md
-    """
-    approach_p = os.path.join(out_dir, "approach.md")
-    cons_p = os.path.join(out_dir, "cons.md")
-    prompts_p = os.path.join(out_dir, "prompts.md")
-    ideas_p = os.path.join(out_dir, "ddi_ideas.md")
+Allowed device_type values (choose the best single label for each asset):
+{DEVICE_TYPE_LABELS}
 
-    approach = """# Approach
+Respond in strict JSON only.
+""".strip()
 
-This pipeline cleans `inventory_raw.csv` into `inventory_clean.csv` and flags issues in `anomalies.json`.
-It follows a **rules-first, LLM-second** strategy.
 
-## Steps
-1. **Normalize & Validate**
-   - IP: validate IPv4/IPv6 (`ipaddress`), derive `subnet_cidr` (IPv4: /24, IPv6: /64 by default), compute `reverse_ptr`.
-   - Hostname: RFC‑952/1123 checks (lowercase, labels allowed chars).
-   - FQDN: validate labels and overall length; check `fqdn_consistent` with `hostname`.
-   - MAC: strip separators, verify 12 hex digits, output colon‑separated uppercase.
-   - Owner: extract `owner_email`, prettify name, infer `owner_team` using keyword hints.
-   - Site: canonicalize to 3‑letter site codes (e.g., SJC, NYC) with a synonyms map.
-2. **Classification**
-   - Device type via keyword heuristics (hostname/fqdn/role/owner_team/site). Confidence scaled 0..1.
-   - If heuristics are weak (<0.6) and an LLM is enabled, call it with temperature 0.2, JSON reply enforced.
-3. **Anomaly Reporting**
-   - For any invalid or inconsistent field, append an entry to `anomalies.json` with `row_id`, `fields`, `issue_type`, `recommended_action`.
-4. **Traceability**
-   - Each row carries a `normalization_steps` semi‑colon log for transparency.
-5. **Reproducibility**
-   - Single entry point `run.py` regenerates outputs deterministically (LLM optional and guarded).
+def apply_llm_answer(answer, device_type: str, device_conf: float) -> Tuple[str, float]:
+    """Fold one {"device_type", "confidence"} answer into the current guess."""
+    if answer and isinstance(answer, dict):
+        device_type = str(answer.get("device_type", device_type or "unknown"))
+        device_conf = float(answer.get("confidence", device_conf or 0.5))
+    return device_type, device_conf
 
-## Notes
-- `subnet_cidr` defaults are common ops defaults when the mask isn’t present; if a Subnet column is provided, the script can be extended to prefer it.
-- LLM usage is minimal and logged in `prompts.md`. Deterministic transforms dominate.
-"""
 
-    cons = """# Known Limitations / Trade‑offs
+def llm_classify_weak(rows, hints, device_type, device_conf, prompts_path: str, settings: LLMSettings) -> None:
+    """
+    Classify the weak `rows` (positions) with the LLM, updating `device_type` and
+    `device_conf` in place; any indexable sequences will do (arrays or lists). Rows
+    are packed `settings.batch_size` per prompt and sent `settings.concurrency` at a
+    time under the rate limit; answers are applied and logged to prompts.md in row
+    order, whatever order the requests finish in.
+    With a cache, known answers are reused and each distinct hint is asked only once.
+    """
+    cache = settings.cache
+    keys: Dict[int, str] = {}
+    followers: Dict[int, List[int]] = {}
+    if cache is not None:
+        pending = []
+        first_row: Dict[str, int] = {}
+        for i in rows:
+            key = LLMCache.key(device_type_prompt(hints[i]), settings.model, 0.2)
+            if key in first_row:
+                followers[first_row[key]].append(i)
+                continue
+            answer = cache.get(key)
+            if answer is not None:
+                device_type[i], device_conf[i] = apply_llm_answer(answer, device_type[i], device_conf[i])
+                first_row[key] = i
+                followers[i] = []
+                continue
+            keys[i] = key
+            first_row[key] = i
+            followers[i] = []
+            pending.append(i)
+        rows = pending
 
-1. **Subnet inference** — Without an explicit netmask, `/24` for IPv4 and `/64` for IPv6 are heuristics. Real networks may differ.
-2. **LLM fragility** — Even at low temperature, classification can be noisy or ambiguous; offline fallback avoids nondeterminism but may under‑classify.
-3. **Limited site dictionary** — `SITE_MAP` covers common sites only. Unknown locations will be flagged for manual mapping.
-4. **Sparse owner parsing** — Owner extraction heuristics won’t resolve nicknames or external contractors without a proper directory integration.
-5. **Hostname/FQDN edge cases** — Split‑horizon DNS, IDNA/punycode, and non‑ASCII labels aren’t modeled.
-6. **No OUI vendor check** — MAC vendors could improve device hints; omitted to keep the core deterministic and local.
-"""
+    batch_size = max(1, settings.batch_size)
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    limiter = RateLimiter(settings.rate_limit)
 
-    prompts_header = """# LLM Prompts Log
+    def ask(batch) -> Tuple[str, Optional[Dict]]:
+        if batch_size == 1:
+            prompt = device_type_prompt(hints[batch[0]])
+        else:
+            prompt = device_type_batch_prompt([(str(n), hints[i]) for n, i in enumerate(batch, 1)])
+        limiter.wait()
+        return prompt, call_llm_device_type(prompt, temperature=0.2, timeout=settings.timeout,
+                                            base_url=settings.base_url, model=settings.model,
+                                            client=settings.client)
 
-All prompts below are issued only when deterministic rules are weak. Temperature is **0.2** and responses are constrained to **JSON** for reproducibility.
-If the environment lacks an API key or --use-llm is not provided, no LLM prompts are logged and heuristics are used instead.
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max(1, settings.concurrency)) as pool:
+        for batch, (prompt, response) in zip(batches, pool.map(ask, batches)):
+            if batch_size == 1:
+                answers = {batch[0]: response}
+                title = "device_type classification"
+            else:
+                by_id = response if isinstance(response, dict) else {}
+                answers = {i: by_id.get(str(n)) for n, i in enumerate(batch, 1)}
+                title = f"device_type classification (batch of {len(batch)})"
+            for i, answer in answers.items():
+                device_type[i], device_conf[i] = apply_llm_answer(answer, device_type[i], device_conf[i])
+                if cache is not None and answer and isinstance(answer, dict):
+                    cache.put(keys[i], answer)
+            log_prompt(prompts_path, title=title, prompt=prompt,
+                       response=response, rationale="LLM used only when heuristics were weak (<0.6).")
+
+    # rows sharing a hint with an earlier weak row get the same answer
+    for i, same in followers.items():
+        for j in same:
+            device_type[j], device_conf[j] = device_type[i], device_conf[i]
+    if cache is not None:
+        cache.flush()
+
+
+# ------------------------------
+# Offline classifier (--model)
+# ------------------------------
+
+# Character n-gram sizes read from hint_text
+NGRAM_SIZES = (2, 3, 4)
+
+# Labels the model learns; "unknown" answers teach it nothing
+MODEL_LABELS = frozenset(json.loads(DEVICE_TYPE_LABELS)) - {"unknown"}
+
+
+def hint_ngrams(text: str) -> List[str]:
+    """Distinct character n-grams of a hint, lowercased and space-padded so word edges count."""
+    t = f" {' '.join(text.lower().split())} "
+    return list(dict.fromkeys(t[i:i + n] for n in NGRAM_SIZES for i in range(len(t) - n + 1)))
+
+
+def _confident_label(answer, min_confidence: float) -> str:
+    if not isinstance(answer, dict):
+        return ""
+    label = str(answer.get("device_type", ""))
+    try:
+        conf = float(answer.get("confidence", 0))
+    except (TypeError, ValueError):
+        return ""
+    return label if label in MODEL_LABELS and conf >= min_confidence else ""
+
+
+def prompt_log_examples(path: str, min_confidence: float = 0.6) -> List[Tuple[str, str]]:
+    """(hint_text, device_type) pairs from the answered single-row and batch prompts in a prompts.md."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    examples = []
+    for m in re.finditer(r"\*\*Prompt\*\*\s*```\n(.*?)```\s*\*\*Response\*\*\s*```\n(.*?)```", text, re.S):
+        prompt, response = m.groups()
+        try:
+            answer = json.loads(response)
+        except ValueError:
+            continue
+        single = re.search(r"Hints \(free-form text\):\n(.*?)\n\nAllowed", prompt, re.S)
+        batch = re.search(r"Assets \(id: free-form hints\):\n(.*?)\n\nAllowed", prompt, re.S)
+        if single:
+            pairs = [(single.group(1), answer)]
+        elif batch and isinstance(answer, dict):
+            pairs = [(hint, answer.get(rid)) for rid, _, hint in
+                     (line.partition(": ") for line in batch.group(1).splitlines())]
+        else:
+            continue
+        for hint, ans in pairs:
+            label = _confident_label(ans, min_confidence)
+            if hint.strip() and label:
+                examples.append((hint.strip(), label))
+    return examples
+
+
+def clean_csv_examples(path: str, min_confidence: float = 0.6) -> List[Tuple[str, str]]:
+    """
+    (hint_text, device_type) pairs from an earlier inventory_clean.csv: rows settled with
+    confidence >= min_confidence, except the model's own. The raw device_type column is not
+    kept in the output, so the hint is rebuilt from hostname, fqdn, owner_team and site.
+    """
+    examples = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            steps = row.get("normalization_steps") or ""
+            if "device:ngram_model" in (steps_text(int(steps)) if steps.isdigit() else steps):
+                continue
+            try:
+                conf = float(row.get("device_type_confidence") or 0)
+            except ValueError:
+                continue
+            hint = " ".join(row.get(c) or "" for c in ("hostname", "fqdn", "owner_team", "site")).strip()
+            label = _confident_label({"device_type": row.get("device_type"), "confidence": conf}, min_confidence)
+            if hint and label:
+                examples.append((hint, label))
+    return examples
+
+
+def training_examples(paths: List[str], min_confidence: float = 0.6) -> List[Tuple[str, str]]:
+    """Examples from prompts.md logs (.md) and clean CSVs, in the order given."""
+    examples = []
+    for path in paths:
+        load = prompt_log_examples if path.lower().endswith(".md") else clean_csv_examples
+        examples.extend(load(path, min_confidence))
+    return examples
+
+
+class DeviceModel:
+    """
+    Naive Bayes over the distinct character n-grams of hint_text (Laplace-smoothed),
+    saved as a small .npz of labels, vocabulary, per-label counts and a temperature.
+    Whole batches are scored with array gathers and bincounts; rows the model is sure
+    about (probability >= threshold) skip the LLM.
+    """
+
+    def __init__(self, labels, vocab, counts, docs, temperature: float = 1.0, threshold: float = 0.8):
+        self.labels = [str(label) for label in labels]
+        self.vocab = {str(g): i for i, g in enumerate(vocab)}
+        self.counts = np.asarray(counts, dtype=np.uint32)
+        self.docs = np.asarray(docs, dtype=np.uint32)
+        self.temperature = float(temperature)
+        self.threshold = threshold
+        self.fingerprint = ""
+        self.scored = 0
+        self.settled = 0
+        n_labels, n_vocab = self.counts.shape
+        self.log_prior = np.log((self.docs + 1.0) / (self.docs.sum() + n_labels))
+        totals = self.counts.sum(axis=1, keepdims=True, dtype=np.float64)
+        self.log_like = np.log((self.counts + 1.0) / (totals + n_vocab))
+
+    @classmethod
+    def _count(cls, examples: List[Tuple[str, str]]) -> "DeviceModel":
+        labels = sorted({label for _, label in examples})
+        label_id = {label: i for i, label in enumerate(labels)}
+        vocab: Dict[str, int] = {}
+        feats = [[vocab.setdefault(g, len(vocab)) for g in hint_ngrams(hint)] for hint, _ in examples]
+        doc_labels = np.array([label_id[label] for _, label in examples], dtype=np.int64)
+        rows = np.repeat(doc_labels, [len(f) for f in feats])
+        cols = np.fromiter((i for f in feats for i in f), dtype=np.int64, count=len(rows))
+        counts = np.bincount(rows * len(vocab) + cols, minlength=len(labels) * len(vocab))
+        docs = np.bincount(doc_labels, minlength=len(labels))
+        return cls(labels, list(vocab), counts.reshape(len(labels), len(vocab)), docs)
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]]) -> "DeviceModel":
+        """
+        Count all examples. Naive Bayes posteriors are far too sure of themselves, so the
+        temperature is the one that best predicts every fifth example from the others.
+        """
+        model = cls._count(examples)
+        held = examples[::5]
+        rest = [e for i, e in enumerate(examples) if i % 5]
+        if held and rest:
+            probe = cls._count(rest)
+            label_id = {label: i for i, label in enumerate(probe.labels)}
+            pairs = [(hint, label_id[label]) for hint, label in held if label in label_id]
+            scores, _ = probe.scores([hint for hint, _ in pairs])
+            truth = np.array([t for _, t in pairs], dtype=np.int64)
+            best_loss = np.inf
+            for t in np.geomspace(1, 1000, 61):
+                s = scores / t
+                top = s.max(axis=0)
+                loss = np.mean(np.log(np.exp(s - top).sum(axis=0)) + top - s[truth, np.arange(len(truth))])
+                if loss < best_loss:
+                    best_loss, model.temperature = loss, float(t)
+        return model
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, labels=np.array(self.labels, dtype=str), vocab=np.array(list(self.vocab), dtype=str),
+                                counts=self.counts, docs=self.docs, temperature=self.temperature)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.8) -> "DeviceModel":
+        import hashlib
+        with np.load(path, allow_pickle=False) as z:
+            model = cls(z["labels"], z["vocab"], z["counts"], z["docs"], z["temperature"], threshold)
+        with open(path, "rb") as f:
+            model.fingerprint = hashlib.sha256(f.read()).hexdigest()
+        return model
+
+    def scores(self, hints) -> Tuple[np.ndarray, np.ndarray]:
+        """Log joint score per label (rows) and hint (columns), and the known n-grams per hint."""
+        vocab = self.vocab
+        feats = [[vocab[g] for g in hint_ngrams(hint) if g in vocab] for hint in hints]
+        known = np.array([len(f) for f in feats], dtype=np.int64)
+        doc_ids = np.repeat(np.arange(len(feats)), known)
+        feat_ids = np.fromiter((i for f in feats for i in f), dtype=np.int64, count=int(known.sum()))
+        scores = np.stack([np.bincount(doc_ids, weights=self.log_like[c, feat_ids], minlength=len(feats))
+                           for c in range(len(self.labels))])
+        return scores + self.log_prior[:, None], known
+
+    def predict(self, hints) -> Tuple[List[str], np.ndarray]:
+        """Best label and its tempered posterior for each hint; 0.0 when no n-gram is known."""
+        scores, known = self.scores(hints)
+        scores = np.exp((scores - scores.max(axis=0)) / self.temperature)
+        best = scores.argmax(axis=0)
+        prob = scores[best, np.arange(len(known))] / scores.sum(axis=0)
+        prob[known == 0] = 0.0
+        return [self.labels[b] for b in best], prob
+
+    def settle(self, rows, hints, device_type, device_conf) -> List[int]:
+        """
+        Classify the weak `rows` (positions) once per distinct hint, updating `device_type`
+        and `device_conf` in place where the model is sure; returns the rows it settled.
+        """
+        rows = list(rows)
+        if not rows or not self.labels:
+            return []
+        distinct = list(dict.fromkeys(hints[i] for i in rows))
+        labels, prob = self.predict(distinct)
+        answers = {hint: (label, float(p)) for hint, label, p in zip(distinct, labels, prob) if p >= self.threshold}
+        settled = []
+        for i in rows:
+            answer = answers.get(hints[i])
+            if answer is not None:
+                device_type[i], device_conf[i] = answer
+                settled.append(i)
+        self.scored += len(rows)
+        self.settled += len(settled)
+        return settled
+
+
+# Offline model from --model; None sends every weak row to the LLM
+DEVICE_MODEL: Optional[DeviceModel] = None
+
+
+def set_device_model(model: Optional[DeviceModel]) -> None:
+    global DEVICE_MODEL
+    DEVICE_MODEL = model
+
+
+# ------------------------------
+# Core processing
+# ------------------------------
+
+# Input column aliases: logical field -> accepted header names (matched case-insensitively)
+COLUMN_ALIASES = {
+    "ip": ["ip", "ip_address", "address"],
+    "hostname": ["hostname", "host", "shortname"],
+    "fqdn": ["fqdn", "name", "dns_name", "full_name"],
+    "mac": ["mac", "mac_address", "ether"],
+    "owner": ["owner", "user", "assigned_to", "responsible"],
+    "device_type": ["device_type", "type", "role"],
+    "site": ["site", "location", "office", "po", "dc"],
+    "source_row_id": ["source_row_id", "row_id", "id"],
+}
+
+OUTPUT_COLUMNS = [
+    "ip", "ip_valid", "ip_version", "subnet_cidr",
+    "hostname", "hostname_valid", "fqdn", "fqdn_consistent", "reverse_ptr",
+    "mac", "mac_valid",
+    "owner", "owner_email", "owner_team",
+    "device_type", "device_type_confidence",
+    "site", "site_normalized",
+    "source_row_id", "normalization_steps"
+]
+
+
+# Every normalization step, in the order a row can log them. A row keeps its steps as a
+# bitmask (bit i = STEP_CODES[i]); the ';'-joined text is rebuilt when the row is written.
+STEP_CODES = [
+    "ip:validated", "ip:invalid",
+    "hostname:lowercased", "hostname:invalid_format",
+    "fqdn:lowercased", "fqdn:invalid",
+    "mac:removed_separators", "mac:normalized_colon_upper", "mac:invalid",
+    "owner:email_extracted", "owner:directory_match", "owner:team_inferred",
+    "site:building_tagged", "site:normalized", "site:assumed_three_letter_code", "site:unknown",
+    "device:heuristic_match", "device:oui_vendor", "device:ngram_model", "device:default_server_when_unknown",
+]
+STEP_BITS = {code: 1 << i for i, code in enumerate(STEP_CODES)}
+
+# Every anomaly kind as (fields, issue_type, recommended_action): the per-row kinds in the
+# order normalize_record() emits them, low confidence, then the cross-row conflicts
+ANOMALY_KINDS = [
+    (["ip"], "invalid_ip", "Fix or remove invalid IP address."),
+    (["ip", "subnet_cidr"], "unknown_subnet", "Add the subnet to IPAM or correct the IP address."),
+    (["hostname"], "invalid_hostname", "Use RFC‑952/1123 compliant hostname."),
+    (["fqdn"], "invalid_fqdn", "Ensure labels are 1–63 chars; only letters/digits/hyphens."),
+    (["hostname", "fqdn"], "mismatch", "Make FQDN start with the hostname label."),
+    (["mac"], "invalid_mac", "Provide 12 hex digits; use colon notation."),
+    (["owner"], "missing_owner", "Add owner or owner_email for accountability."),
+    (["site"], "unknown_site", "Map to a canonical site code (e.g., SJC, NYC)."),
+    (["device_type"], "low_confidence_device_type", "Review classification; add better hints (e.g., role, model)."),
+    (["ip"], "duplicate_ip", "Give each asset its own IP; retire stale or duplicated records."),
+    (["mac"], "duplicate_mac", "Check for cloned VMs or typos; a MAC should belong to one asset."),
+    (["fqdn", "ip"], "fqdn_multi_ip", "Point the FQDN at one address per IP version, or document round-robin DNS."),
+]
+ANOMALY_KIND = {issue_type: code for code, (_, issue_type, _) in enumerate(ANOMALY_KINDS)}
+(INVALID_IP, UNKNOWN_SUBNET, INVALID_HOSTNAME, INVALID_FQDN, MISMATCH, INVALID_MAC, MISSING_OWNER, UNKNOWN_SITE,
+ LOW_CONFIDENCE, DUPLICATE_IP, DUPLICATE_MAC, FQDN_MULTI_IP) = range(len(ANOMALY_KINDS))
+
+
+def steps_mask(steps: List[str]) -> int:
+    mask = 0
+    for step in steps:
+        mask |= STEP_BITS[step]
+    return mask
+
+
+@lru_cache(maxsize=None)
+def steps_text(mask: int) -> str:
+    """Bitmask -> the ';'-joined steps, as the row logged them."""
+    return ";".join(code for i, code in enumerate(STEP_CODES) if mask >> i & 1)
+
+
+def expand_steps(masks) -> List[str]:
+    """steps_text() for a column of masks (ints, or their CSV text under --incremental)."""
+    return [steps_text(int(m)) for m in masks]
+
+
+@dataclass
+class Anomaly:
+    row_id: int
+    fields: List[str]
+    issue_type: str
+    recommended_action: str
+    # cross-row conflicts only: source_row_id of every row involved, row_id being the first
+    related_rows: Optional[List[int]] = None
+
+
+class AnomalyTable:
+    """
+    Anomalies as parallel integer arrays: source_row_id, kind (index into ANOMALY_KINDS)
+    and the row's position in its batch, plus the related rows of cross-row conflicts by
+    entry. Fields and texts are looked up only when records are written; iterating
+    yields Anomaly objects.
+    """
+
+    def __init__(self):
+        self.row_ids = array("q")
+        self.kinds = array("B")
+        self.positions = array("q")
+        self.related: Dict[int, List[int]] = {}
+
+    @classmethod
+    def from_arrays(cls, row_ids, kinds, positions) -> "AnomalyTable":
+        table = cls()
+        table.row_ids.frombytes(np.ascontiguousarray(row_ids, dtype=np.int64).tobytes())
+        table.kinds.frombytes(np.ascontiguousarray(kinds, dtype=np.uint8).tobytes())
+        table.positions.frombytes(np.ascontiguousarray(positions, dtype=np.int64).tobytes())
+        return table
+
+    @classmethod
+    def from_records(cls, records) -> "AnomalyTable":
+        """Rebuild from (position, anomaly record) pairs, e.g. records saved by --incremental."""
+        table = cls()
+        for pos, rec in records:
+            table.add(rec["row_id"], ANOMALY_KIND[rec["issue_type"]], pos, rec.get("related_rows"))
+        return table
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row_ids, kinds, positions) as numpy views."""
+        # copies: a live view would pin the arrays' buffers and block later appends
+        return (np.frombuffer(self.row_ids, dtype=np.int64).copy(), np.frombuffer(self.kinds, dtype=np.uint8).copy(),
+                np.frombuffer(self.positions, dtype=np.int64).copy())
+
+    def add(self, row_id: int, kind: int, position: int, related: Optional[List[int]] = None) -> None:
+        if related is not None:
+            self.related[len(self.row_ids)] = related
+        self.row_ids.append(row_id)
+        self.kinds.append(kind)
+        self.positions.append(position)
+
+    def extend(self, other: "AnomalyTable", offset: int = 0) -> None:
+        """Append `other`, shifting its positions by `offset`."""
+        for i, related in other.related.items():
+            self.related[len(self.row_ids) + i] = related
+        self.row_ids.extend(other.row_ids)
+        self.kinds.extend(other.kinds)
+        self.positions.extend([p + offset for p in other.positions] if offset else other.positions)
+
+    def __add__(self, other: "AnomalyTable") -> "AnomalyTable":
+        table = AnomalyTable()
+        table.extend(self)
+        table.extend(other)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def __iter__(self):
+        for i in range(len(self.row_ids)):
+            fields, issue_type, action = ANOMALY_KINDS[self.kinds[i]]
+            yield Anomaly(self.row_ids[i], list(fields), issue_type, action, self.related.get(i))
+
+    def records(self):
+        """The anomaly records as written: row_id, fields, issue_type, recommended_action[, related_rows]."""
+        related = self.related
+        for i, (row_id, kind) in enumerate(zip(self.row_ids, self.kinds)):
+            fields, issue_type, action = ANOMALY_KINDS[kind]
+            rec = {"row_id": row_id, "fields": fields, "issue_type": issue_type, "recommended_action": action}
+            if i in related:
+                rec["related_rows"] = related[i]
+            yield rec
+
+    def compact_records(self):
+        """Records as {"row_id", "kind"} (plus "related_rows" for conflicts) for --compact-codes."""
+        related = self.related
+        for i, (row_id, kind) in enumerate(zip(self.row_ids, self.kinds)):
+            rec = {"row_id": row_id, "kind": kind}
+            if i in related:
+                rec["related_rows"] = related[i]
+            yield rec
+
+    def issue_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for kind in self.kinds:
+            issue_type = ANOMALY_KINDS[kind][1]
+            counts[issue_type] = counts.get(issue_type, 0) + 1
+        return counts
+
+
+@dataclass
+class Normalized:
+    """
+    Output of the deterministic stage, before device classification is finalized.
+    `frame` has OUTPUT_COLUMNS plus `hint_text`, with device_type/device_type_confidence
+    holding the raw heuristic guess and normalization_steps the step bitmask.
+    """
+    frame: pd.DataFrame
+    anomalies: AnomalyTable
+    # dedup engine only: column -> [rows, normalizer calls]
+    stats: Dict[str, List[int]] = field(default_factory=dict)
+    # with metrics on: normalizer timings gathered while building this batch (see Metrics.take)
+    metrics: Dict[str, List[float]] = field(default_factory=dict)
+
+
+def pick_columns(columns) -> Dict[str, Optional[str]]:
+    """Find the input column for each logical field; first match in file order wins."""
+    picked: Dict[str, Optional[str]] = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        picked[key] = next((c for c in columns if c.lower() in aliases), None)
+    return picked
+
+
+def given_row_id(cell) -> Optional[int]:
+    """The id an input id cell carries: its text as a whole decimal number (surrounding spaces allowed), else None."""
+    text = str(cell).strip()
+    return int(text) if text.isdecimal() else None
+
+
+def source_row_id(cell, idx: int) -> int:
+    """
+    The row's source_row_id: its given_row_id(), else the 1-based position `idx + 1`.
+    Every engine and read path goes through this, with the id column kept as text, so
+    blank or non-numeric ids fall back the same way everywhere.
+    """
+    given = given_row_id(cell)
+    return int(idx) + 1 if given is None else given
+
+
+def normalize_record(row, cols: Dict[str, Optional[str]], idx: int) -> Tuple[Dict, List[int]]:
+    """
+    Deterministic stage for one input row (a Series or a plain dict, read with `cols`
+    from pick_columns): the output row with `hint_text`, the raw device guess and the
+    step bitmask, and its anomaly kinds in emission order. `idx` backs the source_row_id fallback.
+    """
+    anomalies: List[int] = []
+    flag = anomalies.append
+    col_ip = cols["ip"]
+    col_host = cols["hostname"]
+    col_fqdn = cols["fqdn"]
+    col_mac = cols["mac"]
+    col_owner = cols["owner"]
+    col_device = cols["device_type"]
+    col_site = cols["site"]
+    col_src_id = cols["source_row_id"]
+
+    steps_all: List[str] = []
+    source_id = source_row_id(row[col_src_id], idx) if col_src_id else int(idx) + 1
+    raw_ip = str(row[col_ip]) if col_ip else ""
+    raw_host = str(row[col_host]) if col_host else ""
+    raw_fqdn = str(row[col_fqdn]) if col_fqdn else ""
+    raw_mac = str(row[col_mac]) if col_mac else ""
+    raw_owner = str(row[col_owner]) if col_owner else ""
+    raw_device = str(row[col_device]) if col_device else ""
+    raw_site = str(row[col_site]) if col_site else ""
+
+    # IP
+    ip, ip_valid, ip_version, subnet_cidr, reverse_ptr, steps = normalize_ip(raw_ip)
+    steps_all.extend(steps)
+    if not ip_valid:
+        flag(INVALID_IP)
+    elif SUBNET_INDEX is not None and not subnet_cidr:
+        flag(UNKNOWN_SUBNET)
+
+    # Hostname
+    hostname, hostname_valid, steps = normalize_hostname(raw_host)
+    steps_all.extend(steps)
+    if raw_host and not hostname_valid:
+        flag(INVALID_HOSTNAME)
+
+    # FQDN
+    fqdn, fqdn_valid, steps = validate_fqdn(raw_fqdn)
+    steps_all.extend(steps)
+    fqdn_consistent = hostname_valid and fqdn_valid and fqdn_consistent_with_hostname(hostname, fqdn)
+    if raw_fqdn and not fqdn_valid:
+        flag(INVALID_FQDN)
+    if hostname_valid and fqdn_valid and not fqdn_consistent:
+        flag(MISMATCH)
+
+    # MAC
+    mac, mac_valid, steps = normalize_mac(raw_mac)
+    steps_all.extend(steps)
+    if raw_mac and not mac_valid:
+        flag(INVALID_MAC)
+
+    # Owner
+    owner, owner_email, owner_team, steps = parse_owner(raw_owner)
+    steps_all.extend(steps)
+    if not (owner or owner_email):
+        flag(MISSING_OWNER)
+
+    # Site
+    site, site_norm, steps = normalize_site(raw_site)
+    steps_all.extend(steps)
+    if site and not site_norm:
+        flag(UNKNOWN_SITE)
+
+    # Device type
+    # Start with deterministic heuristics using the best combined hint text
+    hint_text = " ".join([raw_device, hostname, fqdn, owner_team, site]).strip()
+    dev_guess, dev_conf, dev_steps = deterministic_device_guess(hint_text, mac_vendor(mac, mac_valid))
+    steps_all.extend(dev_steps)
+
+    # Assemble output row; classify_device_types() settles the final device_type
+    record = {
+        "ip": ip,
+        "ip_valid": bool(ip_valid),
+        "ip_version": int(ip_version) if ip_version else "",
+        "subnet_cidr": subnet_cidr,
+        "hostname": hostname,
+        "hostname_valid": bool(hostname_valid),
+        "fqdn": fqdn,
+        "fqdn_consistent": bool(fqdn_consistent),
+        "reverse_ptr": reverse_ptr,
+        "mac": mac,
+        "mac_valid": bool(mac_valid),
+        "owner": owner,
+        "owner_email": owner_email,
+        "owner_team": owner_team,
+        "device_type": dev_guess if dev_guess else "",
+        "device_type_confidence": dev_conf if dev_guess else 0.0,
+        "site": site,
+        "site_normalized": site_norm,
+        "source_row_id": source_id,
+        "normalization_steps": steps_mask(steps_all),
+        "hint_text": hint_text,
+    }
+    return record, anomalies
+
+
+def normalize_rows(df: pd.DataFrame) -> Normalized:
+    out_rows = []
+    anomalies = AnomalyTable()
+
+    cols = pick_columns(df.columns)
+    for pos, (idx, row) in enumerate(df.iterrows()):
+        record, kinds = normalize_record(row, cols, idx)
+        out_rows.append(record)
+        for kind in kinds:
+            anomalies.add(record["source_row_id"], kind, pos)
+
+    frame = pd.DataFrame(out_rows, columns=OUTPUT_COLUMNS + ["hint_text"])
+    return Normalized(frame, anomalies,
+                      metrics=METRICS.take() if METRICS is not None else {})
+
+
+def classify_device_types(norm: Normalized, prompts_path: str, enable_llm: bool,
+                          llm: Optional[LLMSettings] = None) -> Tuple[pd.DataFrame, AnomalyTable]:
+    """
+    Settle device_type for every row of a Normalized batch: the offline model (--model)
+    for weak guesses (<0.6), then the LLM for those still weak when enabled, "unknown"
+    otherwise, then the server default; finally
+    interleave low-confidence anomalies after each row's other anomalies.
+    """
+    frame = norm.frame
+    device_type = frame["device_type"].to_numpy(dtype=object).copy()
+    device_conf = frame["device_type_confidence"].to_numpy(dtype=float).copy()
+    steps = frame["normalization_steps"].to_numpy(dtype=np.int64).copy()
+    hints = frame["hint_text"].to_numpy(dtype=object)
+
+    if DEVICE_MODEL is not None:
+        # Offline model first; the LLM only sees rows it is unsure about too
+        weak = np.flatnonzero((device_type == "") | (device_conf < 0.6))
+        steps[DEVICE_MODEL.settle(weak, hints, device_type, device_conf)] |= STEP_BITS["device:ngram_model"]
+
+    if enable_llm and use_llm():
+        # If weak or unknown and LLM is allowed, try the LLM
+        weak = np.flatnonzero((device_type == "") | (device_conf < 0.6))
+        llm_classify_weak(weak, hints, device_type, device_conf, prompts_path, llm or LLMSettings())
+    else:
+        # LLM disabled or not requested: skip prompting; keep deterministic outcome only.
+        unknown = device_type == ""
+        device_type[unknown] = "unknown"
+        device_conf[unknown] = np.maximum(device_conf[unknown], 0.3)
+
+    # If still unknown but we have strong hostname tokens
+    default_server = (device_type == "") & (frame["hostname"] != "").to_numpy(dtype=bool)
+    device_type[default_server] = "server"
+    device_conf[default_server] = 0.4
+    steps[default_server] |= STEP_BITS["device:default_server_when_unknown"]
+
+    # round once per distinct confidence, with Python's round() like the row loop did
+    uniq, inverse = np.unique(device_conf, return_inverse=True)
+    rounded = np.array([round(float(c), 3) if c else 0.0 for c in uniq], dtype=float)
+
+    out_df = frame.drop(columns=["hint_text"]).reset_index(drop=True)
+    out_df["device_type"] = device_type
+    out_df["device_type_confidence"] = rounded[inverse.reshape(-1)] if len(uniq) else device_conf
+    out_df["normalization_steps"] = steps
+
+    # Device anomaly if still too weak
+    source_id = out_df["source_row_id"].to_numpy(dtype=np.int64)
+    low = np.flatnonzero(device_conf < 0.5)
+    row_ids, kinds, positions = norm.anomalies.arrays()
+    rows = np.concatenate([positions, low])
+    order = np.argsort(rows, kind="stable")
+    anomalies = AnomalyTable.from_arrays(np.concatenate([row_ids, source_id[low]])[order],
+                                         np.concatenate([kinds, np.full(len(low), LOW_CONFIDENCE)])[order],
+                                         rows[order])
+    return out_df, anomalies
+
+
+def process(df: pd.DataFrame, prompts_path: str, enable_llm: bool,
+            llm: Optional[LLMSettings] = None) -> Tuple[pd.DataFrame, AnomalyTable]:
+    return classify_device_types(normalize_rows(df), prompts_path, enable_llm, llm)
+
+
+# ------------------------------
+# Vectorized engine
+# ------------------------------
+
+# Whole-FQDN form of LABEL_RE; labels are at most 63 chars by construction.
+FQDN_RE = re.compile(r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?)*")
+
+def _obj(values, index) -> pd.Series:
+    # object dtype keeps the .str accessor on Python `re` semantics
+    return pd.Series(values, index=index, dtype=object)
+
+
+def _raw_columns(df: pd.DataFrame, cols: Dict[str, Optional[str]]) -> Tuple[Dict[str, pd.Series], Dict[str, np.ndarray]]:
+    """
+    Stringify the picked columns exactly like `str(row[col])` does under iterrows():
+    rows come from `df.values`, so an all-numeric frame is upcast before str().
+    Returns the string columns plus the underlying cell values.
+    """
+    values = df.values
+    raw, cells = {}, {}
+    for key, col in cols.items():
+        if col is None:
+            raw[key] = _obj([""] * len(df), df.index)
+        else:
+            cells[key] = values[:, df.columns.get_loc(col)]
+            raw[key] = _obj([str(v) for v in cells[key]], df.index)
+    return raw, cells
+
+
+def _source_ids(index: pd.Index, cells: Dict[str, np.ndarray], cols: Dict[str, Optional[str]]) -> np.ndarray:
+    """source_row_id per row (see source_row_id), falling back to the 1-based frame index."""
+    if cols["source_row_id"] is None:
+        return np.asarray(index, dtype=np.int64) + 1
+    return np.fromiter(map(source_row_id, cells["source_row_id"], index), dtype=np.int64, count=len(index))
+
+
+def _count_calls(stats: Dict[str, List[int]], name: str, rows: int, calls: int) -> None:
+    entry = stats.setdefault(name, [0, 0])
+    entry[0] += rows
+    entry[1] += calls
+
+
+def _map_values(func, values: pd.Series, width: int, name: str,
+                stats: Optional[Dict[str, List[int]]]) -> List[np.ndarray]:
+    """
+    Apply a scalar normalizer to every value and split its `width`-tuple results into
+    object arrays, the trailing steps list into a bitmask array. With `stats` (dedup mode)
+    it runs once per distinct value and the results are broadcast back by code.
+    """
+    codes = None
+    if stats is not None:
+        codes, uniques = pd.factorize(values.to_numpy())
+        _count_calls(stats, name, len(values), len(uniques))
+        results = [func(v) for v in uniques]
+    else:
+        results = [func(v) for v in values]
+    slots = []
+    for k in range(width):
+        if k == width - 1:
+            arr = np.fromiter((steps_mask(r[k]) for r in results), dtype=np.int64, count=len(results))
+        else:
+            arr = np.empty(len(results), dtype=object)
+            arr[:] = [r[k] for r in results]
+        slots.append(arr if codes is None else arr[codes])
+    return slots
+
+
+def _map_column(vector_fn, values: pd.Series, name: str,
+                stats: Optional[Dict[str, List[int]]]) -> tuple:
+    """Run a column normalizer, on the distinct values only when deduplicating."""
+    if stats is None:
+        return vector_fn(values)
+    codes, uniques = pd.factorize(values.to_numpy())
+    _count_calls(stats, name, len(values), len(uniques))
+    out = vector_fn(_obj(uniques, None))
+    return tuple(_obj(o.to_numpy()[codes], values.index) if isinstance(o, pd.Series) else o[codes]
+                 for o in out)
+
+
+def vector_hostname(raw: pd.Series) -> Tuple[pd.Series, np.ndarray, np.ndarray]:
+    s = raw.str.strip().str.lower()
+    nonempty = (s != "").to_numpy()
+    valid = s.str.match(HOSTNAME_RE.pattern).to_numpy(dtype=bool) & nonempty
+    steps = (np.where((s != raw).to_numpy(), STEP_BITS["hostname:lowercased"], 0)
+             | np.where(nonempty & ~valid, STEP_BITS["hostname:invalid_format"], 0))
+    return s, valid, steps
+
+
+def vector_fqdn(raw: pd.Series) -> Tuple[pd.Series, np.ndarray, np.ndarray]:
+    fqdn = raw.str.strip().str.lower()
+    nonempty = (fqdn != "").to_numpy()
+    valid = (fqdn.str.fullmatch(FQDN_RE.pattern).to_numpy(dtype=bool)
+             & (fqdn.str.len() <= 253).to_numpy() & nonempty)
+    # LABEL_RE.match() lets `$` match before a newline ending a label; keep that quirk exact
+    odd = np.flatnonzero(fqdn.str.contains("\n", regex=False).to_numpy(dtype=bool))
+    for i in odd:
+        valid[i] = validate_fqdn(raw.iat[i])[1]
+    steps = (np.where((fqdn != raw).to_numpy(), STEP_BITS["fqdn:lowercased"], 0)
+             | np.where(nonempty & ~valid, STEP_BITS["fqdn:invalid"], 0))
+    return fqdn, valid, steps
+
+
+def vector_mac(raw: pd.Series) -> Tuple[pd.Series, np.ndarray, np.ndarray]:
+    s = raw.str.strip()
+    nonempty = (s != "").to_numpy()
+    hex_only = s.str.replace(r"[^0-9a-fA-F]", "", regex=True)
+    valid = (hex_only.str.len() == 12).to_numpy() & nonempty
+    up = hex_only.str.upper()
+    colon = up.str[0:2]
+    for i in range(2, 12, 2):
+        colon = colon + ":" + up.str[i:i + 2]
+    mac = _obj(np.where(valid, colon, s.str.upper()), raw.index)
+    steps = (np.where(nonempty & (hex_only != s).to_numpy(), STEP_BITS["mac:removed_separators"], 0)
+             | np.where(valid, STEP_BITS["mac:normalized_colon_upper"],
+                        np.where(nonempty, STEP_BITS["mac:invalid"], 0)))
+    return mac, valid, steps
+
+
+# Dotted quads exactly as ipaddress.IPv4Address accepts them: ASCII digits, no leading zeros
+IPV4_RE = re.compile(r"(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.){3}"
+                     r"(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])")
+# Hex-and-colon IPv6 text; scope ids and embedded IPv4 take the ipaddress path
+IPV6_PLAIN_RE = re.compile(r"[0-9A-Fa-f:]+")
+
+
+@lru_cache(maxsize=1)
+def _hextets() -> np.ndarray:
+    return np.array([f"{i:x}" for i in range(1 << 16)], dtype=object)
+
+
+def _join_columns(columns: np.ndarray) -> np.ndarray:
+    return reduce(lambda a, b: a + ":" + b, columns.T) if columns.shape[1] else np.full(len(columns), "", dtype=object)
+
+
+def format_ipv6(groups: np.ndarray) -> np.ndarray:
+    """(n, 8) uint16 hextets -> text as str(IPv6Address) writes it: the first longest run of 2+ zero hextets becomes "::"."""
+    hexes = _hextets()[groups]
+    run = np.zeros(groups.shape, dtype=np.int8)
+    for k in range(8):
+        run[:, k] = np.where(groups[:, k] == 0, (run[:, k - 1] if k else 0) + 1, 0)
+    length = run.max(axis=1)
+    end = run.argmax(axis=1) + 1
+    length[length < 2] = 0
+    out = np.empty(len(groups), dtype=object)
+    for n_zero, stop in set(zip(length.tolist(), end.tolist())):
+        rows = np.flatnonzero((length == n_zero) & (end == stop))
+        if n_zero == 0:
+            out[rows] = _join_columns(hexes[rows])
+        else:
+            out[rows] = _join_columns(hexes[rows, :stop - n_zero]) + "::" + _join_columns(hexes[rows, stop:])
+    return out
+
+
+def reverse_ptr_ipv6(nibbles: np.ndarray) -> np.ndarray:
+    """(n, 16) big-endian address bytes -> ip6.arpa names, as IPv6Address.reverse_pointer writes them."""
+    digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    text = np.full((len(nibbles), 64), ord("."), dtype=np.uint8)
+    text[:, 0::4] = digits[nibbles[:, ::-1] & 0xF]
+    text[:, 2::4] = digits[nibbles[:, ::-1] >> 4]
+    names = np.ascontiguousarray(text).view("S64").ravel()
+    return np.char.add(np.char.decode(names, "ascii"), "ip6.arpa").astype(object)
+
+
+def vector_ip(raw: pd.Series) -> Tuple[np.ndarray, ...]:
+    """
+    Bulk normalize_ip(), same outputs in _map_values() form. Dotted quads are validated by
+    one regex and packed into uint32; hex-and-colon IPv6 is packed by inet_pton into paired
+    uint64 words. Canonical text, subnet_cidr and reverse_ptr come from masks and string
+    operations over those arrays. Anything else that may be an address (scope ids, embedded
+    IPv4, IPv4-mapped, whose text varies across Python versions) goes through normalize_ip().
+    """
+    import socket
+    n = len(raw)
+    text = np.empty(n, dtype=object)
+    text[:] = [v.strip() for v in raw.tolist()]
+    ip = text.copy()
+    valid = np.zeros(n, dtype=bool)
+    version = np.zeros(n, dtype=object)
+    subnet = np.full(n, "", dtype=object)
+    rptr = np.full(n, "", dtype=object)
+    steps = np.where(text != "", STEP_BITS["ip:invalid"], 0)
+
+    # plain loops over compiled patterns beat the .str accessor's per-call overhead here
+    v4_match, v6_plain = IPV4_RE.fullmatch, IPV6_PLAIN_RE.fullmatch
+    v4 = np.flatnonzero(np.fromiter((v4_match(t) is not None for t in text), dtype=bool, count=n))
+    if len(v4):
+        # every match has exactly three dots, so one join/split yields all octets
+        octets = np.array(".".join(text[v4]).split("."), dtype=object).reshape(-1, 4)
+        valid[v4] = True
+        version[v4] = 4
+        steps[v4] = STEP_BITS["ip:validated"]
+        if SUBNET_INDEX is not None:
+            packed = octets.astype(np.uint32)
+            addr = (packed[:, 0] << 24) | (packed[:, 1] << 16) | (packed[:, 2] << 8) | packed[:, 3]
+            subnet[v4] = SUBNET_INDEX.lookup_v4(addr)
+        else:
+            subnet[v4] = octets[:, 0] + "." + octets[:, 1] + "." + octets[:, 2] + ".0/24"
+        rptr[v4] = octets[:, 3] + "." + octets[:, 2] + "." + octets[:, 1] + "." + octets[:, 0] + ".in-addr.arpa"
+
+    maybe_v6 = np.fromiter((":" in t for t in text), dtype=bool, count=n)
+    plain = np.zeros(n, dtype=bool)
+    plain[maybe_v6] = [v6_plain(t) is not None for t in text[maybe_v6]]
+    packed6, v6 = [], []
+    for i in np.flatnonzero(plain):
+        try:
+            packed6.append(socket.inet_pton(socket.AF_INET6, text[i]))
+            v6.append(i)
+        except OSError:
+            pass
+    fallback = np.flatnonzero(maybe_v6 & ~plain)
+    if v6:
+        raw6 = np.frombuffer(b"".join(packed6), dtype=np.uint8).reshape(-1, 16)
+        words = raw6.view(">u8").reshape(-1, 2).astype(np.uint64)
+        mapped = (words[:, 0] == 0) & (words[:, 1] >> np.uint64(32) == 0xFFFF)
+        fallback = np.concatenate([fallback, np.asarray(v6)[mapped]])
+        keep = ~mapped
+        v6, raw6, words = np.asarray(v6)[keep], raw6[keep], words[keep]
+        groups = raw6.view(">u2").reshape(-1, 8).astype(np.uint16)
+        ip[v6] = format_ipv6(groups)
+        valid[v6] = True
+        version[v6] = 6
+        steps[v6] = STEP_BITS["ip:validated"]
+        if SUBNET_INDEX is not None:
+            subnet[v6] = SUBNET_INDEX.lookup_v6(raw6)
+        else:
+            groups[:, 4:] = 0
+            subnet[v6] = format_ipv6(groups) + "/64"
+        rptr[v6] = reverse_ptr_ipv6(raw6)
+    for i in fallback:
+        ip[i], valid[i], version[i], subnet[i], rptr[i], step_list = normalize_ip(text[i])
+        steps[i] = steps_mask(step_list)
+    return ip, valid, version, subnet, rptr, steps
+
+
+def normalize_vectorized(df: pd.DataFrame, dedup: bool = False) -> Normalized:
+    """
+    Column-wise equivalent of normalize_rows(): same outputs, byte for byte, without iterrows().
+    Regex checks, IP packing, MAC reformatting and lowercasing run over whole columns;
+    normalizers without a vector form (owner, site, device heuristics) are mapped per value.
+    With `dedup`, every normalizer runs once per distinct input value (or hint text)
+    and the results are broadcast back; Normalized.stats records the savings.
+    """
+    index = df.index
+    cols = pick_columns(df.columns)
+    raw, cells = _raw_columns(df, cols)
+    stats: Optional[Dict[str, List[int]]] = {} if dedup else None
+
+    source_id = _source_ids(index, cells, cols)
+
+    # IP
+    ip, ip_valid, ip_version, subnet_cidr, reverse_ptr, ip_steps = _map_column(vector_ip, raw["ip"], "ip", stats)
+    ip_valid = ip_valid.astype(bool)
+    ip_version = np.where(ip_version == 0, "", ip_version)
+
+    # Hostname / FQDN
+    hostname, hostname_valid, host_steps = _map_column(vector_hostname, raw["hostname"], "hostname", stats)
+    fqdn, fqdn_valid, fqdn_steps = _map_column(vector_fqdn, raw["fqdn"], "fqdn", stats)
+    # a valid hostname has no dots, so "fqdn starts with hostname." or "fqdn == hostname"
+    # reduces to comparing the first FQDN label
+    fqdn_consistent = (hostname_valid & fqdn_valid
+                       & (fqdn.str.split(".", n=1).str[0] == hostname).to_numpy(dtype=bool))
+
+    # MAC
+    mac, mac_valid, mac_steps = _map_column(vector_mac, raw["mac"], "mac", stats)
+
+    # Owner
+    owner, owner_email, owner_team, owner_steps = _map_values(parse_owner, raw["owner"], 4, "owner", stats)
+    owner, owner_email, owner_team = _obj(owner, index), _obj(owner_email, index), _obj(owner_team, index)
+
+    # Site
+    site, site_norm, site_steps = _map_values(normalize_site, raw["site"], 3, "site", stats)
+    site, site_norm = _obj(site, index), _obj(site_norm, index)
+
+    # Device type heuristics
+    hint_text = (raw["device_type"] + " " + hostname + " " + fqdn + " " + owner_team + " " + site).str.strip()
+    if OUI_INDEX is None:
+        dev_guess, dev_conf, dev_steps = _map_values(deterministic_device_guess, hint_text, 3, "hint_text", stats)
+    else:
+        keyed = _obj([(h, mac_vendor(m, v)) for h, m, v in zip(hint_text, mac, mac_valid)], hint_text.index)
+        dev_guess, dev_conf, dev_steps = _map_values(_guess_with_vendor, keyed, 3, "hint_text", stats)
+
+    frame = pd.DataFrame({
+        "ip": _obj(ip, index),
+        "ip_valid": ip_valid,
+        "ip_version": _obj(ip_version, index),
+        "subnet_cidr": _obj(subnet_cidr, index),
+        "hostname": hostname,
+        "hostname_valid": hostname_valid,
+        "fqdn": fqdn,
+        "fqdn_consistent": fqdn_consistent,
+        "reverse_ptr": _obj(reverse_ptr, index),
+        "mac": mac,
+        "mac_valid": mac_valid,
+        "owner": owner,
+        "owner_email": owner_email,
+        "owner_team": owner_team,
+        "device_type": _obj(dev_guess, index),
+        "device_type_confidence": np.where(dev_guess != "", dev_conf, 0.0).astype(float),
+        "site": site,
+        "site_normalized": site_norm,
+        "source_row_id": source_id,
+        "normalization_steps": ip_steps | host_steps | fqdn_steps | mac_steps | owner_steps | site_steps | dev_steps,
+        "hint_text": hint_text,
+    }, index=index, columns=OUTPUT_COLUMNS + ["hint_text"]).reset_index(drop=True)
+
+    # Anomalies: one mask per per-row kind (ANOMALY_KINDS order), emitted row by row
+    masks = [
+        ~ip_valid,
+        ip_valid & (subnet_cidr == "") & (SUBNET_INDEX is not None),
+        (raw["hostname"] != "").to_numpy() & ~hostname_valid,
+        (raw["fqdn"] != "").to_numpy() & ~fqdn_valid,
+        hostname_valid & fqdn_valid & ~fqdn_consistent,
+        (raw["mac"] != "").to_numpy() & ~mac_valid,
+        ((owner == "") & (owner_email == "")).to_numpy(),
+        ((site != "") & (site_norm == "")).to_numpy(),
+    ]
+    rows = [np.flatnonzero(m) for m in masks]
+    kinds = [np.full(len(r), k) for k, r in enumerate(rows)]
+    rows_all = np.concatenate(rows)
+    kinds_all = np.concatenate(kinds)
+    order = np.lexsort((kinds_all, rows_all))
+    anomalies = AnomalyTable.from_arrays(source_id[rows_all[order]], kinds_all[order], rows_all[order])
+    return Normalized(frame, anomalies, stats or {},
+                      METRICS.take() if METRICS is not None else {})
+
+
+def normalize_deduplicated(df: pd.DataFrame) -> Normalized:
+    return normalize_vectorized(df, dedup=True)
+
+
+def process_vectorized(df: pd.DataFrame, prompts_path: str, enable_llm: bool,
+                       llm: Optional[LLMSettings] = None) -> Tuple[pd.DataFrame, AnomalyTable]:
+    return classify_device_types(normalize_vectorized(df), prompts_path, enable_llm, llm)
+
+
+# ------------------------------
+# Metrics (--profile / --metrics-out)
+# ------------------------------
+
+# Normalizers timed when metrics are on; rebound to timed wrappers by enable_metrics()
+PROFILED_FUNCTIONS = [
+    "normalize_ip", "normalize_hostname", "validate_fqdn", "normalize_mac", "parse_owner",
+    "normalize_site", "deterministic_device_guess",
+    "vector_ip", "vector_hostname", "vector_fqdn", "vector_mac",
+]
+
+# Upper bounds (seconds) of the LLM latency histogram buckets; one more bucket catches the rest
+LLM_LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0]
+
+
+class Metrics:
+    """
+    Run-wide counters for --profile / --metrics-out: cumulative time and calls per
+    normalizer, wall time per stage, LLM latency histogram with failure and timeout
+    counts, and anomalies by issue_type. It only exists while enabled; every hook tests
+    METRICS for None, so a run without it pays one check per stage or LLM call.
+    Nested normalizers (e.g. vector_ip falling back to normalize_ip) count in both.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.stages: Dict[str, float] = {}
+        self.normalizers: Dict[str, List[float]] = {}  # name -> [calls, values, seconds]
+        self.llm_calls = 0
+        self.llm_failures = 0
+        self.llm_timeouts = 0
+        self.llm_seconds = 0.0
+        self.llm_latency = [0] * (len(LLM_LATENCY_BUCKETS) + 1)
+        self.anomalies: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, values: int, seconds: float) -> None:
+        entry = self.normalizers.setdefault(name, [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += values
+        entry[2] += seconds
+
+    def take(self) -> Dict[str, List[float]]:
+        """Hand over the normalizer counters gathered so far (to ship them out of a worker)."""
+        taken, self.normalizers = self.normalizers, {}
+        return taken
+
+    def merge(self, normalizers: Dict[str, List[float]]) -> None:
+        for name, (calls, values, seconds) in normalizers.items():
+            entry = self.normalizers.setdefault(name, [0, 0, 0.0])
+            entry[0] += calls
+            entry[1] += values
+            entry[2] += seconds
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def llm_call(self, seconds: float, ok: bool, timed_out: bool = False) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_failures += not ok
+            self.llm_timeouts += timed_out
+            self.llm_seconds += seconds
+            self.llm_latency[bisect.bisect_left(LLM_LATENCY_BUCKETS, seconds)] += 1
+
+    def count_anomalies(self, anomalies: AnomalyTable) -> None:
+        for issue_type, n in anomalies.issue_counts().items():
+            self.anomalies[issue_type] = self.anomalies.get(issue_type, 0) + n
+
+    def report(self, **extra) -> Dict:
+        wall = time.perf_counter() - self.started
+        labels = [f"<={b:g}s" for b in LLM_LATENCY_BUCKETS] + [f">{LLM_LATENCY_BUCKETS[-1]:g}s"]
+        return {
+            **extra,
+            "rows": self.rows,
+            "wall_seconds": round(wall, 6),
+            "rows_per_second": round(self.rows / wall, 1) if wall > 0 else 0.0,
+            "stages": {name: round(s, 6) for name, s in self.stages.items()},
+            "normalizers": {
+                name: {"calls": int(calls), "values": int(values), "seconds": round(seconds, 6)}
+                for name, (calls, values, seconds) in sorted(self.normalizers.items())
+            },
+            "llm": {
+                "calls": self.llm_calls,
+                "failures": self.llm_failures,
+                "timeouts": self.llm_timeouts,
+                "seconds": round(self.llm_seconds, 6),
+                "latency_histogram": dict(zip(labels, self.llm_latency)),
+            },
+            "anomalies_by_issue_type": dict(sorted(self.anomalies.items())),
+        }
+
+
+# Set by enable_metrics(); None keeps every hook a no-op
+METRICS: Optional[Metrics] = None
+
+
+def _profiled(name: str, func):
+    """Wrap a normalizer so each call adds its time to METRICS; column normalizers count values."""
+    column = name.startswith("vector_")
+
+    def timed(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            if METRICS is not None:
+                METRICS.count(name, len(args[0]) if column else 1, time.perf_counter() - start)
+
+    timed.__wrapped__ = func
+    return timed
+
+
+def enable_metrics() -> Metrics:
+    """Start a fresh Metrics and route the profiled normalizers through timers (idempotent)."""
+    global METRICS
+    METRICS = Metrics()
+    g = globals()
+    for name in PROFILED_FUNCTIONS:
+        if not hasattr(g[name], "__wrapped__"):
+            g[name] = _profiled(name, g[name])
+    return METRICS
+
+
+def stage(name: str):
+    """Time a pipeline stage into METRICS; a null context when metrics are off."""
+    return METRICS.stage(name) if METRICS is not None else contextlib.nullcontext()
+
+
+def init_worker(subnets: Optional[SubnetIndex], metrics: bool, oui: Optional[OUIIndex] = None,
+                sites: Optional[SiteDirectory] = None, owners: Optional[OwnerIndex] = None) -> None:
+    """Process pool initializer: same subnet table, OUI index, sites and owners as the parent, own metrics if enabled."""
+    set_subnet_index(subnets)
+    set_oui_index(oui)
+    set_owner_index(owners)
+    if sites is not None:
+        set_site_directory(sites)
+    if metrics:
+        enable_metrics()
+
+
+def print_metrics(report: Dict) -> None:
+    print(f"Profile: {report['rows']} rows in {report['wall_seconds']:.2f}s "
+          f"({report['rows_per_second']:.0f} rows/s)")
+    for name, seconds in report["stages"].items():
+        print(f"  stage {name:<12} {seconds:10.3f}s")
+    for name, n in report["normalizers"].items():
+        print(f"  {name:<28} {n['seconds']:10.3f}s {n['calls']:>10} calls {n['values']:>10} values")
+    llm = report["llm"]
+    if llm["calls"]:
+        print(f"  llm: {llm['calls']} calls, {llm['failures']} failed, {llm['timeouts']} timed out, "
+              f"{llm['seconds']:.2f}s total")
+    for issue_type, n in report["anomalies_by_issue_type"].items():
+        print(f"  anomalies {issue_type}: {n}")
+
+
+# ------------------------------
+# Parallel execution
+# ------------------------------
+
+NORMALIZERS = {
+    "rows": normalize_rows,
+    "vectorized": normalize_vectorized,
+    "dedup": normalize_deduplicated,
+}
+
+
+def split_frame(df: pd.DataFrame, n_shards: int) -> List[pd.DataFrame]:
+    """Contiguous row shards; each keeps its original index for the source_row_id fallback."""
+    bounds = np.linspace(0, len(df), min(n_shards, len(df)) + 1, dtype=np.int64)
+    return [df.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def concat_normalized(parts: List[Normalized]) -> Normalized:
+    """Stitch shard results back together in shard order."""
+    anomalies = AnomalyTable()
+    stats: Dict[str, List[int]] = {}
+    metrics = Metrics()
+    offset = 0
+    for part in parts:
+        anomalies.extend(part.anomalies, offset)
+        offset += len(part.frame)
+        for name, (rows, calls) in part.stats.items():
+            _count_calls(stats, name, rows, calls)
+        metrics.merge(part.metrics)
+    frame = pd.concat([p.frame for p in parts], ignore_index=True)
+    return Normalized(frame, anomalies, stats, metrics.normalizers)
+
+
+def process_frame(df: pd.DataFrame, prompts_path: str, enable_llm: bool, engine: str = "rows",
+                  pool: Optional[ProcessPoolExecutor] = None, n_shards: int = 1,
+                  llm: Optional[LLMSettings] = None,
+                  stats: Optional[Dict[str, List[int]]] = None) -> Tuple[pd.DataFrame, AnomalyTable]:
+    """
+    Run the deterministic stage with the chosen engine, optionally split into `n_shards`
+    over a process pool, then classify device types (and call the LLM) in this process.
+    Shards are merged in input order, so pooled output matches a single-process run.
+    Dedup statistics are added into `stats`.
+    """
+    normalize = NORMALIZERS[engine]
+    with stage("normalize"):
+        if pool is None or n_shards < 2 or len(df) < 2:
+            norm = normalize(df)
+        else:
+            norm = concat_normalized(list(pool.map(normalize, split_frame(df, n_shards))))
+    if stats is not None:
+        for name, (rows, calls) in norm.stats.items():
+            _count_calls(stats, name, rows, calls)
+    if METRICS is not None:
+        METRICS.merge(norm.metrics)
+    with stage("classify"):
+        return classify_device_types(norm, prompts_path, enable_llm, llm)
+
+
+# ------------------------------
+# Cross-row conflicts
+# ------------------------------
+
+# Anomaly kind of each conflict index (valid IP, valid MAC, FQDN + IP version)
+CONFLICT_KINDS = [DUPLICATE_IP, DUPLICATE_MAC, FQDN_MULTI_IP]
+
+
+def conflict_keys(out_df: pd.DataFrame) -> Iterator[Tuple[int, object, int, str]]:
+    """
+    (index, key, position in the batch, ip) for every value a clean batch puts in the
+    conflict indexes (positions in CONFLICT_KINDS order); accepts typed cells or their
+    CSV text (--incremental).
+    """
+    ip = out_df["ip"].tolist()
+    ip_valid = (out_df["ip_valid"].astype(str) == "True").tolist()
+    mac = out_df["mac"].tolist()
+    mac_valid = (out_df["mac_valid"].astype(str) == "True").tolist()
+    # only real multi-label names; a lone label (or a stringified NaN) names nothing
+    fqdn = out_df["fqdn"].astype(object)
+    fqdn_ok = (fqdn.str.contains(".", regex=False)
+               & fqdn.str.fullmatch(FQDN_RE.pattern) & (fqdn.str.len() <= 253)).to_numpy(dtype=bool)
+    version = out_df["ip_version"].astype(str).tolist()
+    fqdn = fqdn.tolist()
+    for pos in range(len(ip)):
+        if ip_valid[pos]:
+            yield 0, ip[pos], pos, ""
+            if fqdn_ok[pos]:
+                yield 2, (fqdn[pos], version[pos]), pos, ip[pos]
+        if mac_valid[pos]:
+            yield 1, mac[pos], pos, ""
+
+
+def record_conflict_keys(rows: List[Dict]) -> Iterator[Tuple[int, object, int, str]]:
+    """conflict_keys() for clean rows as dicts (process_records), without pandas."""
+    for pos, row in enumerate(rows):
+        if row["ip_valid"]:
+            yield 0, row["ip"], pos, ""
+            fqdn = row["fqdn"]
+            if "." in fqdn and len(fqdn) <= 253 and FQDN_RE.fullmatch(fqdn):
+                yield 2, (fqdn, str(row["ip_version"])), pos, row["ip"]
+        if row["mac_valid"]:
+            yield 1, row["mac"], pos, ""
+
+
+class ConflictIndex:
+    """
+    Finds assets that collide across rows, fed one clean batch at a time in a single
+    linear pass: hash indexes from valid IP, valid MAC and (FQDN, IP version) to the rows
+    that carry them. A value seen once costs one dict entry; only repeats keep row lists,
+    so memory follows distinct values and nothing is compared pairwise.
+    Dual-stack names (one IPv4 plus one IPv6 address) are not a conflict.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        # source_row_id per batch, and the position each batch starts at
+        self._ids: List = []
+        self._starts: List[int] = []
+        # kind -> key -> first position; kind -> key -> [(position, ip), ...] once repeated
+        self._first: List[Dict] = [{}, {}, {}]
+        self._repeats: List[Dict] = [{}, {}, {}]
+
+    def _index(self, keys) -> None:
+        first_of, repeats_of, offset = self._first, self._repeats, self.rows
+        for kind, key, pos, ip in keys:
+            pos += offset
+            first = first_of[kind].setdefault(key, (pos, ip))
+            if first[0] != pos:
+                repeats_of[kind].setdefault(key, [first]).append((pos, ip))
+
+    def add(self, out_df: pd.DataFrame) -> None:
+        """Index a clean batch; accepts typed cells or their CSV text (--incremental)."""
+        self._index(conflict_keys(out_df))
+        self._starts.append(self.rows)
+        self._ids.append(out_df["source_row_id"].to_numpy().astype(np.int64))
+        self.rows += len(out_df)
+
+    def add_records(self, rows: List[Dict]) -> None:
+        """add() for clean rows as dicts (process_records), without pandas."""
+        self._index(record_conflict_keys(rows))
+        self._starts.append(self.rows)
+        self._ids.append([row["source_row_id"] for row in rows])
+        self.rows += len(rows)
+
+    def _source_id(self, pos: int) -> int:
+        batch = bisect.bisect_right(self._starts, pos) - 1
+        return int(self._ids[batch][pos - self._starts[batch]])
+
+    def anomalies(self) -> AnomalyTable:
+        """One anomaly per conflicting value, ordered by its first row."""
+        found = []
+        for kind, repeats in enumerate(self._repeats):
+            for hits in repeats.values():
+                if kind == 2 and len({ip for _, ip in hits}) < 2:
+                    continue
+                found.append((hits[0][0], kind, [self._source_id(p) for p, _ in hits]))
+        return conflict_table(found)
+
+
+class SpillingConflictIndex:
+    """
+    ConflictIndex for --chunksize streams, in memory bounded by `run_size` lines
+    rather than by the number of distinct values. Each indexed value becomes a sortable
+    line "index, key, position, ip, source_row_id"; every full buffer is sorted and
+    spilled to a temporary file, and anomalies() k-way merges the runs so each value's
+    rows arrive together, in row order. Only conflicting rows are then held in memory.
+    Gives the same anomalies as ConflictIndex.
+    """
+
+    def __init__(self, run_size: int = 1_000_000, directory: Optional[str] = None):
+        self.run_size = run_size
+        self.directory = directory
+        self.rows = 0
+        self._lines: List[str] = []
+        self._runs: List[str] = []
+        self._tmp = None
+
+    def _index(self, keys, ids) -> None:
+        lines, offset = self._lines, self.rows
+        for kind, key, pos, ip in keys:
+            if kind == 2:
+                key = f"{key[0]}/{key[1]}"
+            # keys hold no tabs (valid IPs, MACs and FQDNs), so equal keys sort together
+            lines.append(f"{kind}\t{key}\t{pos + offset:012d}\t{ip}\t{ids[pos]}\n")
+            if len(lines) >= self.run_size:
+                self._spill()
+
+    def add(self, out_df: pd.DataFrame) -> None:
+        """Index a clean batch; accepts typed cells or their CSV text (--incremental)."""
+        self._index(conflict_keys(out_df), out_df["source_row_id"].tolist())
+        self.rows += len(out_df)
+
+    def add_records(self, rows: List[Dict]) -> None:
+        """add() for clean rows as dicts (process_records), without pandas."""
+        self._index(record_conflict_keys(rows), [row["source_row_id"] for row in rows])
+        self.rows += len(rows)
+
+    def _spill(self) -> None:
+        import tempfile
+        if self._tmp is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="conflicts-", dir=self.directory)
+        path = os.path.join(self._tmp.name, f"run{len(self._runs)}")
+        self._lines.sort()
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(self._lines)
+        self._runs.append(path)
+        self._lines.clear()
+
+    def anomalies(self) -> AnomalyTable:
+        """One anomaly per conflicting value, ordered by its first row."""
+        import heapq
+        found = []
+        self._lines.sort()
+        with contextlib.ExitStack() as stack:
+            runs = [stack.enter_context(open(path, encoding="utf-8")) for path in self._runs]
+            for _, group in itertools.groupby(heapq.merge(self._lines, *runs),
+                                              key=lambda line: line[:line.index("\t", 2)]):
+                hits = [line.rstrip("\n").split("\t") for line in group]
+                if len(hits) < 2 or (hits[0][0] == "2" and len({h[3] for h in hits}) < 2):
+                    continue
+                found.append((int(hits[0][2]), int(hits[0][0]), [int(h[4]) for h in hits]))
+        self._lines = []
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+        self._runs = []
+        return conflict_table(found)
+
+
+def conflict_table(found: List[Tuple[int, int, List[int]]]) -> AnomalyTable:
+    """(first position, index, related source_row_ids) per conflicting value -> anomalies by first row."""
+    found.sort(key=lambda t: t[:2])
+    table = AnomalyTable()
+    for pos, kind, related in found:
+        table.add(related[0], CONFLICT_KINDS[kind], pos, related)
+    return table
+
+
+def detect_conflicts(out_df: pd.DataFrame) -> AnomalyTable:
+    index = ConflictIndex()
+    index.add(out_df)
+    return index.anomalies()
+
+
+# ------------------------------
+# Columnar I/O (Parquet / Arrow IPC, needs pyarrow)
+# ------------------------------
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+COLUMNAR_INPUTS = (".parquet", ".arrow", ".feather")
+
+# Typed schemas for the columnar outputs; columns not listed are strings
+CLEAN_TYPES = {
+    "ip_valid": "bool", "hostname_valid": "bool", "fqdn_consistent": "bool", "mac_valid": "bool",
+    "ip_version": "int8", "device_type_confidence": "float64", "source_row_id": "int64",
+    "site_normalized": "dictionary", "device_type": "dictionary", "owner_team": "dictionary",
+}
+ANOMALY_COLUMNS = ["row_id", "fields", "issue_type", "recommended_action", "related_rows"]
+ANOMALY_TYPES = {"row_id": "int64", "fields": "list", "issue_type": "dictionary",
+                 "recommended_action": "dictionary", "related_rows": "int_list"}
+# --compact-codes: normalization_steps stays a bitmask, anomalies keep only their kind code
+COMPACT_CLEAN_TYPES = dict(CLEAN_TYPES, normalization_steps="int64")
+COMPACT_ANOMALY_COLUMNS = ["row_id", "kind", "related_rows"]
+COMPACT_ANOMALY_TYPES = {"row_id": "int64", "kind": "int8", "related_rows": "int_list"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise SystemExit("Parquet/Arrow I/O needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def arrow_schema(types: Dict[str, str], columns: List[str]):
+    pa = _pyarrow()
+    make = {
+        "bool": pa.bool_(), "int8": pa.int8(), "int64": pa.int64(), "float64": pa.float64(),
+        "string": pa.string(), "list": pa.list_(pa.string()), "int_list": pa.list_(pa.int64()),
+        "dictionary": pa.dictionary(pa.int32(), pa.string()),
+    }
+    return pa.schema([(c, make[types.get(c, "string")]) for c in columns])
+
+
+def missing_cell_text() -> Dict[str, str]:
+    """
+    What each text output column holds when its input cell was missing: pandas reads an
+    empty CSV cell as NaN, which reaches the normalizers as the text "nan". The CSV output
+    keeps that text; the typed schema turns it back into null.
+    """
+    site, site_normalized, _ = normalize_site("nan")
+    return {"ip": normalize_ip("nan")[0], "hostname": normalize_hostname("nan")[0],
+            "fqdn": validate_fqdn("nan")[0], "mac": normalize_mac("nan")[0],
+            "owner": parse_owner("nan")[0], "site": site, "site_normalized": site_normalized}
+
+
+def clean_columns(out_df: pd.DataFrame, types: Dict[str, str] = CLEAN_TYPES) -> Dict[str, list]:
+    """Clean frame -> typed values per `types`; takes typed cells or their CSV text (--incremental)."""
+    missing = missing_cell_text()
+    columns = {}
+    for name in OUTPUT_COLUMNS:
+        values = out_df[name].tolist()
+        kind = types.get(name, "string")
+        if kind == "bool":
+            columns[name] = [str(v) == "True" for v in values]
+        elif kind == "int8":
+            # "" (invalid IP) becomes null
+            columns[name] = [int(v) if str(v) else None for v in values]
+        elif kind == "int64":
+            columns[name] = [int(v) for v in values]
+        elif kind == "float64":
+            columns[name] = [float(v) for v in values]
+        elif name in missing:
+            columns[name] = [None if str(v) == missing[name] else str(v) for v in values]
+        else:
+            columns[name] = [str(v) for v in values]
+    return columns
+
+
+class ColumnarWriter:
+    """
+    Appends batches of columns to a Parquet file or an uncompressed Arrow IPC file (which
+    readers can memory-map). Dictionary columns are encoded against one dictionary that
+    only grows across writes, since IPC files accept dictionary deltas but not replacements.
+    """
+
+    def __init__(self, path: str, fmt: str, schema):
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.schema = schema
+        self.count = 0
+        self._dictionaries: Dict[str, Dict[str, int]] = {}
+        self._w = None
+
+    def __enter__(self) -> "ColumnarWriter":
+        pa = _pyarrow()
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._w = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self._w = pa.ipc.new_file(self.path, self.schema,
+                                      options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        return self
+
+    def write(self, columns: Dict[str, list]) -> None:
+        pa = _pyarrow()
+        arrays = []
+        for f in self.schema:
+            values = columns[f.name]
+            if pa.types.is_dictionary(f.type):
+                codes = self._dictionaries.setdefault(f.name, {})
+                indices = pa.array([None if v is None else codes.setdefault(v, len(codes)) for v in values],
+                                   pa.int32())
+                if not codes:
+                    # an all-null first batch: later values must extend a dictionary, not replace an empty one
+                    codes[""] = 0
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(list(codes), pa.string())))
+            else:
+                arrays.append(pa.array(values, f.type))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self._w.write_table(table)
+        self.count += table.num_rows
+
+    def __exit__(self, *exc) -> None:
+        self._w.close()
+
+
+def is_columnar(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in COLUMNAR_INPUTS
+
+
+def _columnar_frame(table, start: int, nulls: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Arrow table -> object frame with nulls as "" (typed input marks missing values
+    as null, so they should not stringify as "nan"/"None" the way CSV NaNs do), or as
+    `nulls[column]` where given.
+    """
+    df = table.to_pandas().astype(object)
+    for name, text in (nulls or {}).items():
+        if name in df:
+            df[name] = df[name].where(df[name].notna(), text)
+    df = df.where(df.notna(), "")
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+def _columnar_chunks(batches, nulls: Optional[Dict[str, str]] = None):
+    pa = _pyarrow()
+    start = 0
+    for batch in batches:
+        df = _columnar_frame(pa.Table.from_batches([batch]), start, nulls)
+        start += len(df)
+        yield df
+
+
+def read_raw(path: str, chunksize: int = 0, nulls: Optional[Dict[str, str]] = None):
+    """
+    The raw inventory from CSV, Parquet or Arrow IPC/Feather: one frame, or with
+    `chunksize` an iterable of frames (CSV chunks are read as text, see process_streaming).
+    A whole CSV keeps its other columns' inferred types, but its id column is read as
+    text too, so source_row_id comes out the same either way. `nulls` spells typed
+    nulls per column (see _columnar_frame).
+    """
+    if not is_columnar(path):
+        if chunksize > 0:
+            return pd.read_csv(path, chunksize=chunksize, dtype=str)
+        id_col = pick_columns(pd.read_csv(path, nrows=0).columns)["source_row_id"]
+        return pd.read_csv(path, dtype={id_col: str} if id_col else None)
+    pa = _pyarrow()
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        source = pq.ParquetFile(path)
+        if chunksize > 0:
+            return _columnar_chunks(source.iter_batches(batch_size=chunksize), nulls)
+        return _columnar_frame(source.read(), 0, nulls)
+    reader = pa.ipc.open_file(pa.memory_map(path))
+    if chunksize > 0:
+        batches = (b for i in range(reader.num_record_batches)
+                   for b in pa.Table.from_batches([reader.get_batch(i)]).to_batches(max_chunksize=chunksize))
+        return _columnar_chunks(batches, nulls)
+    return _columnar_frame(reader.read_all(), 0, nulls)
+
+
+class AnomalyWriter:
+    """
+    Incremental anomalies writer.
+    - "json":  a JSON array, byte-identical to json.dump(records, f, indent=2)
+    - "jsonl": one compact JSON object per line
+    - "parquet" / "arrow": a typed table (see ANOMALY_TYPES)
+    With `compact`, records are {"row_id", "kind"} (see ANOMALY_KINDS), one per line in "json".
+    """
+
+    def __init__(self, path: str, fmt: str = "json", compact: bool = False):
+        if fmt not in ("json", "jsonl") and fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown anomalies format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.compact = compact
+        self.count = 0
+        self._f = None
+
+    def __enter__(self) -> "AnomalyWriter":
+        if self.fmt in COLUMNAR_FORMATS:
+            schema = (arrow_schema(COMPACT_ANOMALY_TYPES, COMPACT_ANOMALY_COLUMNS) if self.compact
+                      else arrow_schema(ANOMALY_TYPES, ANOMALY_COLUMNS))
+            self._f = ColumnarWriter(self.path, self.fmt, schema)
+            self._f.__enter__()
+        else:
+            self._f = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def write(self, anomalies: AnomalyTable) -> None:
+        if METRICS is not None:
+            METRICS.count_anomalies(anomalies)
+        with stage("write"):
+            self._write(anomalies)
+
+    def _write(self, anomalies: AnomalyTable) -> None:
+        records = anomalies.compact_records() if self.compact else anomalies.records()
+        if self.fmt in COLUMNAR_FORMATS:
+            records = list(records)
+            columns = COMPACT_ANOMALY_COLUMNS if self.compact else ANOMALY_COLUMNS
+            self._f.write({c: [r.get(c) for r in records] for c in columns})
+            self.count += len(records)
+            return
+        for rec in records:
+            if self.fmt == "jsonl":
+                self._f.write(json.dumps(rec) + "\n")
+            elif self.compact:
+                self._f.write(("[\n" if self.count == 0 else ",\n") + json.dumps(rec))
+            else:
+                body = json.dumps(rec, indent=2).replace("\n", "\n  ")
+                self._f.write(("[\n  " if self.count == 0 else ",\n  ") + body)
+            self.count += 1
+
+    def __exit__(self, *exc) -> None:
+        if self.fmt in COLUMNAR_FORMATS:
+            self._f.__exit__(*exc)
+            return
+        if self.fmt == "json":
+            self._f.write("\n]" if self.count else "[]")
+        self._f.close()
+
+
+def write_anomalies(anomalies_path: str, anomalies: AnomalyTable, fmt: str = "json",
+                    compact: bool = False) -> None:
+    with AnomalyWriter(anomalies_path, fmt, compact) as writer:
+        writer.write(anomalies)
+
+
+class CleanWriter:
+    """
+    Incremental inventory_clean writer: CSV (header once), or a typed Parquet/Arrow table.
+    normalization_steps bitmasks are spelled out as text unless `compact`.
+    """
+
+    def __init__(self, path: str, fmt: str = "csv", compact: bool = False):
+        if fmt != "csv" and fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown output format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.compact = compact
+        self.types = COMPACT_CLEAN_TYPES if compact else CLEAN_TYPES
+        self.count = 0
+        self._f = None
+
+    def __enter__(self) -> "CleanWriter":
+        if self.fmt == "csv":
+            self._f = open(self.path, "w", encoding="utf-8", newline="")
+        else:
+            self._f = ColumnarWriter(self.path, self.fmt, arrow_schema(self.types, OUTPUT_COLUMNS))
+            self._f.__enter__()
+        return self
+
+    def write(self, out_df: pd.DataFrame) -> None:
+        if self.fmt == "csv" and out_df.empty:
+            return  # the header still comes once, from the first non-empty batch or __exit__
+        with stage("write"):
+            if not self.compact:
+                out_df = out_df.assign(normalization_steps=expand_steps(out_df["normalization_steps"]))
+            if self.fmt == "csv":
+                out_df.to_csv(self._f, index=False, header=self.count == 0)
+            else:
+                self._f.write(clean_columns(out_df, self.types))
+        self.count += len(out_df)
+        if METRICS is not None:
+            METRICS.rows += len(out_df)
+
+    def write_records(self, rows: List[Dict]) -> None:
+        """write() for process_records() rows, CSV only; same text as DataFrame.to_csv."""
+        with stage("write"):
+            writer = csv.writer(self._f, lineterminator=os.linesep)
+            if self.count == 0 and rows:
+                writer.writerow(OUTPUT_COLUMNS)
+            if not self.compact:
+                rows = [dict(row, normalization_steps=steps_text(row["normalization_steps"])) for row in rows]
+            writer.writerows([row[c] for c in OUTPUT_COLUMNS] for row in rows)
+        self.count += len(rows)
+        if METRICS is not None:
+            METRICS.rows += len(rows)
+
+    def __exit__(self, *exc) -> None:
+        if self.fmt == "csv":
+            if self.count == 0:
+                csv.writer(self._f, lineterminator=os.linesep).writerow(OUTPUT_COLUMNS)
+            self._f.close()
+        else:
+            self._f.__exit__(*exc)
+
+
+def write_codes(path: str) -> None:
+    """Legend for --compact-codes: bit i of normalization_steps, and anomaly kind codes."""
+    kinds = [{"kind": code, "fields": fields, "issue_type": issue_type, "recommended_action": action}
+             for code, (fields, issue_type, action) in enumerate(ANOMALY_KINDS)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"normalization_steps": STEP_CODES, "anomaly_kinds": kinds}, f, indent=2)
+
+
+def write_clean(clean_path: str, out_df: pd.DataFrame, fmt: str = "csv", compact: bool = False) -> None:
+    with CleanWriter(clean_path, fmt, compact) as writer:
+        writer.write(out_df)
+
+
+def _staged(chunks, name: str):
+    """Yield from `chunks`, timing each fetch as stage `name`."""
+    chunks = iter(chunks)
+    while True:
+        with stage(name):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def process_streaming(raw_path: str, clean_path: str, anomalies_path: str, prompts_path: str,
+                      enable_llm: bool, chunksize: int, engine: str = "rows",
+                      anomalies_format: str = "json", pool: Optional[ProcessPoolExecutor] = None,
+                      n_shards: int = 1, llm: Optional[LLMSettings] = None,
+                      stats: Optional[Dict[str, List[int]]] = None,
+                      output_format: str = "csv", compact: bool = False,
+                      zones: Optional["ZoneExport"] = None) -> Tuple[int, int]:
+    """
+    Normalize `raw_path` in chunks of `chunksize` rows, appending each chunk to the
+    clean output and the anomalies file (and `zones`) as it goes, so memory stays flat
+    with input size.
+
+    Every CSV column is read as text: per-chunk dtype inference could otherwise stringify
+    the same value differently (e.g. "17" vs "17.0") depending on its chunk; Parquet/Arrow
+    input has a fixed schema. The readers keep a running index across chunks, so the
+    `idx + 1` source_row_id fallback and the row order match a single-frame run.
+    Returns (rows, anomalies) written.
+    """
+    try:
+        reader = read_raw(raw_path, chunksize)
+    except Exception as e:
+        raise SystemExit(f"Failed to read {raw_path}: {e}")
+    conflicts = SpillingConflictIndex(directory=os.path.dirname(os.path.abspath(clean_path)))
+    with contextlib.closing(reader), CleanWriter(clean_path, output_format, compact) as clean_writer, \
+            AnomalyWriter(anomalies_path, anomalies_format, compact) as writer:
+        for chunk in _staged(reader, "read"):
+            out_df, anomalies = process_frame(chunk, prompts_path, enable_llm, engine=engine,
+                                              pool=pool, n_shards=n_shards, llm=llm, stats=stats)
+            clean_writer.write(out_df)
+            writer.write(anomalies)
+            with stage("conflicts"):
+                conflicts.add(out_df)
+            if zones is not None:
+                with stage("zones"):
+                    zones.add(out_df)
+        # conflicts span chunks, so they follow every per-row anomaly
+        with stage("conflicts"):
+            found = conflicts.anomalies()
+        writer.write(found)
+        if zones is not None:
+            with stage("zones"):
+                zones.finish(found)
+        return clean_writer.count, writer.count
+
+
+# ------------------------------
+# Multi-source input (--raw DIR or glob)
+# ------------------------------
+
+# Files picked up from an --raw directory
+SOURCE_INPUTS = (".csv",) + COLUMNAR_INPUTS
+
+
+def source_paths(raw: str) -> List[str]:
+    """--raw as input files: the inventory files in a directory, the matches of a glob, or the one file."""
+    import glob
+    if os.path.isdir(raw):
+        paths = [os.path.join(raw, name) for name in sorted(os.listdir(raw))
+                 if name.lower().endswith(SOURCE_INPUTS)]
+    elif glob.has_magic(raw):
+        paths = sorted(p for p in glob.glob(raw) if os.path.isfile(p))
+    else:
+        return [raw]
+    if not paths:
+        raise SystemExit(f"No inventory files in {raw}")
+    return paths
+
+
+def read_source(path: str, tag: str) -> Dict[str, List[str]]:
+    """
+    One shard as text columns under the logical field names, mapped through its own
+    header (missing fields and cells are ""), plus `sources`: "<tag>:<row id>" per row,
+    the row id being the shard's source_row_id or its 1-based line.
+    """
+    try:
+        df = read_raw(path) if is_columnar(path) else pd.read_csv(path, dtype=str)
+    except Exception as e:
+        raise SystemExit(f"Failed to read {path}: {e}")
+    cols = pick_columns(df.columns)
+    shard = {key: [safe_str(v) for v in df[col].tolist()] if col else [""] * len(df)
+             for key, col in cols.items()}
+    shard["sources"] = [f"{tag}:{source_row_id(sid, i)}" for i, sid in enumerate(shard["source_row_id"])]
+    return shard
+
+
+def merge_sources(shards: List[Dict[str, List[str]]]) -> pd.DataFrame:
+    """
+    Records of the same asset across shards -> one row each, in order of first sight.
+    A record joins an earlier asset with the same valid MAC, or with the same valid IP
+    when one side has no valid MAC, provided that asset has no record from this shard yet
+    (duplicates within one export stay separate, for detect_conflicts to report). Each
+    field keeps the first non-empty value, so earlier shards win. source_row_id numbers
+    the assets from 1; `sources` lists the merged records' tags, ";"-separated.
+    """
+    fields = [key for key in COLUMN_ALIASES if key != "source_row_id"]
+    macs: Dict[str, str] = {}
+    ips: Dict[str, str] = {}
+
+    def mac_key(raw: str) -> str:
+        if raw not in macs:
+            mac, valid, _ = normalize_mac(raw)
+            macs[raw] = mac if valid else ""
+        return macs[raw]
+
+    def ip_key(raw: str) -> str:
+        if raw not in ips:
+            try:
+                ips[raw] = str(ipaddress.ip_address(raw))
+            except ValueError:
+                ips[raw] = ""
+        return ips[raw]
+
+    assets: List[Dict] = []
+    by_mac: Dict[str, List[int]] = {}
+    by_ip: Dict[str, List[int]] = {}
+    for shard_no, shard in enumerate(shards):
+        for i in range(len(shard["sources"])):
+            mac, ip = mac_key(shard["mac"][i]), ip_key(shard["ip"][i])
+            found = None
+            for n in by_mac.get(mac, ()) if mac else ():
+                if shard_no not in assets[n]["shards"]:
+                    found = n
+                    break
+            if found is None and ip:
+                for n in by_ip.get(ip, ()):
+                    if shard_no not in assets[n]["shards"] and not (mac and assets[n]["mac_key"]):
+                        found = n
+                        break
+            if found is None:
+                found = len(assets)
+                assets.append({"shards": set(), "mac_key": "", "ip_key": "", "sources": [],
+                               **{key: "" for key in fields}})
+            asset = assets[found]
+            asset["shards"].add(shard_no)
+            asset["sources"].append(shard["sources"][i])
+            for key in fields:
+                if not asset[key]:
+                    asset[key] = shard[key][i]
+            if mac and not asset["mac_key"]:
+                asset["mac_key"] = mac
+                by_mac.setdefault(mac, []).append(found)
+            if ip and not asset["ip_key"]:
+                asset["ip_key"] = ip
+                by_ip.setdefault(ip, []).append(found)
+
+    merged = {key: [asset[key] for asset in assets] for key in fields}
+    merged["source_row_id"] = list(range(1, len(assets) + 1))
+    merged["sources"] = [";".join(asset["sources"]) for asset in assets]
+    return pd.DataFrame(merged, columns=list(COLUMN_ALIASES) + ["sources"])
+
+
+def load_sources(paths: List[str]) -> Tuple[pd.DataFrame, int]:
+    """
+    Read the shards in parallel (threads: the CSV tokenizer runs without the GIL), tag
+    each by its path below their common directory and merge them. Returns the merged
+    frame and the number of records read.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    tags = [os.path.relpath(os.path.abspath(p), base) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as threads:
+        shards = list(threads.map(read_source, paths, tags))
+    return merge_sources(shards), sum(len(shard["sources"]) for shard in shards)
+
+
+def write_sources(path: str, merged: pd.DataFrame) -> None:
+    """sources.csv: the source records behind each output row, keyed by source_row_id."""
+    merged[["source_row_id", "sources"]].to_csv(path, index=False)
+
+
+# ------------------------------
+# DNS zone export (--zones)
+# ------------------------------
+
+# Written next to the zones: the files the last export made, the only ones a later export removes
+ZONE_MANIFEST = "zones.manifest.json"
+# Conflicts that keep a row out of the zones: its address or name is claimed twice
+ZONE_CONFLICT_KINDS = (DUPLICATE_IP, FQDN_MULTI_IP)
+
+
+def reverse_zone(reverse_ptr: str, v6_prefix: int = 64) -> Tuple[str, str]:
+    """(zone, owner name) of a PTR: in-addr.arpa per /24, ip6.arpa at the /v6_prefix nibble boundary."""
+    labels = reverse_ptr.split(".")
+    host = 1 if reverse_ptr.endswith(".in-addr.arpa") else (128 - v6_prefix) // 4
+    return ".".join(labels[host:]), ".".join(labels[:host])
+
+
+class ZoneExport:
+    """
+    Writes A/AAAA records grouped by forward zone (the FQDN minus its first label) and
+    PTR records grouped by reverse zone, one RFC 1035 zone-file fragment per zone, with
+    names relative to $ORIGIN. Rows come in clean batches and are exported when their IP
+    is valid, their FQDN is a valid multi-label name and it agrees with the hostname, or
+    the hostname is missing.
+    Records are turned into sortable lines and buffered; every `run_size` lines are
+    sorted and spilled to a temporary file, and finish() k-way merges the runs, so
+    memory stays bounded however many rows stream through.
+    """
+
+    def __init__(self, directory: str, ttl: int = 3600, v6_prefix: int = 64, run_size: int = 1_000_000):
+        self.directory = directory
+        self.ttl = ttl
+        self.v6_prefix = v6_prefix
+        self.run_size = run_size
+        self.rows = 0
+        self.zones = 0
+        self.records = 0
+        self.skipped = 0
+        self._lines: List[str] = []
+        self._runs: List[str] = []
+        self._tmp = None
+        # a missing hostname cell arrives as its missing_cell_text() rendering
+        self._no_hostname = ("", missing_cell_text()["hostname"])
+
+    def add(self, out_df: pd.DataFrame) -> None:
+        """Take a clean batch; accepts typed cells or their CSV text (--incremental)."""
+        self._add(zip(out_df["ip"].tolist(), (out_df["ip_valid"].astype(str) == "True").tolist(),
+                      out_df["reverse_ptr"].tolist(), out_df["hostname"].tolist(), out_df["fqdn"].tolist(),
+                      (out_df["fqdn_consistent"].astype(str) == "True").tolist(),
+                      out_df["source_row_id"].tolist()))
+
+    def add_records(self, rows: List[Dict]) -> None:
+        """add() for clean rows as dicts (process_records), without pandas."""
+        self._add((r["ip"], r["ip_valid"], r["reverse_ptr"], r["hostname"], r["fqdn"], r["fqdn_consistent"],
+                   r["source_row_id"]) for r in rows)
+
+    def _add(self, rows) -> None:
+        lines = self._lines
+        for ip, ip_valid, ptr, hostname, fqdn, consistent, sid in rows:
+            self.rows += 1
+            if not (ip_valid and "." in fqdn and len(fqdn) <= 253 and FQDN_RE.fullmatch(fqdn)) \
+                    or not (consistent or hostname in self._no_hostname):
+                continue
+            name, zone = fqdn.split(".", 1)
+            v6 = ":" in ip
+            lines.append(f"{zone}\t{name}\t{name}\t{'AAAA' if v6 else 'A'}\t{ip}\t{sid}\n")
+            zone, name = reverse_zone(ptr, self.v6_prefix)
+            # sort PTRs numerically: zero-padded octet, or the nibbles in address order
+            order = name[::-1] if v6 else name.zfill(3)
+            lines.append(f"{zone}\t{order}\t{name}\tPTR\t{fqdn}.\t{sid}\n")
+            if len(lines) >= self.run_size:
+                self._spill()
+
+    def _spill(self) -> None:
+        import tempfile
+        if self._tmp is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="zones-", dir=self.directory)
+        path = os.path.join(self._tmp.name, f"run{len(self._runs)}")
+        self._lines.sort()
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(self._lines)
+        self._runs.append(path)
+        self._lines.clear()
+
+    def finish(self, anomalies: AnomalyTable) -> None:
+        """Merge and write the zones, leaving out rows named by ZONE_CONFLICT_KINDS anomalies."""
+        import heapq
+        skip = {sid for i, related in anomalies.related.items()
+                if anomalies.kinds[i] in ZONE_CONFLICT_KINDS for sid in related}
+        written = set()
+        self._lines.sort()
+        with contextlib.ExitStack() as stack:
+            runs = [stack.enter_context(open(path, encoding="utf-8")) for path in self._runs]
+            f = None
+            zone = previous = None
+            for line in heapq.merge(self._lines, *runs):
+                parts = line.rstrip("\n").split("\t")
+                if int(parts[5]) in skip:
+                    self.skipped += 1
+                    continue
+                if parts[:5] == previous:
+                    continue  # the same record from another row
+                previous = parts[:5]
+                if parts[0] != zone:
+                    zone = parts[0]
+                    if f is not None:
+                        f.close()
+                    written.add(zone + ".zone")
+                    f = open(os.path.join(self.directory, zone + ".zone"), "w", encoding="utf-8")
+                    f.write(f"$ORIGIN {zone}.\n$TTL {self.ttl}\n")
+                    self.zones += 1
+                f.write(f"{parts[2]}\tIN\t{parts[3]}\t{parts[4]}\n")
+                self.records += 1
+            if f is not None:
+                f.close()
+        self._lines = []
+        if self._tmp is not None:
+            self._tmp.cleanup()
+        # zones an earlier export wrote (per its manifest) that no longer have records;
+        # other files in the directory are never touched
+        manifest = os.path.join(self.directory, ZONE_MANIFEST)
+        try:
+            with open(manifest, encoding="utf-8") as f:
+                previous_files = json.load(f).get("zones", [])
+        except (OSError, ValueError, AttributeError):
+            previous_files = []
+        for name in previous_files:
+            stale = os.path.join(self.directory, name)
+            if (isinstance(name, str) and name not in written and name.endswith(".zone")
+                    and os.path.basename(name) == name and os.path.isfile(stale)):
+                os.remove(stale)
+        tmp = manifest + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"zones": sorted(written)}, f, indent=2)
+        os.replace(tmp, manifest)
+
+
+# ------------------------------
+# Snapshot diff (--diff)
+# ------------------------------
+
+# Changed fields that tag a change record; normalization_steps is a log, not compared
+DIFF_TAGS = {"ip": "readdressed", "device_type": "reclassified"}
+DIFF_IGNORED = ("normalization_steps",)
+DIFF_IDENTITY = ("hostname", "fqdn", "ip", "mac")
+# Target size of one join partition (both snapshots), and the most partitions used
+DIFF_PARTITION_BYTES = 64 << 20
+DIFF_MAX_PARTITIONS = 256
+
+
+def snapshot_files(path: str) -> Tuple[str, Optional[str]]:
+    """(clean file, anomalies file or None) of an output directory, or of a clean file and its neighbours."""
+    if not os.path.exists(path):
+        raise SystemExit(f"No such output: {path}")
+    directory, clean = (path, None) if os.path.isdir(path) else (os.path.dirname(path) or ".", path)
+
+    def first(names: List[str]) -> Optional[str]:
+        return next((p for p in (os.path.join(directory, n) for n in names) if os.path.exists(p)), None)
+
+    clean = clean or first(["inventory_clean." + ext for ext in ["csv", *COLUMNAR_FORMATS]])
+    if clean is None:
+        raise SystemExit(f"No inventory_clean output in {path}")
+    return clean, first(["anomalies." + ext for ext in ["json", "jsonl", *COLUMNAR_FORMATS]])
+
+
+def snapshot_rows(path: str, chunksize: int = 100_000) -> Tuple[List[str], Iterator[List[str]]]:
+    """
+    (columns, rows as lists of text) of a clean output, streamed. Typed Parquet/Arrow
+    cells are spelled the way the CSV output writes them, nulls included (see
+    missing_cell_text), so either format compares.
+    """
+    if not is_columnar(path):
+        f = open(path, encoding="utf-8", newline="")
+        reader = csv.reader(f)
+        columns = next(reader, [])
+
+        def rows():
+            with f:
+                yield from reader
+        return columns, rows()
+    frames = iter(read_raw(path, chunksize, nulls=missing_cell_text()))
+    first = next(frames, None)
+    if first is None:
+        return [], iter(())
+    columns = list(first.columns)
+    ints = [CLEAN_TYPES.get(c, "").startswith("int") for c in columns]
+
+    def typed_rows():
+        for frame in itertools.chain([first], frames):
+            for values in frame.itertuples(index=False, name=None):
+                yield [str(int(v)) if is_int and v != "" else str(v) for v, is_int in zip(values, ints)]
+    return columns, typed_rows()
+
+
+def _json_array_items(f, size: int = 1 << 20):
+    """Items of a top-level JSON array, decoded one at a time from a text file."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n[,":
+            pos += 1
+        if buf[pos:pos + 1] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                if buf[pos:].strip():
+                    raise
+                return
+            chunk = f.read(size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        yield item
+
+
+def snapshot_anomalies(path: str):
+    """(row_id, issue_type) of each anomaly in an anomalies file (any --anomalies-format, or --compact-codes), streamed."""
+    def key(rec: Dict) -> Tuple[int, str]:
+        issue_type = rec["issue_type"] if "issue_type" in rec else ANOMALY_KINDS[int(rec["kind"])][1]
+        return int(rec["row_id"]), issue_type
+
+    if is_columnar(path):
+        for frame in read_raw(path, 100_000):
+            yield from map(key, frame.to_dict("records"))
+        return
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            yield from (key(json.loads(line)) for line in f if line.strip())
+        else:
+            yield from map(key, _json_array_items(f))
+
+
+def diff_snapshots(old_path: str, new_path: str, changes_path: str) -> Dict[str, int]:
+    """
+    Change set between two runs' outputs, written to `changes_path` as JSON Lines, plus
+    summary counts. A Grace hash join, linear in both snapshots with bounded memory:
+    rows and anomalies of each snapshot are streamed once into partition files by
+    source_row_id (straight from the files when one partition holds both), then each
+    partition pair is joined in memory. Rows matched on
+    source_row_id are compared field by field. Rows left over on either side are joined
+    again the same way on valid mac, then what is still left on valid ip, each time
+    partitioned by a hash of that key, and the rest are added or removed. Anomalies are
+    compared by (row_id, issue_type).
+    """
+    import tempfile
+    import zlib
+    from collections import deque
+    (old_clean, old_anomalies), (new_clean, new_anomalies) = snapshot_files(old_path), snapshot_files(new_path)
+    size = os.path.getsize(old_clean) + os.path.getsize(new_clean)
+    n = min(DIFF_MAX_PARTITIONS, 1 + size // DIFF_PARTITION_BYTES)
+    counts = dict.fromkeys(["old_rows", "new_rows", "unchanged", "changed", "added", "removed",
+                            *DIFF_TAGS.values(), "matched_on_mac", "matched_on_ip",
+                            "anomalies_new", "anomalies_resolved"], 0)
+    columns = {}
+    out_dir = os.path.dirname(os.path.abspath(changes_path))
+    with tempfile.TemporaryDirectory(prefix="diff-", dir=out_dir) as tmp, \
+            open(changes_path, "w", encoding="utf-8") as out:
+        def part(name: str, mode: str = "r"):
+            return open(os.path.join(tmp, name), mode, encoding="utf-8", newline="")
+
+        # 1) partition both snapshots by source_row_id: "r" + row cells, or "a", row_id, issue_type
+        sources = {}
+        for side, clean, anomalies in (("old", old_clean, old_anomalies), ("new", new_clean, new_anomalies)):
+            cols, rows = snapshot_rows(clean)
+            if "source_row_id" not in cols:
+                raise SystemExit(f"{clean}: no source_row_id column")
+            columns[side] = cols
+            sources[side] = itertools.chain((["r", *row] for row in rows),
+                                            (["a", *key] for key in (snapshot_anomalies(anomalies) if anomalies else ())))
+            if n == 1:
+                continue
+            sid = 1 + cols.index("source_row_id")
+            with contextlib.ExitStack() as stack:
+                parts = [csv.writer(stack.enter_context(part(f"{side}{i}", "w"))) for i in range(n)]
+                for item in sources[side]:
+                    parts[int(item[sid] if item[0] == "r" else item[1]) % n].writerow(item)
+
+        def partition(side: str, i: int):
+            if n == 1:
+                yield from sources[side]
+                return
+            with part(f"{side}{i}") as f:
+                yield from csv.reader(f)
+
+        old_cols, new_cols = columns["old"], columns["new"]
+        same_columns = old_cols == new_cols
+        compared = [(c, old_cols.index(c), j) for j, c in enumerate(new_cols)
+                    if c in old_cols and c not in DIFF_IGNORED]
+        old_sid, new_sid = old_cols.index("source_row_id"), new_cols.index("source_row_id")
+
+        def emit(rec: Dict) -> None:
+            out.write(json.dumps(rec) + "\n")
+
+        def compare(old: List[str], new: List[str], matched_on: str) -> None:
+            fields = {} if same_columns and old == new else \
+                {c: [old[i], new[j]] for c, i, j in compared if old[i] != new[j]}
+            if not fields:
+                counts["unchanged"] += 1
+                return
+            counts["changed"] += 1
+            rec = {"change": "changed", "source_row_id": int(new[new_sid])}
+            if matched_on != "source_row_id":
+                rec.update(old_source_row_id=int(old[old_sid]), matched_on=matched_on)
+            tags = [tag for c, tag in DIFF_TAGS.items() if c in fields]
+            for tag in tags:
+                counts[tag] += 1
+            rec.update(tags=tags, fields=fields)
+            emit(rec)
+
+        def gone(change: str, row: List[str], cols: List[str]) -> None:
+            counts[change] += 1
+            rec = {"change": change, "source_row_id": int(row[cols.index("source_row_id")])}
+            rec.update((c, row[cols.index(c)] if c in cols else "") for c in DIFF_IDENTITY)
+            emit(rec)
+
+        # 2) join each partition pair on source_row_id; spill what is left over
+        with part("old_left", "w") as old_f, part("new_left", "w") as new_f:
+            old_left, new_left = csv.writer(old_f), csv.writer(new_f)
+            for i in range(n):
+                by_id: Dict[str, deque] = {}
+                old_issues, new_issues = set(), set()
+                for item in partition("old", i):
+                    if item[0] == "r":
+                        counts["old_rows"] += 1
+                        by_id.setdefault(item[1 + old_sid], deque()).append(item[1:])
+                    else:
+                        old_issues.add((int(item[1]), item[2]))
+                for item in partition("new", i):
+                    if item[0] == "a":
+                        new_issues.add((int(item[1]), item[2]))
+                        continue
+                    counts["new_rows"] += 1
+                    same = by_id.get(item[1 + new_sid])
+                    if same:
+                        compare(same.popleft(), item[1:], "source_row_id")
+                    else:
+                        new_left.writerow(item[1:])
+                for same in by_id.values():
+                    old_left.writerows(same)
+                for change, issues in (("anomaly_new", new_issues - old_issues),
+                                       ("anomaly_resolved", old_issues - new_issues)):
+                    counts[change.replace("anomaly", "anomalies")] += len(issues)
+                    for row_id, issue_type in sorted(issues):
+                        emit({"change": change, "row_id": row_id, "issue_type": issue_type})
+
+        def join_on(key: str, valid: str, old_name: str, new_name: str) -> Tuple[str, str]:
+            """Hash join of two leftover files on a valid `key`; returns the files of rows still unmatched."""
+            at = {"old": (old_cols.index(key), old_cols.index(valid)),
+                  "new": (new_cols.index(key), new_cols.index(valid))}
+            size = os.path.getsize(os.path.join(tmp, old_name)) + os.path.getsize(os.path.join(tmp, new_name))
+            m = min(DIFF_MAX_PARTITIONS, 1 + size // DIFF_PARTITION_BYTES)
+            rest_names = (f"old_no_{key}", f"new_no_{key}")
+            with part(rest_names[0], "w") as old_f, part(rest_names[1], "w") as new_f:
+                rest = {"old": csv.writer(old_f), "new": csv.writer(new_f)}
+                # rows without a valid key go straight to the rest; a stable hash keeps runs repeatable
+                with contextlib.ExitStack() as stack:
+                    for side, name in (("old", old_name), ("new", new_name)):
+                        k, v = at[side]
+                        parts = [csv.writer(stack.enter_context(part(f"{side}_{key}{i}", "w"))) for i in range(m)]
+                        with part(name) as f:
+                            for row in csv.reader(f):
+                                if row[v] == "True":
+                                    parts[zlib.crc32(row[k].encode("utf-8")) % m].writerow(row)
+                                else:
+                                    rest[side].writerow(row)
+                (ok, _), (nk, _) = at["old"], at["new"]
+                for i in range(m):
+                    by_key: Dict[str, deque] = {}
+                    with part(f"old_{key}{i}") as f:
+                        for row in csv.reader(f):
+                            by_key.setdefault(row[ok], deque()).append(row)
+                    with part(f"new_{key}{i}") as f:
+                        for row in csv.reader(f):
+                            same = by_key.get(row[nk])
+                            if same:
+                                counts["matched_on_" + key] += 1
+                                compare(same.popleft(), row, key)
+                            else:
+                                rest["new"].writerow(row)
+                    for same in by_key.values():
+                        rest["old"].writerows(same)
+            return rest_names
+
+        # 3) leftovers: join on mac, then what is still left on ip; the rest was added or removed
+        left = ("old_left", "new_left")
+        for key, valid in (("mac", "mac_valid"), ("ip", "ip_valid")):
+            if {key, valid} <= set(old_cols) and {key, valid} <= set(new_cols):
+                left = join_on(key, valid, *left)
+        with part(left[1]) as f:
+            for row in csv.reader(f):
+                gone("added", row, new_cols)
+        with part(left[0]) as f:
+            for row in csv.reader(f):
+                gone("removed", row, old_cols)
+    return counts
+
+
+# ------------------------------
+# Incremental runs
+# ------------------------------
+
+# Bump when a rule change alters the output for unchanged input, to invalidate saved state
+STATE_VERSION = 5
+
+
+def run_fingerprint(columns, enable_llm: bool, llm: Optional[LLMSettings] = None) -> str:
+    """Hash of everything besides row content that shapes the output."""
+    import hashlib
+    config = [STATE_VERSION, OUTPUT_COLUMNS, pick_columns(columns), SITE_DIRECTORY.sites, DEVICE_KEYWORDS,
+              TEAM_KEYWORDS, bool(enable_llm and use_llm()), (llm or LLMSettings()).model,
+              SUBNET_INDEX.fingerprint if SUBNET_INDEX is not None else None]
+    if OUI_INDEX is not None:
+        config += [OUI_INDEX.fingerprint, VENDOR_DEVICE_HINTS]
+    if OWNER_INDEX is not None:
+        config += [OWNER_INDEX.fingerprint]
+    if DEVICE_MODEL is not None:
+        config += [DEVICE_MODEL.fingerprint, DEVICE_MODEL.threshold]
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def row_fingerprints(raw: Dict[str, pd.Series]) -> List[str]:
+    """Content hash per row over the stringified input fields the normalizers see."""
+    import hashlib
+    columns = [raw[key].tolist() for key in COLUMN_ALIASES]
+    return [hashlib.blake2b(json.dumps(values).encode("utf-8"), digest_size=16).hexdigest()
+            for values in zip(*columns)]
+
+
+class RunState:
+    """
+    SQLite record of the last --incremental run: per row key (see state_keys), the row's
+    content fingerprint, its clean CSV cells (as written) and its anomalies. State saved
+    under a different run_fingerprint() is ignored, so a rule or config change means a
+    full run.
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if "key" not in [c[1] for c in self._db.execute("PRAGMA table_info(rows)")]:
+            # none yet, or keyed by source_row_id by an older version: start over
+            self._db.execute("DROP TABLE IF EXISTS rows")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, "
+                         "fingerprint TEXT NOT NULL, cells TEXT NOT NULL, anomalies TEXT NOT NULL)")
+
+    def load(self, config: str) -> Dict[str, Tuple[str, str, str]]:
+        """row key -> (fingerprint, cells JSON, anomalies JSON); empty on a config mismatch."""
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is None or row[0] != config:
+            return {}
+        return {key: (fp, cells, anomalies) for key, fp, cells, anomalies
+                in self._db.execute("SELECT key, fingerprint, cells, anomalies FROM rows")}
+
+    def save(self, config: str, records: List[Tuple[str, str, str, str]]) -> None:
+        """Replace the stored rows; rows missing from `records` are dropped."""
+        with self._db:
+            self._db.execute("DELETE FROM rows")
+            self._db.executemany("INSERT INTO rows VALUES (?, ?, ?, ?)", records)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (config,))
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def state_keys(cells: Dict[str, np.ndarray], fingerprints: List[str]) -> List[str]:
+    """
+    Row key in RunState: "id:<n>" for a row with its own id, else "row:<content
+    fingerprint>". A row without one is numbered by position, and that number shifts
+    whenever a row above it comes or goes, so it cannot identify the row across runs.
+    """
+    if "source_row_id" not in cells:
+        return ["row:" + fp for fp in fingerprints]
+    return [f"row:{fp}" if given is None else f"id:{given}"
+            for given, fp in zip(map(given_row_id, cells["source_row_id"]), fingerprints)]
+
+
+def process_incremental(df: pd.DataFrame, state: RunState, prompts_path: str, enable_llm: bool,
+                        engine: str = "rows", pool: Optional[ProcessPoolExecutor] = None,
+                        n_shards: int = 1, llm: Optional[LLMSettings] = None,
+                        stats: Optional[Dict[str, List[int]]] = None
+                        ) -> Tuple[pd.DataFrame, AnomalyTable, Dict[str, int]]:
+    """
+    process_frame() for re-runs: only rows that are new or changed since the run saved in
+    `state` are normalized and classified (so only they can reach the LLM); the rest are
+    carried forward, and rows gone from the input drop out of the state.
+
+    Output matches a full run: cells are kept as the exact text to_csv() writes and
+    anomalies stay in row order. Rows without their own id are found again by content and
+    take their new position as source_row_id. Rows sharing a key are always reprocessed.
+    Returns (clean frame of CSV text, anomalies, counts).
+    """
+    cols = pick_columns(df.columns)
+    raw, cells = _raw_columns(df, cols)
+    source_id = _source_ids(df.index, cells, cols).tolist()
+    fingerprints = row_fingerprints(raw)
+    keys = state_keys(cells, fingerprints)
+    config = run_fingerprint(df.columns, enable_llm, llm)
+    previous = state.load(config)
+
+    seen: Dict[str, int] = {}
+    for key in keys:
+        seen[key] = seen.get(key, 0) + 1
+    duplicated = {key for key, n in seen.items() if n > 1}
+    carried = np.array([key not in duplicated and key in previous and previous[key][0] == fp
+                        for key, fp in zip(keys, fingerprints)], dtype=bool)
+    changed = np.flatnonzero(~carried)
+
+    sid_col = OUTPUT_COLUMNS.index("source_row_id")
+    row_cells: List[List[str]] = [[] for _ in range(len(df))]
+    row_anomalies: List[List[Dict]] = [[] for _ in range(len(df))]
+    renumbered = set()
+    for k in np.flatnonzero(carried):
+        _, cells_json, anomalies_json = previous[keys[k]]
+        row_cells[k] = json.loads(cells_json)
+        row_anomalies[k] = json.loads(anomalies_json)
+        if row_cells[k][sid_col] != str(source_id[k]):
+            # a row without its own id that moved: renumber it to its new position
+            renumbered.add(int(k))
+            row_cells[k][sid_col] = str(source_id[k])
+            for rec in row_anomalies[k]:
+                rec["row_id"] = source_id[k]
+    if len(changed):
+        out_df, anomalies = process_frame(df.iloc[changed], prompts_path, enable_llm, engine=engine,
+                                          pool=pool, n_shards=n_shards, llm=llm, stats=stats)
+        # round-trip through CSV to get each cell exactly as a full run would write it
+        text = pd.read_csv(io.StringIO(out_df.to_csv(index=False)), dtype=str, keep_default_na=False)
+        for k, values in zip(changed, text.itertuples(index=False, name=None)):
+            row_cells[k] = list(values)
+        for r, rec in zip(anomalies.positions, anomalies.records()):
+            row_anomalies[changed[r]].append(rec)
+
+    records = []
+    for k, (key, fp) in enumerate(zip(keys, fingerprints)):
+        if key in duplicated:
+            continue
+        if carried[k] and k not in renumbered:
+            records.append((key,) + previous[key])
+        else:
+            records.append((key, fp, json.dumps(row_cells[k]), json.dumps(row_anomalies[k])))
+    state.save(config, records)
+
+    out_df = pd.DataFrame(row_cells, columns=OUTPUT_COLUMNS, dtype=object)
+    anomalies = AnomalyTable.from_records((k, rec) for k, recs in enumerate(row_anomalies) for rec in recs)
+    summary = {
+        "carried": int(carried.sum()),
+        "reprocessed": len(changed),
+        "dropped": len(previous.keys() - set(keys)),
+    }
+    return out_df, anomalies, summary
+
+
+# ------------------------------
+# Stdlib engine (--engine csv)
+# ------------------------------
+
+# Cells pandas.read_csv reads as missing by default; they reach the normalizers as "nan"
+CSV_NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+
+def _record_cell(value):
+    """JSON value -> input cell: null reads as a missing CSV cell (NaN), the rest as-is."""
+    return float("nan") if value is None else value
+
+
+def process_records(records: List[Dict], prompts_path: str, enable_llm: bool,
+                    llm: Optional[LLMSettings] = None, start: int = 0) -> Tuple[List[Dict], AnomalyTable]:
+    """
+    process() for a batch of dict records, without numpy or pandas: same column
+    matching, normalizers and device classification, so the rows (OUTPUT_COLUMNS order)
+    and anomalies equal process(pd.DataFrame(records)). `start` + position stands in
+    for the index in the source_row_id fallback.
+    """
+    columns: Dict[str, None] = {}
+    for rec in records:
+        columns.update(dict.fromkeys(rec))
+    cols = pick_columns(list(columns))
+    rows: List[Dict] = []
+    found: List[List[int]] = []
+    for idx, rec in enumerate(records, start):
+        row = {c: _record_cell(rec.get(c)) for c in columns}
+        record, anomalies = normalize_record(row, cols, idx)
+        rows.append(record)
+        found.append(anomalies)
+
+    # classify_device_types(), one row at a time
+    device_type = [r["device_type"] for r in rows]
+    device_conf = [float(r["device_type_confidence"]) for r in rows]
+    hints = [r["hint_text"] for r in rows]
+    if DEVICE_MODEL is not None:
+        weak = [i for i, (dev, conf) in enumerate(zip(device_type, device_conf)) if dev == "" or conf < 0.6]
+        for i in DEVICE_MODEL.settle(weak, hints, device_type, device_conf):
+            rows[i]["normalization_steps"] |= STEP_BITS["device:ngram_model"]
+    if enable_llm and use_llm():
+        weak = [i for i, (dev, conf) in enumerate(zip(device_type, device_conf)) if dev == "" or conf < 0.6]
+        if weak:
+            llm_classify_weak(weak, hints, device_type, device_conf, prompts_path, llm or LLMSettings())
+    else:
+        for i, dev in enumerate(device_type):
+            if dev == "":
+                device_type[i] = "unknown"
+                device_conf[i] = max(device_conf[i], 0.3)
+
+    out_rows: List[Dict] = []
+    anomalies = AnomalyTable()
+    for pos, (record, kinds, dev, conf) in enumerate(zip(rows, found, device_type, device_conf)):
+        conf = float(conf)
+        if dev == "" and record["hostname"] != "":
+            dev, conf = "server", 0.4
+            record["normalization_steps"] |= STEP_BITS["device:default_server_when_unknown"]
+        record["device_type"] = dev
+        record["device_type_confidence"] = round(conf, 3) if conf else 0.0
+        del record["hint_text"]
+        out_rows.append(record)
+        for kind in kinds:
+            anomalies.add(record["source_row_id"], kind, pos)
+        if conf < 0.5:
+            anomalies.add(record["source_row_id"], LOW_CONFIDENCE, pos)
+    return out_rows, anomalies
+
+
+def read_csv_records(f, batch_size: int):
+    """
+    Yield a raw CSV file object as lists of up to `batch_size` dict rows, read the way
+    --chunksize reads it with pandas: every cell as text, CSV_NA_VALUES as missing
+    (None), blank lines skipped, short rows padded, repeated header names suffixed ".1".
+    """
+    reader = csv.reader(f)
+    header = next(reader, [])
+    names: List[str] = []
+    for i, name in enumerate(header):
+        name = name or f"Unnamed: {i}"
+        base, n = name, 0
+        while name in names:
+            n += 1
+            name = f"{base}.{n}"
+        names.append(name)
+    batch: List[Dict] = []
+    for cells in reader:
+        if not cells:
+            continue
+        if len(cells) > len(names):
+            raise ValueError(f"line {reader.line_num}: expected {len(names)} fields, saw {len(cells)}")
+        cells += [""] * (len(names) - len(cells))
+        batch.append({name: None if cell in CSV_NA_VALUES else cell for name, cell in zip(names, cells)})
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def process_csv(raw_path: str, clean_path: str, anomalies_path: str, prompts_path: str,
+                enable_llm: bool, batch_size: int = 10000, anomalies_format: str = "json",
+                llm: Optional[LLMSettings] = None, compact: bool = False,
+                zones: Optional[ZoneExport] = None) -> Tuple[int, int]:
+    """
+    The whole run on the stdlib csv module: rows go through process_records() in
+    batches, so neither numpy nor pandas is imported. Outputs match --chunksize with
+    the rows engine (all input read as text). Returns (rows, anomalies) written.
+    """
+    try:
+        f = open(raw_path, encoding="utf-8-sig", newline="")
+    except OSError as e:
+        raise SystemExit(f"Failed to read {raw_path}: {e}")
+    conflicts = SpillingConflictIndex(directory=os.path.dirname(os.path.abspath(clean_path)))
+    with f, CleanWriter(clean_path, "csv", compact) as clean_writer, \
+            AnomalyWriter(anomalies_path, anomalies_format, compact) as writer:
+        for batch in _staged(read_csv_records(f, batch_size), "read"):
+            with stage("normalize"):
+                rows, anomalies = process_records(batch, prompts_path, enable_llm, llm, start=clean_writer.count)
+            clean_writer.write_records(rows)
+            writer.write(anomalies)
+            with stage("conflicts"):
+                conflicts.add_records(rows)
+            if zones is not None:
+                with stage("zones"):
+                    zones.add_records(rows)
+        with stage("conflicts"):
+            found = conflicts.anomalies()
+        writer.write(found)
+        if zones is not None:
+            with stage("zones"):
+                zones.finish(found)
+        return clean_writer.count, writer.count
+
+
+# ------------------------------
+# Service mode (--serve)
+# ------------------------------
+
+class RecordService:
+    """
+    Resident normalizer behind --serve. Regexes, keyword matchers, the subnet index and
+    the LLM cache stay warm across requests. LLM classification (and its prompt
+    logging) is serialized; the deterministic path runs concurrently.
+    """
+
+    def __init__(self, prompts_path: str, enable_llm: bool, llm: Optional[LLMSettings] = None):
+        self.prompts_path = prompts_path
+        self.enable_llm = enable_llm and use_llm()
+        self.llm = llm or LLMSettings()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.records = 0
+        self._lock = threading.Lock()  # guards the counters; handlers run on their own threads
+        self._llm_lock = threading.Lock()
+        self._busy = 0
+        self._idle = threading.Condition()
+
+    @contextlib.contextmanager
+    def busy(self):
+        """Mark a request in flight, so drain() can wait for it."""
+        with self._idle:
+            self._busy += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._busy -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        with self._idle:
+            self._idle.wait_for(lambda: not self._busy, timeout)
+
+    def normalize(self, payload) -> Dict:
+        """Accept one record, a list of records or {"records": [...]}; return rows and anomalies."""
+        if isinstance(payload, dict) and isinstance(payload.get("records"), list):
+            records = payload["records"]
+        elif isinstance(payload, list):
+            records = payload
+        else:
+            records = [payload]
+        if not all(isinstance(r, dict) for r in records):
+            raise ValueError("records must be JSON objects")
+        lock = self._llm_lock if self.enable_llm else contextlib.nullcontext()
+        with lock:
+            rows, anomalies = process_records(records, self.prompts_path, self.enable_llm, self.llm)
+        for row in rows:
+            row["normalization_steps"] = steps_text(row["normalization_steps"])
+        with self._lock:
+            self.requests += 1
+            self.records += len(records)
+        return {"rows": rows, "anomalies": list(anomalies.records())}
+
+    def health(self) -> Dict:
+        with self._lock:
+            requests, records = self.requests, self.records
+        return {"status": "ok", "uptime_seconds": round(time.monotonic() - self.started, 3),
+                "requests": requests, "records": records, "llm": self.enable_llm}
+
+
+def _service_handler(service: RecordService):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive for hooks that post repeatedly
+
+        def _reply(self, status: int, body: Dict) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            with service.busy():
+                if self.path == "/health":
+                    self._reply(200, service.health())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            with service.busy():
+                if self.path != "/normalize":
+                    self._reply(404, {"error": "not found"})
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                    result = service.normalize(payload)
+                except ValueError as e:  # includes malformed JSON
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_server(address: str, service: RecordService):
+    """
+    HTTP server for `address`: "host:port" (or ":port" for localhost), or a Unix socket
+    given as "unix:/path" or any path containing "/". Connection threads are daemons, so
+    idle keep-alive clients never hold up shutdown; serve() drains requests in flight.
+    """
+    import socketserver
+    import stat
+    from http.server import ThreadingHTTPServer
+
+    handler = _service_handler(service)
+    if address.startswith("unix:") or "/" in address:
+        path = address[5:] if address.startswith("unix:") else address
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)  # stale socket from an earlier run
+
+        class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+            def get_request(self):
+                conn, _ = super().get_request()
+                return conn, ("unix", 0)
+
+            def server_close(self):
+                super().server_close()
+                if os.path.exists(path):
+                    os.unlink(path)
+
+        return UnixHTTPServer(path, handler)
+    handler.disable_nagle_algorithm = True  # headers and body go out in separate writes
+    host, _, port = address.rpartition(":")
+    return ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+
+
+def serve(address: str, service: RecordService) -> None:
+    """Serve until SIGTERM/SIGINT, then stop accepting and let in-flight requests finish."""
+    import signal
+
+    server = make_server(address, service)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, stop)
+    where = server.server_address
+    print(f"Serving on {where if isinstance(where, str) else '%s:%d' % where[:2]} "
+          f"(POST /normalize, GET /health)", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.drain(timeout=60)
+    print("Service stopped", flush=True)
+
+
+def _write_if_changed(path: str, text: str) -> None:
+    """Leave files that already hold `text` untouched (keeps mtimes stable across re-runs)."""
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def ensure_docs(out_dir: str) -> Tuple[str, str, str, str]:
+    """
+    Create/overwrite short documentation files to satisfy deliverables.
+    Returns the paths to: approach.md, cons.md, prompts.md, ddi_ideas.md
+    """
+    approach_p = os.path.join(out_dir, "approach.md")
+    cons_p = os.path.join(out_dir, "cons.md")
+    prompts_p = os.path.join(out_dir, "prompts.md")
+    ideas_p = os.path.join(out_dir, "ddi_ideas.md")
+
+    approach = """# Approach
+
+This pipeline cleans `inventory_raw.csv` into `inventory_clean.csv` and flags issues in `anomalies.json`.
+It follows a **rules-first, LLM-second** strategy.
+
+## Steps
+1. **Normalize & Validate**
+   - IP: validate IPv4/IPv6 (`ipaddress`), derive `subnet_cidr` (IPv4: /24, IPv6: /64 by default), compute `reverse_ptr`.
+   - Hostname: RFC‑952/1123 checks (lowercase, labels allowed chars).
+   - FQDN: validate labels and overall length; check `fqdn_consistent` with `hostname`.
+   - MAC: strip separators, verify 12 hex digits, output colon‑separated uppercase.
+   - Owner: extract `owner_email`, prettify name, infer `owner_team` using whole-word keyword hints.
+   - Site: canonicalize to 3‑letter site codes (e.g., SJC, NYC) with a synonyms map.
+2. **Classification**
+   - Device type via keyword heuristics (hostname/fqdn/role/owner_team/site). Confidence scaled 0..1.
+   - If heuristics are weak (<0.6) and an LLM is enabled, call it with temperature 0.2, JSON reply enforced.
+3. **Anomaly Reporting**
+   - For any invalid or inconsistent field, append an entry to `anomalies.json` with `row_id`, `fields`, `issue_type`, `recommended_action`.
+4. **Traceability**
+   - Each row carries a `normalization_steps` semi‑colon log for transparency.
+5. **Reproducibility**
+   - Single entry point `run.py` regenerates outputs deterministically (LLM optional and guarded).
+
+## Notes
+- `subnet_cidr` defaults are common ops defaults when the mask isn’t present; if a Subnet column is provided, the script can be extended to prefer it.
+- LLM usage is minimal and logged in `prompts.md`. Deterministic transforms dominate.
+"""
+
+    cons = """# Known Limitations / Trade‑offs
+
+1. **Subnet inference** — Without an explicit netmask, `/24` for IPv4 and `/64` for IPv6 are heuristics. Real networks may differ.
+2. **LLM fragility** — Even at low temperature, classification can be noisy or ambiguous; offline fallback avoids nondeterminism but may under‑classify.
+3. **Limited site dictionary** — `SITE_MAP` covers common sites only; pass a full directory with `--sites`. Unknown locations will be flagged for manual mapping.
+4. **Sparse owner parsing** — Without `--owners`, owner extraction heuristics won’t resolve nicknames or external contractors; the directory only matches exact emails, usernames and names.
+5. **Hostname/FQDN edge cases** — Split‑horizon DNS, IDNA/punycode, and non‑ASCII labels aren’t modeled.
+6. **OUI vendor check is opt‑in** — MAC vendors become device hints only with `--oui` (a local IEEE registry export); randomized MACs carry no vendor.
+"""
+
+    prompts_header = """# LLM Prompts Log
+
+All prompts below are issued only when deterministic rules are weak. Temperature is **0.2** and responses are constrained to **JSON** for reproducibility.
+If the environment lacks an API key or --use-llm is not provided, no LLM prompts are logged and heuristics are used instead.
 """
 
     ideas = """# DDI Enrichment Ideas (Optional)
@@ -571,53 +4280,272 @@ If the environment lacks an API key or --use-llm is not provided, no LLM prompts
 - **Policy advice**: Recommend subnet sizes from utilization stats and projected growth.
 """
 
-    with open(approach_p, "w", encoding="utf-8") as f:
-        f.write(approach)
-    with open(cons_p, "w", encoding="utf-8") as f:
-        f.write(cons)
+    _write_if_changed(approach_p, approach)
+    _write_if_changed(cons_p, cons)
     # create/append prompts header once
     if not os.path.exists(prompts_p) or os.path.getsize(prompts_p) == 0:
         with open(prompts_p, "w", encoding="utf-8") as f:
             f.write(prompts_header)
             f.write("\n---\n\n")
-    with open(ideas_p, "w", encoding="utf-8") as f:
-        f.write(ideas)
+    _write_if_changed(ideas_p, ideas)
 
     return approach_p, cons_p, prompts_p, ideas_p
 
 
 def main():
     ap = argparse.ArgumentParser(description="Infoblox — data cleaning: rules-first, LLM-second")
-    ap.add_argument("--raw", default="inventory_raw.csv", help="Path to input inventory_raw.csv")
+    ap.add_argument("--raw", default="inventory_raw.csv",
+                    help="Path to input inventory_raw.csv, or a directory or glob of exports to merge "
+                         "(each with its own header; writes sources.csv)")
     ap.add_argument("--outdir", default=".", help="Directory to write outputs")
     ap.add_argument("--use-llm", action="store_true", help="Enable LLM calls when OPENAI_API_KEY is present")
+    ap.add_argument("--engine", choices=sorted([*NORMALIZERS, "csv"]), default="rows",
+                    help="Processing engine: row-by-row loop, column-wise (vectorized), or column-wise "
+                         "once per distinct value (dedup); outputs are identical. csv runs the row "
+                         "normalizers on the stdlib csv module without loading numpy/pandas "
+                         "(input read as text, as with --chunksize)")
+    ap.add_argument("--chunksize", type=int, default=0,
+                    help="Stream the input in chunks of N rows, appending outputs as it goes (0 = load all at once)")
+    ap.add_argument("--anomalies-format", choices=["json", "jsonl"] + list(COLUMNAR_FORMATS), default="json",
+                    help="anomalies.json as a JSON array (default), anomalies.jsonl as JSON Lines, "
+                         "or a typed Parquet/Arrow table (needs pyarrow)")
+    ap.add_argument("--output-format", choices=["csv"] + list(COLUMNAR_FORMATS), default="csv",
+                    help="inventory_clean as CSV (default) or a typed Parquet/Arrow table (needs pyarrow); "
+                         "--raw may also be .parquet/.arrow/.feather")
+    ap.add_argument("--compact-codes", action="store_true",
+                    help="Write normalization_steps as integer bitmasks and anomalies as {row_id, kind} "
+                         "codes, with the legend in <outdir>/codes.json")
+    ap.add_argument("--zones", nargs="?", const="", default=None, metavar="DIR",
+                    help="Also write A/AAAA and PTR zone-file fragments, one <zone>.zone per forward and "
+                         "reverse zone (default: <outdir>/zones); invalid and conflicting rows are left out")
+    ap.add_argument("--zone-ttl", type=int, default=3600, help="$TTL of the exported zones")
+    ap.add_argument("--zone-v6-prefix", type=int, default=64,
+                    help="Prefix length of the ip6.arpa reverse zones (a multiple of 4); IPv4 uses /24")
+    ap.add_argument("--diff", nargs=2, default=None, metavar=("OLD", "NEW"),
+                    help="Compare two runs' outputs (output directories or inventory_clean files) and write "
+                         "<outdir>/changes.jsonl and changes_summary.json instead of running the pipeline")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Normalize in N worker processes; output is identical to a single-process run")
+    ap.add_argument("--llm-base-url", default=None,
+                    help="Chat Completions base URL (default: $OPENAI_BASE_URL or the OpenAI API)")
+    ap.add_argument("--llm-batch-size", type=int, default=1,
+                    help="Weak rows packed into one LLM prompt (1 = one prompt per row)")
+    ap.add_argument("--llm-concurrency", type=int, default=1, help="LLM requests in flight at once")
+    ap.add_argument("--llm-rate-limit", type=float, default=0.0,
+                    help="Max LLM requests per second (0 = unlimited)")
+    ap.add_argument("--llm-timeout", type=float, default=8.0, help="Seconds to wait for one LLM reply")
+    ap.add_argument("--llm-retries", type=int, default=2,
+                    help="Retries on 429/5xx replies and dropped connections, with jittered backoff")
+    ap.add_argument("--llm-breaker", type=int, default=5,
+                    help="Stop calling the LLM after N failed calls in a row, until --llm-breaker-cooldown "
+                         "has passed (0 = never)")
+    ap.add_argument("--llm-breaker-cooldown", type=float, default=30.0,
+                    help="Seconds the circuit stays open before one trial call")
+    ap.add_argument("--llm-budget", type=float, default=0.0,
+                    help="Seconds the run may spend on the LLM from its first call; later weak rows keep "
+                         "their heuristic result (0 = unlimited)")
+    ap.add_argument("--llm-cache", default=None,
+                    help="SQLite cache of LLM answers (default: <outdir>/llm_cache.sqlite)")
+    ap.add_argument("--no-llm-cache", action="store_true", help="Bypass the LLM answer cache")
+    ap.add_argument("--llm-cache-ttl-days", type=float, default=30.0,
+                    help="Expire cached LLM answers after N days (0 = never)")
+    ap.add_argument("--llm-cache-max-entries", type=int, default=1_000_000,
+                    help="Keep at most N cached answers, evicting least recently used (0 = unbounded)")
+    ap.add_argument("--incremental", nargs="?", const="", default=None, metavar="STATE",
+                    help="Only reprocess rows that are new or changed since the run saved in STATE "
+                         "(default: <outdir>/run_state.sqlite); outputs match a full run")
+    ap.add_argument("--subnets", default=None,
+                    help="CIDR table (CSV/text); subnet_cidr becomes the longest matching prefix "
+                         "instead of a /24 or /64 guess, and unmatched IPs are flagged unknown_subnet")
+    ap.add_argument("--sites", default=None,
+                    help="Site directory (CSV: code, synonyms...; or JSON code -> synonyms) replacing the "
+                         "built-in SITE_MAP")
+    ap.add_argument("--oui", default=None,
+                    help="IEEE MA-L registry export (oui.csv/oui.txt, compiled once to <outdir>/oui.idx) "
+                         "or a prebuilt index; MAC vendors become device-type hints")
+    ap.add_argument("--owners", default=None, metavar="PATH",
+                    help="HR/IdP directory export (CSV, JSON or JSON Lines; compiled once to <outdir>/owners.idx) "
+                         "or a prebuilt index; owners resolve by email, username or name before the heuristics")
+    ap.add_argument("--model", default=None, metavar="PATH",
+                    help="Offline n-gram model (from --train-model) tried on weak rows before the LLM")
+    ap.add_argument("--model-threshold", type=float, default=0.8,
+                    help="Posterior at which the offline model settles a row (0.6-1; below it the LLM decides)")
+    ap.add_argument("--train-model", default=None, metavar="PATH",
+                    help="Train the offline model from --train-from, save it to PATH and exit")
+    ap.add_argument("--train-from", nargs="+", default=None, metavar="FILE",
+                    help="prompts.md logs and earlier inventory_clean.csv files to learn from "
+                         "(default: those in --outdir)")
+    ap.add_argument("--profile", action="store_true",
+                    help="Print per-stage and per-normalizer timings, LLM latency and anomaly counts")
+    ap.add_argument("--metrics-out", default=None, metavar="PATH",
+                    help="Write the same run metrics as JSON to PATH")
+    ap.add_argument("--serve", default=None, metavar="ADDR",
+                    help="Run as a resident service on host:port or a Unix socket (unix:/path): "
+                         "POST JSON records to /normalize, GET /health; --raw is ignored")
     args = ap.parse_args()
+    raw_paths = source_paths(args.raw) if not (args.serve or args.diff or args.train_model) else [args.raw]
+    multi_source = raw_paths != [args.raw]
+    if args.incremental is not None and args.chunksize > 0:
+        ap.error("--incremental cannot be combined with --chunksize")
+    if multi_source and args.chunksize > 0:
+        ap.error("--chunksize reads one file; merging a directory or glob of exports needs them all at once")
+    if args.engine == "csv" and (args.incremental is not None or args.workers > 1
+                                 or args.output_format != "csv" or args.anomalies_format not in ("json", "jsonl")
+                                 or is_columnar(args.raw) or multi_source):
+        ap.error("--engine csv reads and writes CSV/JSON only, in one process, without --incremental")
+    if not 0.6 <= args.model_threshold <= 1:
+        ap.error("--model-threshold must be between 0.6 and 1")
+    if args.zone_v6_prefix % 4 or not 4 <= args.zone_v6_prefix <= 124:
+        ap.error("--zone-v6-prefix must be a multiple of 4 between 4 and 124")
+
+    if args.train_model:
+        sources = args.train_from or [p for p in (os.path.join(args.outdir, "prompts.md"),
+                                                  os.path.join(args.outdir, "inventory_clean.csv"))
+                                      if os.path.exists(p)]
+        examples = training_examples(sources)
+        if not examples:
+            raise SystemExit(f"No labeled examples in {', '.join(sources) or args.outdir}")
+        model = DeviceModel.train(examples)
+        model.save(args.train_model)
+        print(f"Trained on {len(examples)} examples ({len(model.labels)} labels, {len(model.vocab)} n-grams, "
+              f"temperature {model.temperature:.3g}) from {', '.join(sources)}")
+        print(f"Wrote: {args.train_model}")
+        return
+
+    if args.diff:
+        os.makedirs(args.outdir, exist_ok=True)
+        changes_p = os.path.join(args.outdir, "changes.jsonl")
+        summary_p = os.path.join(args.outdir, "changes_summary.json")
+        summary = diff_snapshots(*args.diff, changes_p)
+        with open(summary_p, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(", ".join(f"{name} {n}" for name, n in summary.items()))
+        print(f"Wrote: {changes_p}")
+        print(f"Wrote: {summary_p}")
+        return
 
     os.makedirs(args.outdir, exist_ok=True)
 
     approach_p, cons_p, prompts_p, ideas_p = ensure_docs(args.outdir)
 
+    clean_p = os.path.join(args.outdir, "inventory_clean." + args.output_format)
+    anomalies_p = os.path.join(args.outdir, "anomalies." + args.anomalies_format)
+    sources_p = os.path.join(args.outdir, "sources.csv")
+    zones = None
+    if args.zones is not None:
+        zones = ZoneExport(args.zones or os.path.join(args.outdir, "zones"), args.zone_ttl, args.zone_v6_prefix)
+        os.makedirs(zones.directory, exist_ok=True)
+
+    llm = LLMSettings(batch_size=args.llm_batch_size, concurrency=args.llm_concurrency,
+                      rate_limit=args.llm_rate_limit, timeout=args.llm_timeout,
+                      client=LLMClient(retries=args.llm_retries, breaker_threshold=args.llm_breaker,
+                                       breaker_cooldown=args.llm_breaker_cooldown, budget=args.llm_budget))
+    if args.llm_base_url:
+        llm.base_url = args.llm_base_url
+    if args.use_llm and use_llm() and not args.no_llm_cache:
+        llm.cache = LLMCache(args.llm_cache or os.path.join(args.outdir, "llm_cache.sqlite"),
+                             ttl_seconds=args.llm_cache_ttl_days * 86400,
+                             max_entries=args.llm_cache_max_entries)
+
+    if args.profile or args.metrics_out:
+        enable_metrics()
+
+    subnets = load_subnets(args.subnets) if args.subnets else None
+    set_subnet_index(subnets)
+    if args.sites:
+        set_site_directory(load_sites(args.sites))
+    oui = open_oui_index(args.oui, args.outdir) if args.oui else None
+    set_oui_index(oui)
+    owners = open_owner_index(args.owners, args.outdir) if args.owners else None
+    set_owner_index(owners)
+    set_device_model(DeviceModel.load(args.model, args.model_threshold) if args.model else None)
+
+    if args.serve:
+        try:
+            serve(args.serve, RecordService(prompts_p, args.use_llm, llm))
+        finally:
+            llm.client.close()
+            if llm.cache is not None:
+                llm.cache.close()
+        return
+
+    dedup_stats: Dict[str, List[int]] = {}
+    pool = None
+    if args.workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                   initargs=(subnets, METRICS is not None, oui, SITE_DIRECTORY, owners))
+    n_shards = args.workers * 4
     try:
-        df = pd.read_csv(args.raw)
-    except Exception as e:
-        raise SystemExit(f"Failed to read {args.raw}: {e}")
+        if args.engine == "csv":
+            process_csv(args.raw, clean_p, anomalies_p, prompts_p, enable_llm=args.use_llm,
+                        batch_size=args.chunksize or 10000, anomalies_format=args.anomalies_format, llm=llm,
+                        compact=args.compact_codes, zones=zones)
+        elif args.chunksize > 0:
+            process_streaming(args.raw, clean_p, anomalies_p, prompts_p, enable_llm=args.use_llm,
+                              chunksize=args.chunksize, engine=args.engine,
+                              anomalies_format=args.anomalies_format, pool=pool, n_shards=n_shards,
+                              llm=llm, stats=dedup_stats, output_format=args.output_format,
+                              compact=args.compact_codes, zones=zones)
+        else:
+            if multi_source:
+                with stage("read"):
+                    df, n_records = load_sources(raw_paths)
+                print(f"Merged {n_records} records from {len(raw_paths)} files into {len(df)} assets")
+                write_sources(sources_p, df)
+            else:
+                try:
+                    with stage("read"):
+                        df = read_raw(args.raw)
+                except Exception as e:
+                    raise SystemExit(f"Failed to read {args.raw}: {e}")
+
+            if args.incremental is not None:
+                state = RunState(args.incremental or os.path.join(args.outdir, "run_state.sqlite"))
+                try:
+                    out_df, anomalies, summary = process_incremental(
+                        df, state, prompts_p, args.use_llm, engine=args.engine, pool=pool,
+                        n_shards=n_shards, llm=llm, stats=dedup_stats)
+                finally:
+                    state.close()
+                print(f"Incremental: {summary['reprocessed']} rows reprocessed, "
+                      f"{summary['carried']} carried forward, {summary['dropped']} dropped ({state.path})")
+            else:
+                out_df, anomalies = process_frame(df, prompts_p, args.use_llm, engine=args.engine,
+                                                  pool=pool, n_shards=n_shards, llm=llm, stats=dedup_stats)
 
-    out_df, anomalies = process(df, prompts_p, enable_llm=args.use_llm)
+            with stage("conflicts"):
+                anomalies += detect_conflicts(out_df)
+            if zones is not None:
+                with stage("zones"):
+                    zones.add(out_df)
+                    zones.finish(anomalies)
 
-    # Write outputs
-    clean_p = os.path.join(args.outdir, "inventory_clean.csv")
-    anomalies_p = os.path.join(args.outdir, "anomalies.json")
+            # Write outputs
+            write_clean(clean_p, out_df, fmt=args.output_format, compact=args.compact_codes)
+            write_anomalies(anomalies_p, anomalies, fmt=args.anomalies_format, compact=args.compact_codes)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        llm.client.close()
+        if llm.cache is not None:
+            llm.cache.close()
 
-    out_df.to_csv(clean_p, index=False)
-    write_anomalies(anomalies_p, anomalies)
+    codes_p = os.path.join(args.outdir, "codes.json")
+    if args.compact_codes:
+        write_codes(codes_p)
 
     # Also write a small README for convenience
     readme_p = os.path.join(args.outdir, "README_generated.txt")
     with open(readme_p, "w", encoding="utf-8") as f:
         f.write("Generated at: " + dt.datetime.utcnow().isoformat() + "Z\n")
         f.write("Files:\n")
-        f.write("  - inventory_clean.csv\n")
-        f.write("  - anomalies.json\n")
+        f.write(f"  - {os.path.basename(clean_p)}\n")
+        f.write(f"  - {os.path.basename(anomalies_p)}\n")
+        if args.compact_codes:
+            f.write("  - codes.json\n")
+        if multi_source:
+            f.write("  - sources.csv\n")
         f.write("  - approach.md\n")
         f.write("  - cons.md\n")
         f.write("  - prompts.md\n")
@@ -625,7 +4553,38 @@ def main():
 
     print(f"Wrote: {clean_p}")
     print(f"Wrote: {anomalies_p}")
+    if args.compact_codes:
+        print(f"Wrote: {codes_p}")
+    if multi_source:
+        print(f"Wrote: {sources_p}")
+    if zones is not None:
+        print(f"Wrote: {zones.zones} zones, {zones.records} records into {zones.directory} "
+              f"({zones.skipped} records of conflicting rows left out)")
     print(f"Wrote docs into: {args.outdir}")
+    for name, (rows, calls) in dedup_stats.items():
+        print(f"Dedup {name}: {rows} rows, {calls} normalizer calls ({rows / max(calls, 1):.1f}x)")
+    if llm.cache is not None:
+        print(f"LLM cache: {llm.cache.hits} hits, {llm.cache.misses} misses ({llm.cache.path})")
+    client = llm.client
+    if client.requests or client.short_circuited or client.over_budget:
+        print(f"LLM client: {client.requests} requests, {client.retried} retries, circuit opened {client.opened}x, "
+              f"{client.short_circuited} calls skipped while open, {client.over_budget} over budget")
+    if DEVICE_MODEL is not None:
+        print(f"Offline model: settled {DEVICE_MODEL.settled} of {DEVICE_MODEL.scored} weak rows ({args.model})")
+    if METRICS is not None:
+        report = METRICS.report(engine=args.engine, workers=args.workers, chunksize=args.chunksize)
+        if llm.cache is not None:
+            report["llm"].update(cache_hits=llm.cache.hits, cache_misses=llm.cache.misses)
+        report["llm"].update(requests=client.requests, retries=client.retried, circuit_opened=client.opened,
+                             short_circuited=client.short_circuited, over_budget=client.over_budget)
+        if DEVICE_MODEL is not None:
+            report["model"] = {"scored": DEVICE_MODEL.scored, "settled": DEVICE_MODEL.settled}
+        if args.metrics_out:
+            with open(args.metrics_out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote: {args.metrics_out}")
+        if args.profile:
+            print_metrics(report)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run  # noqa: E402
+
+
+# Messy inventory: odd IP/MAC spellings, IPv6, unicode, quoting, repeated values and
+# IP/MAC/FQDN conflicts, blank and non-numeric ids
+EDGE_CSV = """id,ip_address,host,fqdn,mac,owner,role,site
+1, 10.0.0.1 ,SW-CORE-01,sw-core-01.example.com.,aabb.cc00.0001,netops@example.com,Switch,SJC
+2,10.0.0.1,sw-core-02,sw-core-02.example.com,AA-BB-CC-00-00-02,"Smith, Alice (it)",,san jose
+3,010.000.000.003,printer_03,printer-03.example.com,aabbcc000003,bob,printer,NYC-B12
+,2001:DB8::1,v6-host,v6-host.example.com,aa:bb:cc:00:00:01,carol@example.com,,LON
+x,2001:0db8:0000:0000:0000:0000:0000:0002,v6-host-2,v6-host.example.com,,"Doe, Jane",server,
+6,::ffff:10.0.0.6,mapped,mapped.example.org,zz:zz:zz:zz:zz:zz,,,dc1
+7,fe80::1%eth0,café-07,café-07.example.com,aa:bb:cc:00:00:07,[secops] dave,firewall,SFO
+8,256.1.1.1,bad-ip,other.example.com,aa:bb:cc:00:00:08,,camera,Building 12 San Jose
+9,,,,,,,
+10,10.0.0.10,ap-10,ap-10.example.com,aa:bb:cc:00:00:0a,wifi team,AP,SJC
+11,10.0.0.11,ap-10,ap-10.example.com,aa:bb:cc:00:00:0a,wifi team,AP,SJC
+12,192.168.1.12,a-very-long-label-that-goes-on-and-on-well-past-sixty-three-characters,,02:00:00:00:00:0c,,,
+13,10.0.0.13,"db,13",db-13.example.com,aa:bb:cc:00:00:0d,finance@example.com,,nyc
+"""
+
+
+def completion(answer) -> dict:
+    """Chat Completions reply whose message content is `answer` (JSON-encoded unless already text)."""
+    content = answer if isinstance(answer, str) else json.dumps(answer)
+    return {"choices": [{"message": {"content": content}}]}
+
+
+class StubLLM:
+    """
+    Local Chat Completions endpoint. Each POST takes the next scripted reply, or
+    `default(request)` once the script is used up; a reply is (status, body, headers,
+    delay seconds). Arrival times, request bodies and the peak number of requests in
+    flight are recorded.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.default = lambda request: (200, completion({"device_type": "server", "confidence": 0.9}), {}, 0.0)
+        self.requests = []
+        self.arrivals = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._server.handle_error = lambda request, client_address: None  # clients that timed out
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def prompts(self) -> list:
+        return [r["messages"][1]["content"] for r in self.requests]
+
+    def _reply(self, request):
+        with self._lock:
+            self.requests.append(request)
+            self.arrivals.append(time.monotonic())
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            reply = self.script.pop(0) if self.script else None
+        return reply or self.default(request)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, body, headers, delay = stub._reply(request)
+                try:
+                    time.sleep(delay)
+                    data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("NO_PROXY", "*")
+    for name in ("HTTP_PROXY", "http_proxy", "HTTPS_PROXY", "https_proxy", "ALL_PROXY", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    server = StubLLM()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch):
+    """
+    run.main() on the given arguments, offline, into a fresh outdir under tmp_path;
+    returns the outdir. The lookup tables main() installs are reset afterwards.
+    """
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    runs = []
+
+    def invoke(*args):
+        out = tmp_path / f"out{len(runs)}"
+        runs.append(out)
+        monkeypatch.setattr(sys, "argv", ["run.py", "--outdir", str(out), *map(str, args)])
+        run.main()
+        return out
+
+    site_directory = run.SITE_DIRECTORY
+    yield invoke
+    run.set_subnet_index(None)
+    run.set_oui_index(None)
+    run.set_owner_index(None)
+    run.set_device_model(None)
+    run.set_site_directory(site_directory)
+
+
+@pytest.fixture
+def edge_csv(tmp_path):
+    path = tmp_path / "edge.csv"
+    path.write_text(EDGE_CSV, encoding="utf-8")
+    return path
@@ -0,0 +1,93 @@
+import csv
+import json
+import random
+
+import pytest
+
+import run
+
+
+def test_step_masks_round_trip():
+    rng = random.Random(5)
+    subsets = [[code] for code in run.STEP_CODES] + [rng.sample(run.STEP_CODES, rng.randint(0, 6)) for _ in range(200)]
+    for steps in subsets:
+        in_order = [code for code in run.STEP_CODES if code in steps]
+        assert run.steps_text(run.steps_mask(steps)) == ";".join(in_order)
+    masks = [run.steps_mask(steps) for steps in subsets]
+    assert run.expand_steps([str(m) for m in masks]) == run.expand_steps(masks)
+
+
+@pytest.fixture
+def table():
+    rng = random.Random(9)
+    table = run.AnomalyTable()
+    for pos in range(50):
+        for kind in sorted(rng.sample(range(run.DUPLICATE_IP), rng.randint(0, 3))):
+            table.add(1000 + pos, kind, pos)
+    table.add(1003, run.DUPLICATE_IP, 3, [1003, 1010, 1042])
+    table.add(1007, run.FQDN_MULTI_IP, 7, [1007, 1008])
+    return table
+
+
+def test_anomaly_table_round_trips(table):
+    records = list(table.records())
+    rebuilt = run.AnomalyTable.from_records(zip(table.positions, records))
+    assert list(rebuilt.records()) == records
+    assert list(run.AnomalyTable.from_arrays(*table.arrays()).records()) == \
+        [{k: v for k, v in rec.items() if k != "related_rows"} for rec in records]
+
+    # split and stitched back together, as shards are: positions restart in each part
+    head, tail = run.AnomalyTable(), run.AnomalyTable()
+    for i, (row_id, kind, pos) in enumerate(zip(table.row_ids, table.kinds, table.positions)):
+        if i < 30:
+            head.add(row_id, kind, pos, table.related.get(i))
+        else:
+            tail.add(row_id, kind, pos - 20, table.related.get(i))
+    stitched = run.AnomalyTable()
+    stitched.extend(head)
+    stitched.extend(tail, offset=20)
+    assert list(stitched.records()) == records and list(stitched.positions) == list(table.positions)
+    assert list((head + tail).records()) == records
+
+
+def test_compact_records_decode_to_full_records(table):
+    kinds = {code: (fields, issue_type, action) for code, (fields, issue_type, action) in enumerate(run.ANOMALY_KINDS)}
+    decoded = []
+    for rec in table.compact_records():
+        fields, issue_type, action = kinds[rec.pop("kind")]
+        decoded.append(dict(row_id=rec.pop("row_id"), fields=fields, issue_type=issue_type,
+                            recommended_action=action, **rec))
+    assert decoded == list(table.records())
+
+
+def read_anomalies(path):
+    text = path.read_text(encoding="utf-8")
+    return json.loads(text) if path.suffix == ".json" else [json.loads(line) for line in text.splitlines()]
+
+
+@pytest.mark.parametrize("flags", [(), ("--chunksize", 4), ("--engine", "csv"), ("--anomalies-format", "jsonl")])
+def test_compact_codes_outputs_decode_with_the_legend(cli, edge_csv, flags):
+    full = cli("--raw", edge_csv, *flags)
+    compact = cli("--raw", edge_csv, "--compact-codes", *flags)
+    legend = json.loads((compact / "codes.json").read_text(encoding="utf-8"))
+
+    with open(full / "inventory_clean.csv", encoding="utf-8", newline="") as f:
+        expected = list(csv.DictReader(f))
+    with open(compact / "inventory_clean.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        mask = int(row["normalization_steps"])
+        row["normalization_steps"] = ";".join(c for i, c in enumerate(legend["normalization_steps"]) if mask >> i & 1)
+    assert rows == expected
+
+    name = "anomalies." + ("jsonl" if "jsonl" in flags else "json")
+    kinds = {k["kind"]: k for k in legend["anomaly_kinds"]}
+    decoded = []
+    for rec in read_anomalies(compact / name):
+        kind = kinds[rec["kind"]]
+        full_rec = {"row_id": rec["row_id"], "fields": kind["fields"], "issue_type": kind["issue_type"],
+                    "recommended_action": kind["recommended_action"]}
+        if "related_rows" in rec:
+            full_rec["related_rows"] = rec["related_rows"]
+        decoded.append(full_rec)
+    assert decoded == read_anomalies(full / name)
@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+RAW = """source_row_id,ip,hostname,fqdn,mac,owner,site,device_type
+1,,,,,,,
+2,10.0.0.1,sw-01,sw-01.example.com,aa:bb:cc:dd:ee:ff,bob@example.com,SJC,switch
+"""
+
+TEXT = ["ip", "hostname", "fqdn", "mac", "owner", "site", "site_normalized"]
+
+
+@pytest.fixture
+def raw(tmp_path):
+    path = tmp_path / "inventory_raw.csv"
+    path.write_text(RAW, encoding="utf-8")
+    return path
+
+
+def test_blank_csv_cells_are_null_in_parquet(cli, raw):
+    rows = pq.read_table(cli("--raw", raw, "--output-format", "parquet") / "inventory_clean.parquet").to_pylist()
+    assert all(rows[0][name] is None for name in TEXT)
+    assert rows[0]["ip_version"] is None and rows[0]["source_row_id"] == 1
+    assert [rows[1][name] for name in TEXT] == ["10.0.0.1", "sw-01", "sw-01.example.com", "AA:BB:CC:DD:EE:FF",
+                                                "Bob", "SJC", "SJC"]
+
+
+def test_csv_output_keeps_its_text(cli, raw):
+    with open(cli("--raw", raw) / "inventory_clean.csv", encoding="utf-8", newline="") as f:
+        first = next(csv.DictReader(f))
+    assert [first[name] for name in TEXT] == ["nan", "nan", "nan", "NAN", "Nan", "nan", "NAN"]
+
+
+def test_all_null_first_batch_in_arrow(cli, raw):
+    # one row per batch: the dictionary columns start out with no values at all
+    out = cli("--raw", raw, "--output-format", "arrow", "--chunksize", 1)
+    rows = pa.ipc.open_file(str(out / "inventory_clean.arrow")).read_all().to_pylist()
+    assert rows[0]["site_normalized"] is None and rows[1]["site_normalized"] == "SJC"
+
+
+def test_diff_spells_nulls_like_the_csv_output(cli, raw):
+    typed = cli("--raw", raw, "--output-format", "parquet")
+    text = cli("--raw", raw)
+    summary = (cli("--diff", text, typed) / "changes_summary.json").read_text(encoding="utf-8")
+    assert '"unchanged": 2' in summary and '"changed": 0' in summary
@@ -0,0 +1,59 @@
+import random
+
+import pandas as pd
+import pytest
+
+import run
+
+
+@pytest.fixture(scope="module")
+def clean():
+    """Clean rows drawn from small value pools, so IPs, MACs and FQDNs collide often."""
+    rng = random.Random(11)
+    ips = [f"10.0.0.{i}" for i in range(40)] + [f"2001:db8::{i:x}" for i in range(20)] + ["bad-ip", ""]
+    macs = [f"aa:bb:cc:00:00:{i:02x}" for i in range(50)] + ["zz", ""]
+    names = [f"h{i}.example.com" for i in range(30)] + ["single", ""]
+    raw = pd.DataFrame({"id": [str(i) for i in range(1, 401)],
+                        "ip": [rng.choice(ips) for _ in range(400)],
+                        "mac": [rng.choice(macs) for _ in range(400)],
+                        "fqdn": [rng.choice(names) for _ in range(400)]})
+    out_df, _ = run.process_frame(raw, "", enable_llm=False)
+    return out_df
+
+
+def records(table):
+    return list(table.records())
+
+
+def brute_force(out_df, key, valid):
+    """(first row id, related row ids) per valid value shared by several rows."""
+    groups = {}
+    for value, ok, sid in zip(out_df[key], out_df[valid], out_df["source_row_id"]):
+        if ok:
+            groups.setdefault(value, []).append(int(sid))
+    return sorted((ids[0], ids) for ids in groups.values() if len(ids) > 1)
+
+
+def test_duplicates_match_brute_force(clean):
+    found = records(run.detect_conflicts(clean))
+    for issue_type, key, valid in (("duplicate_ip", "ip", "ip_valid"), ("duplicate_mac", "mac", "mac_valid")):
+        got = sorted((r["row_id"], r["related_rows"]) for r in found if r["issue_type"] == issue_type)
+        assert got == brute_force(clean, key, valid)
+    assert any(r["issue_type"] == "fqdn_multi_ip" for r in found)
+
+
+@pytest.mark.parametrize("batch", [7, 37, 400])
+def test_batched_and_spilled_indexes_agree(clean, tmp_path, batch):
+    expected = records(run.detect_conflicts(clean))
+    index = run.ConflictIndex()
+    spilling = run.SpillingConflictIndex(run_size=25, directory=str(tmp_path))
+    records_index = run.SpillingConflictIndex(run_size=25, directory=str(tmp_path))
+    for start in range(0, len(clean), batch):
+        part = clean.iloc[start:start + batch].reset_index(drop=True)
+        index.add(part)
+        spilling.add(part)
+        records_index.add_records(part.to_dict("records"))
+    assert records(index.anomalies()) == expected
+    assert records(spilling.anomalies()) == expected
+    assert records(records_index.anomalies()) == expected
+    assert list(tmp_path.iterdir()) == []  # spilled runs are cleaned up
@@ -0,0 +1,31 @@
+import io
+
+import pandas as pd
+
+import run
+from conftest import EDGE_CSV
+
+COLUMNS = {"ip": "ip_address", "hostname": "host", "fqdn": "fqdn", "mac": "mac", "owner": "owner", "site": "site"}
+
+
+def repeated(times):
+    df = pd.read_csv(io.StringIO(EDGE_CSV), dtype=str)
+    return pd.concat([df] * times, ignore_index=True)
+
+
+def test_each_normalizer_runs_once_per_distinct_value(monkeypatch):
+    df = repeated(5)
+    seen = []
+    parse_owner = run.parse_owner
+    monkeypatch.setattr(run, "parse_owner", lambda value: seen.append(value) or parse_owner(value))
+    norm = run.normalize_deduplicated(df)
+    for name, column in COLUMNS.items():
+        assert norm.stats[name] == [len(df), df[column].nunique(dropna=False)], name
+    assert len(seen) == len(set(map(str, seen))) == df["owner"].nunique(dropna=False)
+
+
+def test_dedup_output_matches_the_row_engine():
+    df = repeated(3)
+    dedup, rows = run.normalize_deduplicated(df), run.normalize_rows(df)
+    pd.testing.assert_frame_equal(dedup.frame, rows.frame, check_dtype=False)
+    assert list(dedup.anomalies.records()) == list(rows.anomalies.records())
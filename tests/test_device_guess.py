@@ -0,0 +1,23 @@
+import run
+
+AXIS = "Axis Communications AB"  # camera, counts as two hits
+JUNIPER = "Juniper Networks"  # router, one hit
+
+
+def test_keywords_outrank_a_disagreeing_vendor():
+    dev, conf, steps = run.deterministic_device_guess("lobby printer", AXIS)
+    assert (dev, steps) == ("printer", ["device:heuristic_match"])
+    assert conf == run.deterministic_device_guess("lobby printer")[1]
+
+
+def test_vendor_decides_without_keywords():
+    assert run.deterministic_device_guess("lobby", AXIS) == ("camera", 0.6, ["device:oui_vendor"])
+    assert run.deterministic_device_guess("lobby", "Some Unknown Vendor") == ("", 0.0, [])
+
+
+def test_vendor_breaks_a_tie_it_is_part_of():
+    # "rtr" and "sw": one hit each for router and switch
+    assert run.deterministic_device_guess("rtr sw", JUNIPER)[::2] == \
+        ("router", ["device:heuristic_match", "device:oui_vendor"])
+    # a camera vendor cannot pull a switch/router tie its way; table order settles it as before
+    assert run.deterministic_device_guess("rtr sw", AXIS)[::2] == ("switch", ["device:heuristic_match"])
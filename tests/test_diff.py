@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+import run
+
+OLD = """source_row_id,ip,hostname,mac,owner,site,device_type
+1,10.0.0.1,sw-01,aa:bb:cc:00:00:01,netops,SJC,switch
+2,10.0.0.2,sw-02,aa:bb:cc:00:00:02,netops,SJC,switch
+3,10.0.0.3,prn-03,,it,NYC,printer
+4,10.0.0.4,cam-04,aa:bb:cc:00:00:04,secops,LON,camera
+5,10.0.0.5,old-05,aa:bb:cc:00:00:05,,,
+"""
+
+# ids renumbered: 2 moves by mac (new ip), 3 by ip (no mac), 4 by mac; 5 is gone, 9 is new
+NEW = """source_row_id,ip,hostname,mac,owner,site,device_type
+1,10.0.0.1,sw-01,aa:bb:cc:00:00:01,netops,SJC,switch
+12,10.0.1.2,sw-02,aa:bb:cc:00:00:02,netops,SJC,switch
+13,10.0.0.3,prn-03,,it,NYC,printer
+14,10.0.0.4,cam-04,aa:bb:cc:00:00:04,secops,LON,camera
+9,10.0.0.9,new-09,aa:bb:cc:00:00:09,,,
+"""
+
+
+@pytest.fixture
+def snapshots(cli, tmp_path):
+    paths = []
+    for name, text in (("old.csv", OLD), ("new.csv", NEW)):
+        (tmp_path / name).write_text(text, encoding="utf-8")
+        paths.append(cli("--raw", tmp_path / name))
+    return paths
+
+
+def changes(path):
+    return sorted(path.read_text(encoding="utf-8").splitlines())
+
+
+@pytest.mark.parametrize("partition_bytes", [run.DIFF_PARTITION_BYTES, 1])
+def test_leftovers_join_on_mac_then_ip(snapshots, tmp_path, monkeypatch, partition_bytes):
+    monkeypatch.setattr(run, "DIFF_PARTITION_BYTES", partition_bytes)
+    summary = run.diff_snapshots(*snapshots, str(tmp_path / "changes.jsonl"))
+    assert (summary["matched_on_mac"], summary["matched_on_ip"]) == (2, 1)
+    assert (summary["unchanged"], summary["changed"], summary["added"], summary["removed"]) == (1, 3, 1, 1)
+    records = [json.loads(line) for line in changes(tmp_path / "changes.jsonl")]
+    moved = {r["old_source_row_id"]: (r["source_row_id"], r["matched_on"]) for r in records if "matched_on" in r}
+    assert moved == {2: (12, "mac"), 3: (13, "ip"), 4: (14, "mac")}
+    assert {(r["change"], r["source_row_id"]) for r in records if r["change"] in ("added", "removed")} == \
+        {("added", 9), ("removed", 5)}
@@ -0,0 +1,64 @@
+import csv
+
+import pytest
+
+RAW = """source_row_id,ip,hostname,mac,owner,site,device_type
+10,10.0.0.1,sw-core-01,aa:bb:cc:00:00:01,netops@example.com,SJC,switch
+,10.0.0.2,printer-02,aa-bb-cc-00-00-02,"Smith, Alice (it)",san jose,
+12,10.0.0.3,,AABBCC000003,,NYC,
+abc,10.0.0.4,cam-04,,bob,,camera
+ 15 ,not-an-ip,host_05,zz:zz,,LON,router
+1.5,2001:db8::6,v6-host,aa:bb:cc:00:00:06,carol@example.com,,
+,10.0.0.3,dup-ip,aa:bb:cc:00:00:07,,SJC,
+-3,,,,,,
+²,10.0.0.9,ap-09,aa:bb:cc:00:00:09,dave,,ap
+20,10.0.0.10,host-10,aa:bb:cc:00:00:0a,,,
+"""
+
+# blank, non-numeric, signed, fractional and superscript ids fall back to the row's position
+EXPECTED_IDS = [10, 2, 12, 4, 15, 6, 7, 8, 9, 20]
+
+
+@pytest.fixture
+def raw(tmp_path):
+    path = tmp_path / "inventory_raw.csv"
+    path.write_text(RAW, encoding="utf-8")
+    return path
+
+
+def outputs(out):
+    return (out / "inventory_clean.csv").read_text(encoding="utf-8"), (out / "anomalies.json").read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("chunksize", [0, 3])
+@pytest.mark.parametrize("engine", ["rows", "vectorized", "dedup", "csv"])
+def test_source_row_ids_agree_across_engines_and_chunking(cli, raw, engine, chunksize):
+    clean, anomalies = outputs(cli("--raw", raw, "--engine", engine, "--chunksize", chunksize))
+    assert [int(r["source_row_id"]) for r in csv.DictReader(clean.splitlines())] == EXPECTED_IDS
+    assert (clean, anomalies) == outputs(cli("--raw", raw))
+
+
+def test_csv_engine_reads_missing_value_markers_as_blank_ids(cli, tmp_path):
+    path = tmp_path / "markers.csv"
+    path.write_text("id,ip\nNA,10.0.0.1\nnull,10.0.0.2\n7,10.0.0.3\nNone,10.0.0.4\n\" 9\",10.0.0.5\nn/a,10.0.0.6\n",
+                    encoding="utf-8")
+    clean, anomalies = outputs(cli("--raw", path, "--engine", "csv"))
+    assert [int(r["source_row_id"]) for r in csv.DictReader(clean.splitlines())] == [1, 2, 7, 4, 9, 6]
+    assert (clean, anomalies) == outputs(cli("--raw", path))
+
+
+@pytest.mark.parametrize("chunksize", [0, 4])
+@pytest.mark.parametrize("engine", ["vectorized", "dedup", "csv"])
+def test_engines_match_the_row_engine_on_edge_cases(cli, edge_csv, engine, chunksize):
+    expected = outputs(cli("--raw", edge_csv))
+    assert outputs(cli("--raw", edge_csv, "--engine", engine, "--chunksize", chunksize)) == expected
+    # the row engine in chunks too
+    assert outputs(cli("--raw", edge_csv, "--chunksize", 4 - chunksize)) == expected
+
+
+@pytest.mark.parametrize("chunksize", [0, 5])
+@pytest.mark.parametrize("engine", ["rows", "vectorized", "dedup"])
+def test_workers_match_a_single_process(cli, edge_csv, engine, chunksize):
+    # 3 workers split each frame or chunk into 12 shards: most shards hold a row or two
+    expected = outputs(cli("--raw", edge_csv, "--engine", engine))
+    assert outputs(cli("--raw", edge_csv, "--engine", engine, "--chunksize", chunksize, "--workers", 3)) == expected
@@ -0,0 +1,41 @@
+import re
+
+HEADER = "source_row_id,ip,hostname,mac,owner,site,device_type\n"
+
+
+def inventory(rows):
+    return HEADER + "".join(f"{sid},10.0.{i // 200}.{i % 200},host-{i},aa:bb:cc:00:{i // 256:02x}:{i % 256:02x},"
+                            f"alice smith,SJC,switch\n" for sid, i in rows)
+
+
+def incremental(cli, capsys, raw, state):
+    out = cli("--raw", raw, "--incremental", state)
+    counts = re.search(r"Incremental: (\d+) rows reprocessed, (\d+) carried forward, (\d+) dropped",
+                       capsys.readouterr().out)
+    return out, tuple(map(int, counts.groups()))
+
+
+def outputs(out):
+    return [(out / name).read_text(encoding="utf-8") for name in ("inventory_clean.csv", "anomalies.json")]
+
+
+def test_rows_without_ids_are_found_again_by_content(cli, capsys, tmp_path):
+    state = tmp_path / "state.sqlite"
+    rows = [(i if i % 3 else "", i) for i in range(300)]  # every third id blank
+    (tmp_path / "v1.csv").write_text(inventory(rows), encoding="utf-8")
+    assert incremental(cli, capsys, tmp_path / "v1.csv", state)[1] == (300, 0, 0)
+
+    # two rows near the top go: every later blank-id row moves up two positions
+    del rows[3], rows[5]
+    (tmp_path / "v2.csv").write_text(inventory(rows), encoding="utf-8")
+    out, counts = incremental(cli, capsys, tmp_path / "v2.csv", state)
+    assert counts == (0, 298, 2)
+    assert outputs(out) == outputs(cli("--raw", tmp_path / "v2.csv"))
+
+    # a changed row with its own id, and a new blank-id row
+    rows[11] = (rows[11][0], 999)
+    rows.append(("", 1000))
+    (tmp_path / "v3.csv").write_text(inventory(rows), encoding="utf-8")
+    out, counts = incremental(cli, capsys, tmp_path / "v3.csv", state)
+    assert counts == (2, 297, 0)
+    assert outputs(out) == outputs(cli("--raw", tmp_path / "v3.csv"))
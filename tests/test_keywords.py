@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+import run
+
+TABLES = [run.DEVICE_KEYWORDS, run.TEAM_KEYWORDS,
+          {"a": ["ab", "abc", "b"], "b": ["abcd", "", "bc"], "c": ["c", "ab"]},  # prefixes, overlaps, ""
+          {"a": ["avi-lb", "lb", "avi"], "b": ["a-b", "b-c", "a"], "c": ["-", "b"]}]  # keywords across words
+
+
+def texts(table, n=300, seed=7):
+    rng = random.Random(seed)
+    words = [k for keys in table.values() for k in keys if k] + ["x", "-", " ", ".", "_", "é"]
+    return ["".join(rng.choice(words) + rng.choice(["", "", " ", "-"]) for _ in range(rng.randint(0, 8)))
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize("table", TABLES)
+def test_counts_equal_substring_search(table):
+    matcher = run.KeywordMatcher(table)
+    for text in texts(table):
+        assert matcher.counts(text) == [sum(k in text for k in keys) for keys in table.values()], text
+
+
+def standalone(k, text):
+    """`k` occurs in `text` with no letter or digit right before or after it."""
+    if not k:
+        return True
+    start = text.find(k)
+    while start >= 0:
+        end = start + len(k)
+        if not (start and text[start - 1].isalnum()) and not (end < len(text) and text[end].isalnum()):
+            return True
+        start = text.find(k, start + 1)
+    return False
+
+
+@pytest.mark.parametrize("table", TABLES)
+def test_whole_word_counts_equal_bounded_search(table):
+    matcher = run.KeywordMatcher(table, whole_words=True)
+    for text in texts(table):
+        assert matcher.counts(text) == [sum(standalone(k, text) for k in keys) for keys in table.values()], text
+
+
+def test_first_follows_table_order():
+    matcher = run.KeywordMatcher({"x": ["zz"], "y": ["ab"], "z": ["a"]})
+    assert matcher.first("ab zz") == "x" and matcher.first("ab") == "y" and matcher.first("q") == ""
@@ -0,0 +1,96 @@
+import re
+
+import run
+from conftest import completion
+
+LABELS = ["switch", "router", "printer", "camera", "phone"]
+
+
+def asset_lines(prompt: str) -> list:
+    """(id, hint) per "<id>: <hints>" line of a batch prompt."""
+    return re.findall(r"^(\d+): (.+)$", prompt, flags=re.MULTILINE)
+
+
+def label_for(hint: str) -> str:
+    return LABELS[int(hint.split("-")[1]) % len(LABELS)]
+
+
+def answer_by_id(request):
+    """Answer every asset of a batch prompt, keys in reverse order, from its hint."""
+    lines = asset_lines(request["messages"][1]["content"])
+    answer = {rid: {"device_type": label_for(hint), "confidence": 0.8} for rid, hint in reversed(lines)}
+    return 200, completion(answer), {}, 0.0
+
+
+def classify(stub, tmp_path, n, **settings):
+    hints = [f"hint-{i}" for i in range(n)]
+    device_type = ["unknown"] * n
+    device_conf = [0.2] * n
+    llm = run.LLMSettings(base_url=stub.base_url, client=run.LLMClient(retries=0), **settings)
+    try:
+        run.llm_classify_weak(list(range(n)), hints, device_type, device_conf, str(tmp_path / "prompts.md"), llm)
+    finally:
+        llm.client.close()
+    return device_type, device_conf
+
+
+def test_rows_are_packed_batch_size_per_prompt(stub, tmp_path):
+    stub.default = answer_by_id
+    classify(stub, tmp_path, 7, batch_size=3)
+    batches = [[hint for _, hint in asset_lines(p)] for p in stub.prompts()]
+    assert batches == [["hint-0", "hint-1", "hint-2"], ["hint-3", "hint-4", "hint-5"], ["hint-6"]]
+    assert [[rid for rid, _ in asset_lines(p)] for p in stub.prompts()] == [["1", "2", "3"], ["1", "2", "3"], ["1"]]
+
+
+def test_batch_answers_map_back_to_rows_by_id(stub, tmp_path):
+    stub.default = answer_by_id
+    device_type, device_conf = classify(stub, tmp_path, 10, batch_size=4, concurrency=3)
+    assert device_type == [label_for(f"hint-{i}") for i in range(10)]
+    assert device_conf == [0.8] * 10
+
+
+def test_single_row_prompts_without_batching(stub, tmp_path):
+    device_type, device_conf = classify(stub, tmp_path, 3)
+    assert len(stub.requests) == 3
+    assert all(not asset_lines(p) and "Hints (free-form text):" in p for p in stub.prompts())
+    assert device_type == ["server"] * 3 and device_conf == [0.9] * 3
+
+
+def test_concurrency_is_bounded(stub, tmp_path):
+    stub.default = lambda request: (*answer_by_id(request)[:3], 0.1)
+    device_type, _ = classify(stub, tmp_path, 16, batch_size=2, concurrency=3)
+    assert len(stub.requests) == 8
+    assert stub.peak == 3
+    assert device_type == [label_for(f"hint-{i}") for i in range(16)]
+
+
+def test_rate_limit_spaces_requests(stub, tmp_path):
+    stub.default = answer_by_id
+    classify(stub, tmp_path, 6, concurrency=6, rate_limit=20)
+    gaps = [b - a for a, b in zip(stub.arrivals, stub.arrivals[1:])]
+    assert len(stub.requests) == 6
+    # 20 requests/s: one slot every 50 ms, whatever the concurrency (small allowance for scheduling)
+    assert stub.arrivals[-1] - stub.arrivals[0] >= 5 * 0.05 * 0.9
+    assert min(gaps) >= 0.05 * 0.5
+
+
+def test_partial_batch_answer_falls_back_per_row(stub, tmp_path):
+    # id 2 is missing, id 3 is not an answer object: those rows keep their heuristic guess
+    stub.script = [(200, completion({"1": {"device_type": "router", "confidence": 0.7},
+                                     "3": "printer",
+                                     "4": {"device_type": "camera", "confidence": 0.95}}), {}, 0.0)]
+    device_type, device_conf = classify(stub, tmp_path, 4, batch_size=4)
+    assert device_type == ["router", "unknown", "unknown", "camera"]
+    assert device_conf == [0.7, 0.2, 0.2, 0.95]
+
+
+def test_malformed_batch_reply_keeps_every_guess(stub, tmp_path):
+    stub.script = [(200, completion("not json {"), {}, 0.0),
+                   (200, {"no": "choices"}, {}, 0.0)]
+    stub.default = answer_by_id
+    device_type, device_conf = classify(stub, tmp_path, 6, batch_size=2)
+    assert device_type == ["unknown", "unknown", "unknown", "unknown"] + [label_for("hint-4"), label_for("hint-5")]
+    assert device_conf == [0.2, 0.2, 0.2, 0.2, 0.8, 0.8]
+    log = (tmp_path / "prompts.md").read_text(encoding="utf-8")
+    assert log.count("device_type classification (batch of 2)") == 3
+    assert log.count("no response (offline or LLM disabled)") == 2
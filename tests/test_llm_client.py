@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import run
+from conftest import completion
+
+OK = (200, completion({"device_type": "switch", "confidence": 0.9}), {}, 0.0)
+
+
+def post(stub, client, timeout=5.0):
+    return client.post_json(stub.base_url + "/chat/completions", {"messages": []}, {}, timeout)
+
+
+@pytest.fixture
+def client():
+    clients = []
+
+    def make(**kwargs):
+        clients.append(run.LLMClient(**kwargs))
+        return clients[-1]
+
+    yield make
+    for c in clients:
+        c.close()
+
+
+def test_retries_back_off_exponentially(stub, client, monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)  # take the top of each jitter window
+    stub.script = [(503, {}, {}, 0.0)] * 3
+    c = client(retries=3, backoff=0.05)
+    assert post(stub, c)["choices"]
+    gaps = [b - a for a, b in zip(stub.arrivals, stub.arrivals[1:])]
+    assert len(stub.requests) == 4 and c.requests == 4 and c.retried == 3
+    for gap, delay in zip(gaps, (0.05, 0.1, 0.2)):
+        assert gap >= delay
+    assert gaps[2] < 1.0
+
+
+def test_retry_after_is_honoured_and_capped(stub, client, monkeypatch):
+    stub.script = [(429, {}, {"Retry-After": "1"}, 0.0)]
+    c = client(retries=1, backoff=0.0)
+    post(stub, c)
+    assert stub.arrivals[1] - stub.arrivals[0] >= 1.0
+
+    monkeypatch.setattr(run.LLMClient, "MAX_RETRY_AFTER", 0.2)
+    stub.script = [(503, {}, {"Retry-After": "120"}, 0.0)]
+    start = time.monotonic()
+    post(stub, c)
+    assert 0.2 <= time.monotonic() - start < 5
+
+
+def test_retries_exhausted_or_not_retryable(stub, client):
+    stub.script = [(503, {}, {}, 0.0)] * 3
+    c = client(retries=2, backoff=0.01, breaker_threshold=0)
+    with pytest.raises(urllib.error.HTTPError) as err:
+        post(stub, c)
+    assert err.value.code == 503 and len(stub.requests) == 3
+
+    stub.script = [(400, {}, {}, 0.0)]
+    with pytest.raises(urllib.error.HTTPError) as err:
+        post(stub, c)
+    assert err.value.code == 400 and len(stub.requests) == 4  # client errors are not retried
+
+
+def test_timeout_is_not_retried(stub, client, monkeypatch):
+    stub.script = [(200, completion({}), {}, 1.0)]
+    c = client(retries=3, backoff=0.01)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        post(stub, c, timeout=0.2)
+    assert time.monotonic() - start < 0.9
+    assert len(stub.requests) == 1 and c.retried == 0
+
+    # the classification call swallows it: no answer, the heuristic guess stands
+    stub.script = [(200, completion({}), {}, 1.0)]
+    assert run.call_llm_device_type("hints", timeout=0.2, base_url=stub.base_url, client=c) is None
+
+
+def test_circuit_opens_then_half_open_trial_closes_it(stub, client):
+    stub.script = [(500, {}, {}, 0.0)] * 2
+    c = client(retries=0, breaker_threshold=2, breaker_cooldown=0.3)
+    for _ in range(2):
+        with pytest.raises(urllib.error.HTTPError):
+            post(stub, c)
+    assert c.opened == 1
+
+    # open: calls fail at once, nothing reaches the server
+    with pytest.raises(run.LLMUnavailable):
+        post(stub, c)
+    assert c.short_circuited == 1 and len(stub.requests) == 2
+    assert run.call_llm_device_type("hints", base_url=stub.base_url, client=c) is None
+    assert len(stub.requests) == 2
+
+    # half-open after the cooldown: one trial call at a time, others still short-circuit
+    time.sleep(0.35)
+    stub.script = [(200, completion({"device_type": "router", "confidence": 0.8}), {}, 0.3)]
+    trial = threading.Thread(target=post, args=(stub, c))
+    trial.start()
+    time.sleep(0.1)
+    with pytest.raises(run.LLMUnavailable):
+        post(stub, c)
+    trial.join()
+
+    # the trial succeeded: closed again
+    assert post(stub, c)["choices"] and post(stub, c)["choices"]
+    assert c.opened == 1 and len(stub.requests) == 5
+
+
+def test_failed_half_open_trial_reopens_circuit(stub, client):
+    stub.script = [(500, {}, {}, 0.0)] * 3
+    c = client(retries=0, breaker_threshold=2, breaker_cooldown=0.3)
+    for _ in range(2):
+        with pytest.raises(urllib.error.HTTPError):
+            post(stub, c)
+    time.sleep(0.35)
+    with pytest.raises(urllib.error.HTTPError):
+        post(stub, c)  # the trial fails
+    with pytest.raises(run.LLMUnavailable):
+        post(stub, c)
+    assert len(stub.requests) == 3
+
+    time.sleep(0.35)
+    assert post(stub, c)["choices"]
+    assert len(stub.requests) == 4
+
+
+def test_time_budget_caps_the_run(stub, client):
+    stub.default = lambda request: (*OK[:3], 0.3)
+    c = client(retries=2, budget=0.5)
+    assert post(stub, c)["choices"]
+    # 0.2 s left: the next call gets only that long, then nothing more is sent
+    with pytest.raises(TimeoutError):
+        post(stub, c)
+    with pytest.raises(run.LLMUnavailable):
+        post(stub, c)
+    assert c.over_budget == 1 and len(stub.requests) == 2
+
+
+def test_retry_that_would_overrun_budget_is_not_waited_for(stub, client):
+    stub.script = [(429, {}, {"Retry-After": "5"}, 0.0)]
+    c = client(retries=2, budget=1.0)
+    start = time.monotonic()
+    with pytest.raises(urllib.error.HTTPError):
+        post(stub, c)
+    assert time.monotonic() - start < 0.5 and len(stub.requests) == 1
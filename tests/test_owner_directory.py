@@ -0,0 +1,41 @@
+import pytest
+
+import run
+
+
+@pytest.fixture
+def directory(tmp_path):
+    def install(rows):
+        export = tmp_path / "hr.csv"
+        export.write_text("displayName,mail,department\n" + "".join(f"{r}\n" for r in rows), encoding="utf-8")
+        run.set_owner_index(run.open_owner_index(str(export), str(tmp_path)))
+
+    yield install
+    run.set_owner_index(None)
+
+
+def test_directory_team_is_used_as_is(directory):
+    directory(["Alice Smith,alice.smith@example.com,Sales"])
+    assert run.parse_owner("Alice Smith") == ("Alice Smith", "alice.smith@example.com", "Sales",
+                                              ["owner:directory_match"])
+
+
+def test_directory_hit_without_team_stays_blank(directory):
+    directory(["Alice Smith,alice.smith@example.com,"])
+    # no keyword fallback on a hit: "it" inside "smith" (or a team hint in the text) is not a team
+    assert run.parse_owner("Alice Smith") == ("Alice Smith", "alice.smith@example.com", "",
+                                              ["owner:directory_match"])
+    assert run.parse_owner("Smith, Alice (netops)")[2] == ""
+
+
+def test_keyword_team_needs_a_whole_word():
+    assert run.parse_owner("Alice Smith") == ("Alice Smith", "", "", [])
+    assert run.parse_owner("Alice Smith (it)")[2:] == ("it", ["owner:team_inferred"])
+    assert run.parse_owner("bob@netops.example.com")[2] == "netops"
+    assert run.parse_owner("Edith Fieldman")[2] == ""
+
+
+def test_whole_word_keywords_inside_longer_ones():
+    matcher = run.KeywordMatcher({"lb": ["avi-lb"], "part": ["lb", "avi"], "none": ["vi"]}, whole_words=True)
+    assert matcher.counts("avi-lb") == [1, 2, 0]
+    assert matcher.counts("xavi-lb") == [0, 1, 0]
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+import run
+
+
+def brute_force(sites, key, whole_words):
+    """First site (in order) whose code equals the key or one of whose synonyms it contains."""
+    padded = f" {key.replace('-', ' ')} "
+    for code, synonyms in sites.items():
+        if run.site_key(code) == key:
+            return code
+        for synonym in synonyms:
+            if synonym and (f" {synonym.replace('-', ' ')} " in padded if whole_words else synonym in key):
+                return code
+    return ""
+
+
+@pytest.mark.parametrize("whole_words", [False, True])
+def test_resolve_matches_a_linear_scan(whole_words):
+    rng = random.Random(21)
+    words = ["campus", "north", "4", "41", "dc", "west", "hq", "east-1", "lab"]
+    sites = {f"S{i:02d}": [" ".join(rng.sample(words, rng.randint(1, 2))) for _ in range(rng.randint(1, 3))]
+             for i in range(30)}
+    directory = run.SiteDirectory(sites, whole_words=whole_words)
+    probes = [" ".join(rng.choices(words + ["x"], k=rng.randint(1, 4))) for _ in range(500)] + ["s07", "s7", ""]
+    for key in probes:
+        assert directory.resolve(key) == brute_force(sites, key, whole_words), key
+
+
+def test_builtin_map_matches_anywhere():
+    assert run.SITE_DIRECTORY.resolve(run.site_key("San Jose, Bldg 2")) == "SJC"
+    assert run.normalize_site("Tokyo, bldg 7") == ("Tokyo, bldg 7", "TYO-B7", ["site:building_tagged", "site:normalized"])
+    assert run.normalize_site("xyz") == ("xyz", "XYZ", ["site:assumed_three_letter_code"])
+    assert run.normalize_site("Mars base")[1:] == ("", ["site:unknown"])
+
+
+@pytest.fixture(params=["csv", "json"])
+def directory_file(request, tmp_path):
+    if request.param == "csv":
+        path = tmp_path / "sites.csv"
+        path.write_text("site,synonyms\n"
+                        "# campus sites\n"
+                        "C4,Campus 4;main campus\n"
+                        "C41,campus 41|Campus-41\n"
+                        "C4,north gate\n"
+                        "DUP,main campus\n", encoding="utf-8")
+    else:
+        path = tmp_path / "sites.json"
+        path.write_text('{"C4": ["Campus 4", "main campus", "north gate"], "C41": "campus 41", '
+                        '"DUP": ["main campus"]}', encoding="utf-8")
+    return str(path)
+
+
+def test_loaded_directory_matches_whole_words(monkeypatch, directory_file):
+    directory = run.load_sites(directory_file)
+    assert directory.sites["C4"] == ["campus 4", "main campus", "north gate"]
+    monkeypatch.setattr(run, "SITE_DIRECTORY", directory)
+    assert run.normalize_site("Campus 41")[1] == "C41"
+    assert run.normalize_site("campus 4 bldg 12")[1] == "C4-B12"
+    assert run.normalize_site("The Main-Campus")[1] == "C4"  # first site in file order wins over DUP
+    assert run.normalize_site("North Gate")[1] == "C4"  # a repeated code adds synonyms
+    assert run.normalize_site("c41")[1] == "C41"
+    assert run.normalize_site("campus 410")[1:] == ("", ["site:unknown"])
+    assert run.normalize_site("sjc")[1] == "SJC"  # not in the file: the three-letter fallback
+
+
+def test_empty_or_malformed_directories_are_rejected(tmp_path):
+    for name, text in (("empty.csv", "site\n# nothing\n"), ("bad.json", "[1, 2]"), ("broken.json", "{")):
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        with pytest.raises(SystemExit):
+            run.load_sites(str(path))
@@ -0,0 +1,82 @@
+import csv
+import os
+
+import pytest
+
+import run
+
+# two exports of the same estate, with different headers, spellings and id columns
+SHARDS = {
+    "dhcp/a.csv": "id,ip,hostname,mac,owner\n"
+                  "1,10.0.0.1,h1,aa:bb:cc:00:00:01,\n"
+                  "2,10.0.0.2,h2,,\n"
+                  "3,10.0.0.1,h3,aa:bb:cc:00:00:01,\n",
+    "cmdb/b.csv": "row_id,address,host,mac_address,assigned_to,location\n"
+                  "10,,other,AABB.CC00.0001,bob,SJC\n"              # a:1 by MAC; fills owner and site
+                  "x,10.0.0.2,,aa:bb:cc:00:00:02,carol,\n"          # a:2 by IP (a:2 has no MAC)
+                  "12,10.0.0.1,h4,aa:bb:cc:00:00:09,,\n"            # same IP, other MAC: a new asset
+                  ",010.0.0.5,h5,,,\n"                              # invalid IP: a new asset
+                  "14,,,aa-bb-cc-00-00-01,dave,\n",                 # a:1 already has a b record: joins a:3
+}
+
+
+@pytest.fixture
+def shards(tmp_path):
+    paths = []
+    for name, text in SHARDS.items():
+        path = tmp_path / "in" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def test_merge_sources_joins_by_mac_or_ip(shards):
+    merged, n_records = run.load_sources(shards)
+    assert n_records == 8
+    rows = merged.to_dict("records")
+    assert [r["source_row_id"] for r in rows] == [1, 2, 3, 4, 5]
+    # tags are paths below the common directory; the row id is the given id or the line number
+    assert [r["sources"] for r in rows] == ["dhcp/a.csv:1;cmdb/b.csv:10", "dhcp/a.csv:2;cmdb/b.csv:2",
+                                            "dhcp/a.csv:3;cmdb/b.csv:14", "cmdb/b.csv:12", "cmdb/b.csv:4"]
+    # first non-empty value wins, earlier shards first
+    assert [(r["ip"], r["hostname"], r["mac"], r["owner"], r["site"]) for r in rows] == [
+        ("10.0.0.1", "h1", "aa:bb:cc:00:00:01", "bob", "SJC"),
+        ("10.0.0.2", "h2", "aa:bb:cc:00:00:02", "carol", ""),
+        ("10.0.0.1", "h3", "aa:bb:cc:00:00:01", "dave", ""),
+        ("10.0.0.1", "h4", "aa:bb:cc:00:00:09", "", ""),
+        ("010.0.0.5", "h5", "", "", ""),
+    ]
+
+
+def test_shard_order_decides_which_value_wins(shards):
+    merged, _ = run.load_sources(shards[::-1])
+    first = merged.to_dict("records")[0]
+    assert (first["sources"], first["hostname"], first["ip"]) == ("cmdb/b.csv:10;dhcp/a.csv:1", "other", "10.0.0.1")
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize("pattern", ["{root}", os.path.join("{root}", "*.csv")])
+def test_directory_and_glob_inputs(cli, shards, tmp_path, pattern):
+    root = tmp_path / "in"
+    for name in ("dhcp", "cmdb"):
+        os.replace(root / name / ("a.csv" if name == "dhcp" else "b.csv"), root / f"{name}.csv")
+    merged, _ = run.load_sources(sorted(str(p) for p in root.glob("*.csv")))
+    out = cli("--raw", pattern.format(root=root))
+    assert read_csv(out / "sources.csv") == [{"source_row_id": str(sid), "sources": sources}
+                                             for sid, sources in zip(merged["source_row_id"], merged["sources"])]
+    clean = read_csv(out / "inventory_clean.csv")
+    assert [r["source_row_id"] for r in clean] == ["1", "2", "3", "4", "5"]
+    # cmdb.csv sorts first, so its values lead the merged asset
+    assert (clean[0]["hostname"], clean[0]["owner"], clean[0]["site_normalized"]) == ("other", "Bob", "SJC")
+
+
+def test_a_directory_without_inventory_files_is_rejected(tmp_path):
+    (tmp_path / "notes.txt").write_text("nothing here", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        run.source_paths(str(tmp_path))
+    assert run.source_paths(str(tmp_path / "one.csv")) == [str(tmp_path / "one.csv")]
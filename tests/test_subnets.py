@@ -0,0 +1,61 @@
+import ipaddress
+import random
+
+import pytest
+
+import run
+
+
+def random_networks(rng, version, n):
+    bits = 32 if version == 4 else 128
+    # a few /8 or /16 sized roots, so the random subnets nest inside each other
+    roots = [rng.getrandbits(bits) for _ in range(3)]
+    networks = []
+    for _ in range(n):
+        prefix = rng.randint(bits // 4, bits)
+        value = rng.choice(roots) ^ rng.getrandbits(bits - bits // 4)
+        networks.append(ipaddress.ip_network((value, prefix), strict=False))
+    return networks, roots
+
+
+def brute_force(networks, address):
+    containing = [net for net in networks if address in net]
+    return str(max(containing, key=lambda net: net.prefixlen)) if containing else ""
+
+
+@pytest.mark.parametrize("version", [4, 6])
+def test_longest_prefix_match_equals_brute_force(version):
+    rng = random.Random(version)
+    networks, roots = random_networks(rng, version, 200)
+    index = run.SubnetIndex(networks)
+    bits = 32 if version == 4 else 128
+    # addresses inside the subnets, at their edges, near the roots and anywhere
+    probes = [int(net.network_address) for net in networks] + [int(net.broadcast_address) for net in networks]
+    probes += [p + d for p in probes[:50] for d in (-1, 1)]
+    probes += [r ^ rng.getrandbits(bits // 2) for r in roots for _ in range(100)]
+    probes += [rng.getrandbits(bits) for _ in range(200)]
+    address_type = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+    hits = 0
+    for value in probes:
+        address = address_type(value % (1 << bits))
+        expected = brute_force(networks, address)
+        assert index.lookup(address) == expected, address
+        hits += bool(expected)
+    assert hits > len(probes) // 2
+
+
+def test_load_subnets_reads_a_cidr_column(tmp_path):
+    path = tmp_path / "ipam.csv"
+    path.write_text("# IPAM export\nname,cidr\nlan,10.0.0.0/16\nvoice,10.0.5.0/24\n\nv6,2001:db8::/48\n",
+                    encoding="utf-8")
+    index = run.load_subnets(str(path))
+    assert index.lookup(ipaddress.ip_address("10.0.5.9")) == "10.0.5.0/24"
+    assert index.lookup(ipaddress.ip_address("10.0.6.9")) == "10.0.0.0/16"
+    assert index.lookup(ipaddress.ip_address("2001:db8::1")) == "2001:db8::/48"
+    assert index.lookup(ipaddress.ip_address("192.168.0.1")) == ""
+
+
+def test_without_a_table_the_fixed_guess_applies():
+    run.set_subnet_index(None)
+    assert run.normalize_ip("10.1.2.3")[3] == "10.1.2.0/24"
+    assert run.normalize_ip("2001:db8:1:2::5")[3] == "2001:db8:1:2::/64"
@@ -0,0 +1,60 @@
+import ipaddress
+import random
+
+import pandas as pd
+import pytest
+
+import run
+
+
+def ipv4_spellings(rng):
+    a = ipaddress.IPv4Address(rng.getrandbits(32))
+    octets = str(a).split(".")
+    return [str(a), f" {a} ", ".".join(o.zfill(3) for o in octets), f"{a}.1", str(a).rsplit(".", 1)[0],
+            f"{rng.randint(256, 999)}.{octets[1]}.{octets[2]}.{octets[3]}", f"::ffff:{a}", f"::{a}", f"64:ff9b::{a}"]
+
+
+def ipv6_spellings(rng):
+    # dense, sparse and all-zero-run addresses, so every compression case turns up
+    groups = [rng.choice([0, 0, rng.getrandbits(16)]) for _ in range(8)]
+    a = ipaddress.IPv6Address(b"".join(g.to_bytes(2, "big") for g in groups))
+    return [str(a), a.exploded, a.exploded.upper(), str(a).upper(), f"{a}%eth0", f"[{a}]", f"{a}:1",
+            str(a).replace(":", "-"), ":".join(f"{g:x}" for g in groups)]
+
+
+def sample(seed, n=400):
+    rng = random.Random(seed)
+    values = ["", "nan", "garbage", "1.2.3", "::", "::1", "0.0.0.0", "255.255.255.255", "fe80::1%1", ":::", "1::2::3"]
+    for _ in range(n):
+        values += ipv4_spellings(rng) + ipv6_spellings(rng)
+    return values
+
+
+def assert_matches_scalar(values):
+    ip, valid, version, subnet, rptr, steps = run.vector_ip(pd.Series(values, dtype=object))
+    for i, v in enumerate(values):
+        e_ip, e_valid, e_version, e_subnet, e_rptr, e_steps = run.normalize_ip(v)
+        assert (ip[i], bool(valid[i]), int(version[i]), subnet[i], rptr[i], int(steps[i])) == \
+            (e_ip, e_valid, e_version, e_subnet, e_rptr, run.steps_mask(e_steps)), repr(v)
+
+
+def test_vector_ip_matches_normalize_ip(monkeypatch):
+    monkeypatch.setattr(run, "SUBNET_INDEX", None)
+    assert_matches_scalar(sample(1))
+
+
+@pytest.mark.parametrize("seed", [2, 3])
+def test_vector_ip_matches_normalize_ip_with_subnets(monkeypatch, seed):
+    values = sample(seed)
+    rng = random.Random(seed)
+    # subnets around a share of the sampled addresses, nested at random prefix lengths
+    networks = []
+    for v in rng.sample(values, 300):
+        try:
+            address = ipaddress.ip_address(v.strip())
+        except ValueError:
+            continue
+        networks.append(ipaddress.ip_network((address, rng.randint(address.max_prefixlen // 2, address.max_prefixlen)),
+                                             strict=False))
+    monkeypatch.setattr(run, "SUBNET_INDEX", run.SubnetIndex(networks))
+    assert_matches_scalar(values)
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import run
+
+ZONE_CSV = """id,ip_address,host,fqdn
+1,10.1.2.30,web1,web1.corp.example
+2,10.1.2.4,web2,web2.corp.example
+3,2001:db8::5,mail,mail.example.org
+4,10.9.9.9,,db.corp.example
+5,10.1.2.40,dup-a,dup-a.corp.example
+6,10.1.2.40,dup-b,dup-b.corp.example
+7,300.1.1.1,bad,bad.corp.example
+8,10.1.2.50,mismatch,other.corp.example
+9,10.1.2.60,single,single
+"""
+
+
+def read_zones(directory):
+    return {p.name: p.read_text(encoding="utf-8") for p in sorted(directory.iterdir()) if p.suffix == ".zone"}
+
+
+@pytest.fixture
+def zone_csv(tmp_path):
+    path = tmp_path / "zones.csv"
+    path.write_text(ZONE_CSV, encoding="utf-8")
+    return path
+
+
+def test_zone_files(cli, zone_csv):
+    zones = cli("--raw", zone_csv, "--zones") / "zones"
+    # 4 has no hostname and is kept; 5/6 share an IP, 7 is invalid, 8 names another host
+    # and 9 has no zone: all left out
+    assert read_zones(zones) == {
+        "corp.example.zone": "$ORIGIN corp.example.\n$TTL 3600\n"
+                             "db\tIN\tA\t10.9.9.9\nweb1\tIN\tA\t10.1.2.30\nweb2\tIN\tA\t10.1.2.4\n",
+        "example.org.zone": "$ORIGIN example.org.\n$TTL 3600\nmail\tIN\tAAAA\t2001:db8::5\n",
+        # PTRs in numeric order, not text order
+        "2.1.10.in-addr.arpa.zone": "$ORIGIN 2.1.10.in-addr.arpa.\n$TTL 3600\n"
+                                    "4\tIN\tPTR\tweb2.corp.example.\n30\tIN\tPTR\tweb1.corp.example.\n",
+        "9.9.10.in-addr.arpa.zone": "$ORIGIN 9.9.10.in-addr.arpa.\n$TTL 3600\n9\tIN\tPTR\tdb.corp.example.\n",
+        "0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.zone":
+            "$ORIGIN 0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.\n$TTL 3600\n"
+            "5.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0\tIN\tPTR\tmail.example.org.\n",
+    }
+    assert json.loads((zones / run.ZONE_MANIFEST).read_text(encoding="utf-8")) == {"zones": sorted(read_zones(zones))}
+
+
+def test_ttl_and_v6_prefix(cli, zone_csv, tmp_path):
+    zones = tmp_path / "custom"
+    cli("--raw", zone_csv, "--zones", zones, "--zone-ttl", 60, "--zone-v6-prefix", 48)
+    text = (zones / "0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.zone").read_text(encoding="utf-8")
+    assert text == ("$ORIGIN 0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa.\n$TTL 60\n"
+                    "5.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0\tIN\tPTR\tmail.example.org.\n")
+
+
+def test_conflicting_and_invalid_edge_rows_are_skipped(cli, edge_csv):
+    zones = cli("--raw", edge_csv, "--zones") / "zones"
+    # only row 6 is valid, consistent and free of duplicate IPs and multi-IP names
+    assert read_zones(zones) == {
+        "example.org.zone": "$ORIGIN example.org.\n$TTL 3600\nmapped\tIN\tAAAA\t::ffff:a00:6\n",
+        "0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.ip6.arpa.zone":
+            "$ORIGIN 0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.ip6.arpa.\n$TTL 3600\n"
+            "6.0.0.0.0.0.a.0.f.f.f.f.0.0.0.0\tIN\tPTR\tmapped.example.org.\n",
+    }
+
+
+@pytest.mark.parametrize("flags", [("--chunksize", 2), ("--engine", "csv"), ("--engine", "rows"), ("--workers", 2),
+                                   ("--incremental",)])
+def test_zones_match_across_engines(cli, zone_csv, flags):
+    expected = read_zones(cli("--raw", zone_csv, "--zones") / "zones")
+    assert read_zones(cli("--raw", zone_csv, "--zones", *flags) / "zones") == expected
+
+
+def test_spilled_runs_merge_to_the_same_zones(tmp_path, zone_csv):
+    out_df, anomalies = run.process_frame(run.read_raw(str(zone_csv)), "", enable_llm=False)
+    anomalies += run.detect_conflicts(out_df)
+    outputs = []
+    for run_size in (1_000_000, 3):
+        directory = tmp_path / f"zones{run_size}"
+        directory.mkdir()
+        export = run.ZoneExport(str(directory), run_size=run_size)
+        export.add(out_df.iloc[:4])
+        export.add(out_df.iloc[4:])
+        export.finish(anomalies)
+        outputs.append((read_zones(directory), export.zones, export.records))
+        assert sorted(p.name for p in directory.iterdir()) == sorted(read_zones(directory)) + [run.ZONE_MANIFEST]
+    assert outputs[0] == outputs[1]
+    assert outputs[0][1:] == (5, 8)
+
+
+def test_a_rerun_removes_only_its_own_stale_zones(cli, zone_csv, tmp_path):
+    zones = tmp_path / "zones"
+    cli("--raw", zone_csv, "--zones", zones)
+    (zones / "hand-written.zone").write_text("; kept\n", encoding="utf-8")
+    zone_csv.write_text("\n".join(ZONE_CSV.splitlines()[:3]) + "\n", encoding="utf-8")
+    cli("--raw", zone_csv, "--zones", zones)
+    assert sorted(p.name for p in zones.iterdir()) == [
+        "2.1.10.in-addr.arpa.zone", "corp.example.zone", "hand-written.zone", run.ZONE_MANIFEST]